@@ -0,0 +1,116 @@
+"""Add n-gram search index for diaries
+
+Revision ID: 1ed7e59b1d9d
+Revises: 6762abfe9807
+Create Date: 2026-10-17 10:02:11.412305
+
+"""
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Iterable, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "1ed7e59b1d9d"
+down_revision: Union[str, Sequence[str], None] = "6762abfe9807"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The document and term building of search.py when this revision was written,
+# frozen so that later changes to the app do not change this backfill
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+CONTENT_WEIGHT = 1
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def _extract_terms(text: str, weight: int) -> Counter:
+    terms = Counter()
+    for word in _WORD_RE.findall(_normalize(text)):
+        for i, ch in enumerate(word):
+            terms[ch] += weight
+            if i + 1 < len(word):
+                terms[word[i : i + 2]] += weight
+    return terms
+
+
+def _build_document(title: str, content: str, tag_names: Iterable[str]) -> str:
+    return "\n".join(_normalize(part) for part in [title, content or "", *tag_names])
+
+
+def _build_terms(title: str, content: str, tag_names: Iterable[str]) -> Counter:
+    terms = _extract_terms(title, TITLE_WEIGHT)
+    terms.update(_extract_terms(content or "", CONTENT_WEIGHT))
+    for name in tag_names:
+        terms.update(_extract_terms(name, TAG_WEIGHT))
+    return terms
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("diaries", sa.Column("search_document", sa.Text(), nullable=True))
+    search_terms = op.create_table(
+        "diary_search_terms",
+        sa.Column("diary_id", sa.Integer(), nullable=False),
+        sa.Column("term", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("weight", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["diary_id"], ["diaries.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("diary_id", "term"),
+    )
+    op.create_index(
+        "ix_diary_search_terms_user_id_term",
+        "diary_search_terms",
+        ["user_id", "term"],
+        unique=False,
+    )
+
+    # Backfill the index for existing diaries
+    bind = op.get_bind()
+    tag_names = defaultdict(list)
+    for diary_id, name in bind.execute(
+        sa.text(
+            "SELECT diary_tags.diary_id, tags.name FROM diary_tags "
+            "JOIN tags ON tags.id = diary_tags.tag_id"
+        )
+    ):
+        tag_names[diary_id].append(name)
+    diaries = bind.execute(
+        sa.text("SELECT id, user_id, title, content FROM diaries")
+    ).fetchall()
+    for diary_id, user_id, title, content in diaries:
+        names = tag_names[diary_id]
+        bind.execute(
+            sa.text("UPDATE diaries SET search_document = :doc WHERE id = :id"),
+            {"doc": _build_document(title, content, names), "id": diary_id},
+        )
+        terms = _build_terms(title, content, names)
+        if terms:
+            op.bulk_insert(
+                search_terms,
+                [
+                    {
+                        "diary_id": diary_id,
+                        "user_id": user_id,
+                        "term": term,
+                        "weight": weight,
+                    }
+                    for term, weight in terms.items()
+                ],
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_diary_search_terms_user_id_term", table_name="diary_search_terms")
+    op.drop_table("diary_search_terms")
+    op.drop_column("diaries", "search_document")
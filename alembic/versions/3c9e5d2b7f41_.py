@@ -0,0 +1,30 @@
+"""Add users.token_version for JWT revocation
+
+Revision ID: 3c9e5d2b7f41
+Revises: a4b7c1f1d5ca
+Create Date: 2026-10-17 13:05:12.440918
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "3c9e5d2b7f41"
+down_revision: Union[str, Sequence[str], None] = "a4b7c1f1d5ca"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "users",
+        sa.Column("token_version", sa.Integer(), server_default="0", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "token_version")
@@ -0,0 +1,33 @@
+"""Index tag_cooccurrence by pair for the global count refresh
+
+Revision ID: 4e8c2a6f9b13
+Revises: d7b2e9f4a6c3
+Create Date: 2026-10-17 22:14:08.519344
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "4e8c2a6f9b13"
+down_revision: Union[str, Sequence[str], None] = "d7b2e9f4a6c3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_tag_cooccurrence_tag_id_other_tag_id",
+        "tag_cooccurrence",
+        ["tag_id", "other_tag_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_tag_cooccurrence_tag_id_other_tag_id", table_name="tag_cooccurrence"
+    )
@@ -0,0 +1,69 @@
+"""Add tag_usage_daily aggregate
+
+Revision ID: 5d1f0b9a3e62
+Revises: 8f2a6c4e1b07
+Create Date: 2026-10-17 15:12:03.551809
+
+"""
+
+import os
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+from zoneinfo import ZoneInfo
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "5d1f0b9a3e62"
+down_revision: Union[str, Sequence[str], None] = "8f2a6c4e1b07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The bucketing of stats.usage_day when this revision was written, frozen so
+# that later changes to the app do not change what the migration computes
+def _usage_day(created_at: datetime, tz: ZoneInfo) -> date:
+    if created_at.tzinfo is None:  # Stored values are UTC
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(tz).date()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tag_usage = op.create_table(
+        "tag_usage_daily",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "day", "tag_id"),
+    )
+
+    # Backfill from existing diaries, bucketed like stats.record_tag_usage does
+    bind = op.get_bind()
+    tz = ZoneInfo(os.getenv("DEFAULT_TIMEZONE", "UTC"))
+    counts = Counter()
+    for user_id, created_at, tag_id in bind.execute(
+        # Typed so SQLite's text timestamps come back as datetime objects too
+        sa.text(
+            "SELECT diaries.user_id, diaries.created_at, diary_tags.tag_id "
+            "FROM diary_tags JOIN diaries ON diaries.id = diary_tags.diary_id"
+        ).columns(created_at=sa.DateTime(timezone=True))
+    ):
+        counts[user_id, _usage_day(created_at, tz), tag_id] += 1
+    if counts:
+        op.bulk_insert(
+            tag_usage,
+            [
+                {"user_id": user_id, "day": day, "tag_id": tag_id, "count": count}
+                for (user_id, day, tag_id), count in counts.items()
+            ],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("tag_usage_daily")
@@ -0,0 +1,38 @@
+"""Add catalog_state for once-per-deploy seeding
+
+Revision ID: 8f2a6c4e1b07
+Revises: 3c9e5d2b7f41
+Create Date: 2026-10-17 14:02:37.918254
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "8f2a6c4e1b07"
+down_revision: Union[str, Sequence[str], None] = "3c9e5d2b7f41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "catalog_state",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("value", sa.String(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("catalog_state")
@@ -0,0 +1,32 @@
+"""Add composite index for keyset pagination of diaries
+
+Revision ID: a4b7c1f1d5ca
+Revises: 1ed7e59b1d9d
+Create Date: 2026-10-17 11:20:45.108273
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "a4b7c1f1d5ca"
+down_revision: Union[str, Sequence[str], None] = "1ed7e59b1d9d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_diaries_user_id_created_at_id",
+        "diaries",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_diaries_user_id_created_at_id", table_name="diaries")
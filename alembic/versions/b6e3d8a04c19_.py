@@ -0,0 +1,75 @@
+"""Add weekly/monthly tag usage rollups
+
+Revision ID: b6e3d8a04c19
+Revises: 5d1f0b9a3e62
+Create Date: 2026-10-17 16:25:40.203117
+
+"""
+
+from collections import Counter
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "b6e3d8a04c19"
+down_revision: Union[str, Sequence[str], None] = "5d1f0b9a3e62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# stats.ROLLUP_PERIODS and stats.period_start when this revision was written
+ROLLUP_PERIODS = ("week", "month")
+
+
+def _period_start(day: date, period: str) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    rollups = op.create_table(
+        "tag_usage_rollups",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("period", sa.String(), nullable=False),
+        sa.Column("start", sa.Date(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "period", "start", "tag_id"),
+    )
+
+    # Backfill by rolling up the daily counts
+    bind = op.get_bind()
+    counts = Counter()
+    for user_id, day, tag_id, count in bind.execute(
+        # Typed so SQLite's text dates come back as date objects too
+        sa.text("SELECT user_id, day, tag_id, count FROM tag_usage_daily").columns(
+            day=sa.Date()
+        )
+    ):
+        for period in ROLLUP_PERIODS:
+            counts[user_id, period, _period_start(day, period), tag_id] += count
+    if counts:
+        op.bulk_insert(
+            rollups,
+            [
+                {
+                    "user_id": user_id,
+                    "period": period,
+                    "start": start,
+                    "tag_id": tag_id,
+                    "count": count,
+                }
+                for (user_id, period, start, tag_id), count in counts.items()
+            ],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("tag_usage_rollups")
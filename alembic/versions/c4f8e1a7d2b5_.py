@@ -0,0 +1,70 @@
+"""Add sync change numbers and diary tombstones
+
+Revision ID: c4f8e1a7d2b5
+Revises: e2a7c5f93d48
+Create Date: 2026-10-17 18:02:31.406115
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "c4f8e1a7d2b5"
+down_revision: Union[str, Sequence[str], None] = "e2a7c5f93d48"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "diaries",
+        sa.Column("sync_seq", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.create_table(
+        "sync_counters",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_table(
+        "diary_tombstones",
+        sa.Column("diary_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("sync_seq", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("diary_id"),
+    )
+
+    # Number existing diaries 1..n per user (by id) and start the counters at n
+    op.execute(
+        "UPDATE diaries SET sync_seq = numbered.seq FROM ("
+        "SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY id) AS seq "
+        "FROM diaries) AS numbered WHERE diaries.id = numbered.id"
+    )
+    op.execute(
+        "INSERT INTO sync_counters (user_id, seq) "
+        "SELECT user_id, count(*) FROM diaries GROUP BY user_id"
+    )
+
+    op.create_index("ix_diaries_user_id_sync_seq", "diaries", ["user_id", "sync_seq"])
+    op.create_index(
+        "ix_diary_tombstones_user_id_sync_seq",
+        "diary_tombstones",
+        ["user_id", "sync_seq"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_diary_tombstones_user_id_sync_seq", table_name="diary_tombstones"
+    )
+    op.drop_index("ix_diaries_user_id_sync_seq", table_name="diaries")
+    op.drop_table("diary_tombstones")
+    op.drop_table("sync_counters")
+    op.drop_column("diaries", "sync_seq")
@@ -0,0 +1,51 @@
+"""Add analysis_results table for model analysis of diaries
+
+Revision ID: d7b2e9f4a6c3
+Revises: 9a3d5f7c1e28
+Create Date: 2026-10-17 20:05:41.377210
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "d7b2e9f4a6c3"
+down_revision: Union[str, Sequence[str], None] = "9a3d5f7c1e28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "analysis_results",
+        sa.Column("diary_id", sa.Integer(), nullable=False),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("sentiment", sa.JSON(), nullable=True),
+        sa.Column("entities", sa.JSON(), nullable=True),
+        sa.Column(
+            "analyzed_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.ForeignKeyConstraint(["diary_id"], ["diaries.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("diary_id"),
+    )
+    op.create_index(
+        op.f("ix_analysis_results_content_hash"),
+        "analysis_results",
+        ["content_hash"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        op.f("ix_analysis_results_content_hash"), table_name="analysis_results"
+    )
+    op.drop_table("analysis_results")
@@ -0,0 +1,73 @@
+"""Add tag_cooccurrence for tag suggestions
+
+Revision ID: e2a7c5f93d48
+Revises: b6e3d8a04c19
+Create Date: 2026-10-17 17:08:56.772430
+
+"""
+
+from collections import Counter, defaultdict
+from itertools import permutations
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "e2a7c5f93d48"
+down_revision: Union[str, Sequence[str], None] = "b6e3d8a04c19"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# stats.GLOBAL_USER_ID: tag_cooccurrence.user_id of the counts over every user
+GLOBAL_USER_ID = 0
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    cooccurrence = op.create_table(
+        "tag_cooccurrence",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column("other_tag_id", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["other_tag_id"], ["tags.id"]),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"]),
+        sa.PrimaryKeyConstraint("user_id", "tag_id", "other_tag_id"),
+    )
+
+    # Backfill from the tag sets of existing diaries
+    bind = op.get_bind()
+    diary_tags = defaultdict(set)
+    owners = {}
+    for diary_id, user_id, tag_id in bind.execute(
+        sa.text(
+            "SELECT diaries.id, diaries.user_id, diary_tags.tag_id "
+            "FROM diary_tags JOIN diaries ON diaries.id = diary_tags.diary_id"
+        )
+    ):
+        diary_tags[diary_id].add(tag_id)
+        owners[diary_id] = user_id
+    counts = Counter()
+    for diary_id, tag_ids in diary_tags.items():
+        for tag_id, other_tag_id in permutations(tag_ids, 2):
+            counts[owners[diary_id], tag_id, other_tag_id] += 1
+            counts[GLOBAL_USER_ID, tag_id, other_tag_id] += 1
+    if counts:
+        op.bulk_insert(
+            cooccurrence,
+            [
+                {
+                    "user_id": user_id,
+                    "tag_id": tag_id,
+                    "other_tag_id": other_tag_id,
+                    "count": count,
+                }
+                for (user_id, tag_id, other_tag_id), count in counts.items()
+            ],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("tag_cooccurrence")
@@ -0,0 +1,362 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import httpx
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import jobs, models, schemas
+from database import SessionLocal, dialect_insert
+
+try:
+    import google.generativeai as genai
+except ImportError:  # Optional: only needed for the Gemini client
+    genai = None
+
+# Model endpoint speaking the JSON protocol of HTTPModelClient; takes
+# precedence over GEMINI_API_KEY. Analysis is off when neither is set.
+ANALYSIS_URL = os.getenv("ANALYSIS_URL")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+ANALYSIS_MODEL = os.getenv("ANALYSIS_MODEL", "gemini-pro")
+ANALYSIS_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", "30"))
+
+# Diaries sent per model call, and how long a partial batch waits for more
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "8"))
+ANALYSIS_BATCH_WAIT = float(os.getenv("ANALYSIS_BATCH_WAIT", "0.05"))
+
+# Model calls in flight at once, and calls allowed per minute (with bursts of
+# up to ANALYSIS_BURST calls), per worker process
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "2"))
+ANALYSIS_RATE_LIMIT = float(os.getenv("ANALYSIS_RATE_LIMIT", "60"))
+ANALYSIS_BURST = int(os.getenv("ANALYSIS_BURST", "5"))
+
+# Job that analyzes a diary after it was written
+ANALYZE_JOB = "analyze_diary"
+
+
+class Analysis(BaseModel):
+    """What the model returns for one diary."""
+
+    sentiment: schemas.Sentiment
+    entities: List[str] = []
+
+
+def analysis_text(title: str, content: Optional[str]) -> str:
+    """The text sent to the model for a diary."""
+    return f"{title}\n\n{content or ''}".strip()
+
+
+def content_hash(text: str, model: str) -> str:
+    """Key of an analysis: equal text analyzed by the same model is never re-sent."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+# --- Model clients ---
+class AnalysisClient(ABC):
+    """Analyzes a batch of diary texts in one model call."""
+
+    model: str
+
+    @abstractmethod
+    async def analyze(self, texts: List[str]) -> List[Analysis]:
+        """One Analysis per text, in order."""
+
+    async def close(self):
+        pass
+
+
+class HTTPModelClient(AnalysisClient):
+    """Client of a model server taking {"model", "inputs": [text, ...]} at
+    POST /analyze and answering {"results": [analysis, ...]} (self-hosted
+    models behind a small adapter, and the fake server of the tests)."""
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str = ANALYSIS_MODEL,
+        http: Optional[httpx.AsyncClient] = None,
+    ):
+        self.model = model
+        self.http = http or httpx.AsyncClient(
+            base_url=base_url, timeout=ANALYSIS_TIMEOUT
+        )
+
+    async def analyze(self, texts: List[str]) -> List[Analysis]:
+        response = await self.http.post(
+            "/analyze", json={"model": self.model, "inputs": texts}
+        )
+        response.raise_for_status()
+        return _parse_results(response.json().get("results"), len(texts))
+
+    async def close(self):
+        await self.http.aclose()
+
+
+class GeminiClient(AnalysisClient):
+    """Google Gemini through google-generativeai, one prompt per batch."""
+
+    PROMPT = (
+        "You analyze personal diary entries written mostly in Korean. For each "
+        "numbered entry return an object with `sentiment` ({\"label\": one of "
+        "positive, neutral, negative, \"score\": -1.0 to 1.0}) and `entities` "
+        "(people, places and things mentioned, as written). Answer with a JSON "
+        "array holding one object per entry, in order, and nothing else.\n\n"
+    )
+
+    def __init__(self, api_key: str, model: str = ANALYSIS_MODEL):
+        if genai is None:
+            raise RuntimeError("GEMINI_API_KEY is set but google-generativeai is not")
+        genai.configure(api_key=api_key)
+        self.model = model
+        self._model = genai.GenerativeModel(model)
+
+    async def analyze(self, texts: List[str]) -> List[Analysis]:
+        entries = "\n\n".join(
+            f"[{number}]\n{text}" for number, text in enumerate(texts, 1)
+        )
+        response = await self._model.generate_content_async(self.PROMPT + entries)
+        # Strip the ``` fence the model sometimes wraps its JSON in
+        answer = re.sub(r"^```(?:json)?|```$", "", response.text.strip()).strip()
+        return _parse_results(json.loads(answer), len(texts))
+
+
+def _parse_results(results, count: int) -> List[Analysis]:
+    if not isinstance(results, list) or len(results) != count:
+        raise ValueError(f"Expected {count} analyses from the model")
+    try:
+        return [Analysis.model_validate(result) for result in results]
+    except ValidationError as e:
+        raise ValueError(f"Malformed analysis from the model: {e}")
+
+
+def _gemini_key() -> Optional[str]:
+    # .env.example ships a placeholder, which must not count as configured
+    if GEMINI_API_KEY and GEMINI_API_KEY != "your_gemini_api_key":
+        return GEMINI_API_KEY
+    return None
+
+
+def is_enabled() -> bool:
+    return bool(ANALYSIS_URL or _gemini_key())
+
+
+def make_client() -> Optional[AnalysisClient]:
+    if ANALYSIS_URL:
+        return HTTPModelClient(ANALYSIS_URL)
+    if _gemini_key():
+        return GeminiClient(_gemini_key())
+    return None
+
+
+# --- Rate limiting and batching ---
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average and `capacity` at once."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        clock: Callable[[], float] = time.monotonic,
+        sleep=asyncio.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        """Waits for a token; waiters are served in arrival order."""
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await self._sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class AnalysisBatcher:
+    """Collects texts from concurrent callers into batched model calls.
+
+    A batch is sent when it is full or ANALYSIS_BATCH_WAIT after its first
+    text arrived. At most `concurrency` calls run at once and each first
+    takes a token from the bucket, so a burst of diaries turns into a few
+    evenly spaced calls instead of one call per diary.
+    """
+
+    def __init__(
+        self,
+        client: AnalysisClient,
+        batch_size: int = ANALYSIS_BATCH_SIZE,
+        max_wait: float = ANALYSIS_BATCH_WAIT,
+        concurrency: int = ANALYSIS_CONCURRENCY,
+        bucket: Optional[TokenBucket] = None,
+    ):
+        self.client = client
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.bucket = bucket or TokenBucket(ANALYSIS_RATE_LIMIT / 60, ANALYSIS_BURST)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.calls = 0
+
+    async def submit(self, text: str) -> Analysis:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_wait, self._flush
+            )
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            async with self._semaphore:
+                await self.bucket.acquire()
+                self.calls += 1
+                results = await self.client.analyze([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+_batcher: Optional[AnalysisBatcher] = None
+
+
+def get_batcher() -> Optional[AnalysisBatcher]:
+    """The process-wide batcher, or None when no model is configured."""
+    global _batcher
+    if _batcher is None:
+        client = make_client()
+        if client is not None:
+            _batcher = AnalysisBatcher(client)
+    return _batcher
+
+
+# --- Pipeline ---
+async def get_result(db: AsyncSession, diary_id: int):
+    return await db.get(models.AnalysisResult, diary_id)
+
+
+async def enqueue_analysis(db: AsyncSession, diary_ids: Iterable[int]):
+    """Queues analysis of the written diaries with the caller's transaction.
+
+    Nothing is queued without a model, nor with the inline job backend:
+    there the model call would run inside the writing request, holding its
+    transaction (and the user's sync counter row) open.
+    """
+    if not is_enabled() or isinstance(jobs.job_queue, jobs.InlineQueue):
+        return
+    for diary_id in diary_ids:
+        await jobs.enqueue(
+            db, ANALYZE_JOB, {"diary_id": diary_id}, priority=jobs.PRIORITY_LOW
+        )
+
+
+async def _read_text(db: AsyncSession, diary_id: int) -> Optional[str]:
+    row = (
+        await db.execute(
+            select(models.Diary.title, models.Diary.content).where(
+                models.Diary.id == diary_id
+            )
+        )
+    ).first()
+    return None if row is None else analysis_text(row.title, row.content)
+
+
+@jobs.handler(ANALYZE_JOB)
+async def analyze_diary(db: AsyncSession, payload: dict):
+    """Analyzes a diary unless a result for its current text already exists.
+
+    The result of another diary with the same text (by the same model) is
+    copied instead of calling the model again. The model call can take
+    seconds, so the worker's session is left untouched: the reads and the
+    write run in short transactions of a session opened here, none of them
+    open while the model works, and the result is only stored if the diary
+    still has the analyzed text.
+    """
+    batcher = get_batcher()
+    if batcher is None:
+        return
+    async with SessionLocal() as session:
+        await _analyze(session, batcher, payload["diary_id"])
+
+
+async def _analyze(db: AsyncSession, batcher: AnalysisBatcher, diary_id: int):
+    text = await _read_text(db, diary_id)
+    if text is None:  # Deleted before the job ran
+        return
+    digest = content_hash(text, batcher.client.model)
+
+    results = models.AnalysisResult
+    current = await db.get(results, diary_id)
+    if current is not None and current.content_hash == digest:
+        return
+    same_text = (
+        await db.execute(
+            select(results.sentiment, results.entities)
+            .where(results.content_hash == digest)
+            .limit(1)
+        )
+    ).first()
+    if same_text is not None:
+        sentiment, entities = same_text
+    else:
+        await db.commit()  # End the read transaction before waiting
+        analysis = await batcher.submit(text)
+        sentiment, entities = analysis.sentiment.model_dump(), analysis.entities
+        if await _read_text(db, diary_id) != text:
+            return  # Deleted or edited meanwhile; a newer job takes over
+
+    values = {
+        "diary_id": diary_id,
+        "content_hash": digest,
+        "model": batcher.client.model,
+        "sentiment": sentiment,
+        "entities": entities,
+        "analyzed_at": datetime.now(timezone.utc),
+    }
+    insert = dialect_insert(db)
+    table = results.__table__
+    await db.execute(
+        insert(table)
+        .values(values)
+        .on_conflict_do_update(index_elements=[table.c.diary_id], set_=values)
+    )
+    await db.commit()
@@ -1,13 +1,140 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
 
 import schemas, crud, models
+import json
 import os
 
 # Load database session dependency
 from database import SessionLocal, get_db
+from cache import Codec, shared_cache
+
+# JWT settings, read from the same variables as .env.example
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your_super_secret_key")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# Resolved principals are reused for this many seconds. Changes reach other
+# workers through cache invalidation; without CACHE_URL they are only
+# honoured by other processes after this window.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+
+
+def _dump_principal(value) -> bytes:
+    version, principal = value
+    return json.dumps([version, principal.model_dump(mode="json")]).encode("utf-8")
+
+
+def _load_principal(raw: bytes):
+    version, principal = json.loads(raw)
+    return version, schemas.UserResponse.model_validate(principal)
+
+
+# Principals are cached as (token_version, UserResponse)
+PRINCIPAL_CODEC = Codec(dumps=_dump_principal, loads=_load_principal)
+
+
+def principal_key(user_id: int) -> str:
+    return f"principal:{user_id}"
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    expire = datetime.now(timezone.utc) + (
+        expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def create_user_token(user: models.User, expires_delta: Optional[timedelta] = None):
+    """Issues a token carrying the user id and token version, so requests
+    can be authenticated without looking the user up by email."""
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id, "ver": user.token_version},
+        expires_delta=expires_delta,
+    )
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> schemas.UserResponse:
+    """Resolves the bearer token to the user it was issued for.
+
+    The signature and expiry are checked on every call; the user itself
+    comes from the principal cache when possible, so steady-state requests
+    never touch the users table. A token whose version is older than the
+    user's current token_version is rejected.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    user_id = payload.get("uid")
+    version = payload.get("ver")
+    if not isinstance(user_id, int) or not isinstance(version, int):
+        # Tokens issued before ids were embedded; the client has to log in again
+        raise credentials_exception
+
+    async def load_principal():
+        user = await db.get(models.User, user_id)
+        if user is None:
+            return None
+        return user.token_version, schemas.UserResponse.model_validate(user)
+
+    async def cached_principal():
+        return await shared_cache.get_or_load(
+            principal_key(user_id),
+            load_principal,
+            ttl=PRINCIPAL_CACHE_TTL,
+            codec=PRINCIPAL_CODEC,
+        )
+
+    cached = await cached_principal()
+    if cached is not None and cached[0] < version:
+        # Issued after the cached entry was read; its invalidation is on the way
+        invalidate_user(user_id)
+        cached = await cached_principal()
+    if cached is None or cached[0] != version:
+        raise credentials_exception
+    return cached[1]
+
+
+def invalidate_user(user_id: int):
+    shared_cache.invalidate(principal_key(user_id))
+
+
+# --- Commit-time invalidation ---
+# Any flushed change to a user (profile edit, token revocation) drops its
+# cached principal once the transaction commits, like catalog.py does for tags.
+@event.listens_for(models.User, "after_update")
+def _mark_user_changed(mapper, connection, target: models.User):
+    db = object_session(target)
+    if db is not None:
+        db.info.setdefault("users_changed", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(db: Session):
+    shared_cache.invalidate(
+        *[principal_key(user_id) for user_id in db.info.pop("users_changed", ())]
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(db: Session):
+    db.info.pop("users_changed", None)
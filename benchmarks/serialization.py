@@ -0,0 +1,73 @@
+"""Compares the default and the fast serialization of a 100-diary page.
+
+    python benchmarks/serialization.py
+
+"default" is what FastAPI does for a response_model: validate the page
+into DiaryPage (from_attributes, nested TagResponse objects), turn it into
+JSON-compatible data and encode it with the json module. "fast" is the
+path /diaries and /search take: plain dicts from crud.DiaryRow encoded by
+responses.FastJSONResponse.
+"""
+
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import responses, schemas
+from catalog import CatalogTag
+from crud import DiaryRow
+from pagination import Page
+
+PAGE_SIZE = 100
+TAGS_PER_DIARY = 3
+ROUNDS = 200
+
+
+def make_page() -> Page:
+    now = datetime.now(timezone.utc)
+    tags = [
+        CatalogTag(i, f"태그{i}", "감정", True, None) for i in range(TAGS_PER_DIARY)
+    ]
+    items = [
+        DiaryRow(
+            id=i,
+            user_id=1,
+            title=f"일기 {i}",
+            content="오늘은 산책을 하고 카페에서 책을 읽었다. " * 10,
+            image_url=None,
+            created_at=now - timedelta(minutes=i),
+            updated_at=now - timedelta(minutes=i),
+            tags=tuple(tags),
+        )
+        for i in range(PAGE_SIZE)
+    ]
+    return Page(items=items, next_cursor="eyJkdCI6IjIwMjYtMTAtMTcifQ")
+
+
+def default_path(page: Page) -> bytes:
+    model = schemas.DiaryPage.model_validate(page, from_attributes=True)
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def fast_path(page: Page) -> bytes:
+    return responses.FastJSONResponse(responses.diary_page(page)).body
+
+
+def main():
+    page = make_page()
+    assert json.loads(default_path(page)) == json.loads(fast_path(page))
+    for name, fn in (("default", default_path), ("fast", fast_path)):
+        seconds = min(timeit.repeat(lambda: fn(page), number=ROUNDS, repeat=5))
+        print(f"{name:>8}: {seconds / ROUNDS * 1000:.3f} ms per page")
+
+
+if __name__ == "__main__":
+    main()
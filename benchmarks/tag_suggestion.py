@@ -0,0 +1,49 @@
+"""Measures one tag suggestion against a model of production size.
+
+    python benchmarks/tag_suggestion.py
+
+The model has random weights for TAGS tags over the default number of hash
+buckets; the cost of a suggestion depends on the length of the text and
+the number of tags, not on what the weights are.
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+import numpy as np
+
+import tagger
+
+TAGS = 300
+ROUNDS = 200
+TEXTS = {
+    "short": "한강에서 자전거",
+    "long": "오늘은 친구와 한강에서 자전거를 타고 치킨을 먹었다. " * 30,
+}
+
+
+def make_model() -> tagger.TagModel:
+    rng = np.random.default_rng(0)
+    weights = rng.normal(-10, 1, (tagger.TAGGER_FEATURES, TAGS)).astype(np.float32)
+    bias = np.full(TAGS, -np.log(TAGS), dtype=np.float32)
+    return tagger.TagModel(np.arange(1, TAGS + 1), weights, bias)
+
+
+def main():
+    model = make_model()
+    allowed = model.tag_ids.tolist()
+    for name, text in TEXTS.items():
+        seconds = min(
+            timeit.repeat(
+                lambda: model.suggest("일기", text, allowed), number=ROUNDS, repeat=5
+            )
+        )
+        print(f"{name:>6} ({len(text)} chars): {seconds / ROUNDS * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
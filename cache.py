@@ -0,0 +1,451 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict, defaultdict
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Optional: only needed when CACHE_URL points at Redis
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Size-bounded LRU mapping whose entries expire `ttl` seconds after being set.
+
+    Not thread-safe; it is meant to be used from the event loop only.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[Any] = None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Stores `value` for `ttl` seconds (the cache's default when None)."""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# --- Shared cache tier ---
+# Every uvicorn worker keeps its own near tier, so without a shared far tier a
+# write in one worker leaves the others serving stale entries until they
+# expire. With CACHE_URL set, entries live in Redis (the far tier) and every
+# invalidation is published so each worker drops its near copy.
+CACHE_URL = os.getenv("CACHE_URL")  # e.g. redis://localhost:6379/0, or memory://
+CACHE_NEAR_SIZE = int(os.getenv("CACHE_NEAR_SIZE", "10000"))
+# Upper bound on how long a worker may serve an entry it was not told about,
+# should an invalidation message be lost
+CACHE_NEAR_TTL = float(os.getenv("CACHE_NEAR_TTL", "5"))
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "tagmind:")
+INVALIDATION_CHANNEL = "invalidate"
+# Seconds before resubscribing after the invalidation subscription dropped,
+# doubled after every failed attempt up to the maximum
+RESUBSCRIBE_DELAY = 1.0
+RESUBSCRIBE_MAX_DELAY = 30.0
+
+_MISSING = object()
+
+
+class Codec(NamedTuple):
+    """Converts cached values to and from the bytes stored in the far tier."""
+
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes], Any]
+
+
+JSON_CODEC = Codec(
+    dumps=lambda value: json.dumps(value, separators=(",", ":")).encode("utf-8"),
+    loads=json.loads,
+)
+
+
+class CacheBackend(ABC):
+    """Far tier shared by every worker: byte values with TTLs, plus pub/sub."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """The value of `key`, or None when missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float):
+        """Stores `value` under `key` for `ttl` seconds."""
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        """Removes `keys`; missing ones are ignored."""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str):
+        """Sends `message` to every subscriber of `channel`."""
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        """Starts listening on `channel`; messages published after this returns
+        are yielded by the returned iterator."""
+
+    async def close(self):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """In-process stand-in for Redis (CACHE_URL=memory://).
+
+    SharedCaches sharing one instance behave like workers sharing a server,
+    which is how the multi-worker behaviour is exercised without one.
+    """
+
+    def __init__(self, maxsize: int = CACHE_NEAR_SIZE, clock=time.monotonic):
+        self._data = TTLCache(maxsize=maxsize, ttl=0, clock=clock)
+        self._subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._data.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._data.set(key, value, ttl=ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key)
+
+    async def publish(self, channel: str, message: str):
+        for queue in self._subscribers[channel]:
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers[channel].append(queue)
+
+        async def messages():
+            try:
+                while True:
+                    yield await queue.get()
+            finally:
+                self._subscribers[channel].remove(queue)
+
+        return messages()
+
+
+class RedisBackend(CacheBackend):
+    """Far tier on any server speaking the Redis protocol (Redis, Valkey, ...)."""
+
+    def __init__(self, client, prefix: str = CACHE_KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = CACHE_KEY_PREFIX) -> "RedisBackend":
+        if aioredis is None:
+            raise RuntimeError("CACHE_URL points at Redis but redis is not installed")
+        return cls(aioredis.from_url(url), prefix)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        await self.client.delete(*[self.prefix + key for key in keys])
+
+    async def publish(self, channel: str, message: str):
+        await self.client.publish(self.prefix + channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.prefix + channel)
+
+        async def messages():
+            try:
+                async for message in pubsub.listen():
+                    data = message["data"]
+                    yield data.decode("utf-8") if isinstance(data, bytes) else data
+            finally:
+                await pubsub.aclose()
+
+        return messages()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class SharedCache:
+    """Two-level cache: a per-process near tier in front of an optional far tier.
+
+    `get_or_load` serves the near tier, then the far tier, and only then
+    calls the loader; concurrent misses for one key share a single load, so
+    a miss storm costs one query per key and process. `invalidate` drops
+    keys everywhere: locally at once, then in the far tier and, through
+    pub/sub, in the near tier of every other worker. Far entries expire
+    after their ttl, which also bounds the rare load that races a write.
+    Near entries never outlive CACHE_NEAR_TTL, so without a far tier other
+    workers see a write after at most that long.
+    """
+
+    def __init__(
+        self,
+        far: Optional[CacheBackend] = None,
+        near_size: int = CACHE_NEAR_SIZE,
+        near_ttl: float = CACHE_NEAR_TTL,
+        channel: str = INVALIDATION_CHANNEL,
+    ):
+        self.far = far
+        self.near = TTLCache(maxsize=near_size, ttl=near_ttl)
+        self.channel = channel
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._hooks: List[Tuple[str, Callable[[str], None]]] = []
+        self._pending: Set[asyncio.Task] = set()
+        self._listener: Optional[asyncio.Task] = None
+        # None until started with a far tier, then "subscribed" or "reconnecting"
+        self.listener_state: Optional[str] = None
+        # Bumped on every invalidation. A load remembers the generation it
+        # started in and skips the near tier if it changed meanwhile, since
+        # the value it read may predate the invalidation
+        self._generation = 0
+        self.counts = Counter()
+
+    @classmethod
+    def from_url(cls, url: Optional[str]) -> "SharedCache":
+        if not url:
+            return cls()
+        if url.startswith("memory://"):
+            return cls(MemoryBackend())
+        return cls(RedisBackend.from_url(url))
+
+    async def get_or_load(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[Any]],
+        ttl: float,
+        codec: Codec = JSON_CODEC,
+    ):
+        """The cached value of `key`, calling `load` on a miss (None is not cached)."""
+        value = self.near.get(key, _MISSING)
+        if value is not _MISSING:
+            self.counts["near_hits"] += 1
+            return value
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.counts["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load(key, load, ttl, codec)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Retrieved, even when nobody was waiting
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            del self._inflight[key]
+        return value
+
+    async def _load(self, key, load, ttl, codec):
+        generation = self._generation
+        value = None
+        if self.far is not None:
+            try:
+                raw = await self.far.get(key)
+            except Exception as e:
+                logger.warning(f"Cache read of {key} failed: {e}")
+                raw = None
+            if raw is not None:
+                self.counts["far_hits"] += 1
+                value = codec.loads(raw)
+        if value is None:
+            self.counts["loads"] += 1
+            value = await load()
+            if value is None:
+                return None
+            if self.far is not None:
+                try:
+                    await self.far.set(key, codec.dumps(value), ttl)
+                except Exception as e:
+                    logger.warning(f"Cache write of {key} failed: {e}")
+        if generation == self._generation:
+            # Capped even without a far tier: invalidations never leave this
+            # process then, so the near ttl bounds how stale other workers get
+            self.near.set(key, value, ttl=min(ttl, self.near.ttl))
+        return value
+
+    def invalidate(self, *keys: str):
+        """Drops `keys` in this process now and everywhere else shortly after.
+
+        Synchronous so it can run from commit listeners; the far tier is
+        updated by a background task (see `flush`).
+        """
+        if not keys:
+            return
+        self._drop(keys)
+        if self.far is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # No event loop (e.g. a migration script)
+            return
+        task = loop.create_task(self._invalidate_far(keys))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _invalidate_far(self, keys):
+        try:
+            await self.far.delete(*keys)
+            await self.far.publish(self.channel, json.dumps(list(keys)))
+        except Exception as e:
+            logger.warning(f"Cache invalidation of {', '.join(keys)} failed: {e}")
+
+    def _drop(self, keys):
+        self._generation += 1
+        for key in keys:
+            self.near.pop(key)
+            for prefix, hook in self._hooks:
+                if key.startswith(prefix):
+                    hook(key)
+
+    def on_invalidate(self, prefix: str, hook: Callable[[str], None]):
+        """Calls `hook(key)` whenever a key starting with `prefix` is invalidated,
+        here or in another worker (for in-process state such as the catalog)."""
+        self._hooks.append((prefix, hook))
+
+    async def flush(self):
+        """Waits until pending far-tier invalidations have been sent."""
+        while self._pending:
+            await asyncio.gather(*self._pending)
+
+    async def start(self):
+        """Subscribes to invalidations from other workers."""
+        if self.far is None or self._listener is not None:
+            return
+        messages = await self.far.subscribe(self.channel)
+        self.listener_state = "subscribed"
+        self._listener = asyncio.get_running_loop().create_task(
+            self._listen(messages)
+        )
+
+    async def _listen(self, messages: Optional[AsyncIterator[str]]):
+        """Applies invalidation messages, resubscribing with backoff whenever
+        the subscription drops."""
+        delay = RESUBSCRIBE_DELAY
+        while True:
+            try:
+                if messages is None:
+                    messages = await self.far.subscribe(self.channel)
+                    # Invalidations sent while disconnected were missed
+                    self.clear()
+                    self.listener_state = "subscribed"
+                    self.counts["resubscribes"] += 1
+                    delay = RESUBSCRIBE_DELAY
+                async for message in messages:
+                    self._apply(message)
+                error = "subscription ended"
+            except Exception as e:
+                error = e
+            messages = None
+            self.listener_state = "reconnecting"
+            self.counts["listener_errors"] += 1
+            logger.warning(
+                f"Cache invalidation subscription lost ({error}); "
+                f"resubscribing in {delay:g}s"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESUBSCRIBE_MAX_DELAY)
+
+    def _apply(self, message: str):
+        try:
+            self._drop(json.loads(message))
+        except Exception as e:
+            logger.warning(f"Ignoring invalidation message {message!r}: {e}")
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+            self.listener_state = None
+        await self.flush()
+        if self.far is not None:
+            await self.far.close()
+
+    def clear(self):
+        """Empties the near tier of this process."""
+        self._generation += 1
+        self.near.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.far).__name__ if self.far else None,
+            "near_entries": len(self.near),
+            "inflight": len(self._inflight),
+            "listener": self.listener_state,
+            **{
+                name: self.counts[name]
+                for name in (
+                    "near_hits",
+                    "far_hits",
+                    "loads",
+                    "coalesced",
+                    "resubscribes",
+                    "listener_errors",
+                )
+            },
+        }
+
+
+shared_cache = SharedCache.from_url(CACHE_URL)
@@ -0,0 +1,191 @@
+import hashlib
+import json
+from datetime import datetime
+from types import MappingProxyType
+from typing import FrozenSet, List, Mapping, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+import models
+from cache import Codec, shared_cache
+
+# Seconds a user's owned packs are cached in the far tier; each worker keeps
+# them for CACHE_NEAR_TTL at most, so a purchase shows up everywhere in time
+# even when its invalidation does not reach a worker
+OWNED_PACKS_CACHE_TTL = 300
+
+
+class CatalogTag(NamedTuple):
+    id: int
+    name: str
+    category: str
+    is_default: bool
+    tag_pack_id: Optional[int]
+
+
+class CatalogPack(NamedTuple):
+    id: int
+    name: str
+    description: Optional[str]
+    price: int
+    product_id: str
+    created_at: datetime
+    tags: Tuple[CatalogTag, ...]
+
+
+class CatalogSnapshot(NamedTuple):
+    """Immutable view of every tag and tag pack at one catalog version."""
+
+    version: int
+    tags: Mapping[int, CatalogTag]
+    default_tags: Tuple[CatalogTag, ...]
+    packs: Tuple[CatalogPack, ...]
+    # Hash of the tags and packs; equal in every process serving the same data,
+    # unlike `version`, so it can back HTTP validators
+    content_hash: str
+
+
+def _catalog_tag(tag: models.Tag) -> CatalogTag:
+    return CatalogTag(tag.id, tag.name, tag.category, tag.is_default, tag.tag_pack_id)
+
+
+class TagCatalog:
+    """Serves tags and tag packs from memory.
+
+    The catalog is reloaded only when its version is bumped, which happens
+    after a transaction that created tags or packs commits. A user's tags
+    are the default tags plus the tags of the packs they own, and owned pack
+    ids are kept in the shared cache until a purchase commits (or their ttl
+    runs out), so /tags and /tags/store run no queries in the steady state.
+    Both invalidations are sent through the shared cache, so they reach
+    every worker.
+    """
+
+    def __init__(self):
+        self._version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+
+    def bump(self):
+        self._version += 1
+
+    def clear(self):
+        self._snapshot = None
+        self.bump()
+
+    async def snapshot(self, db: AsyncSession) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != self._version:
+            snapshot = await self._load(db, self._version)
+            # Another request may have loaded a newer version meanwhile
+            if self._snapshot is None or self._snapshot.version <= snapshot.version:
+                self._snapshot = snapshot
+        return snapshot
+
+    async def owned_pack_ids(self, db: AsyncSession, user_id: int) -> FrozenSet[int]:
+        async def load():
+            result = await db.execute(
+                select(models.UserTagPack.tag_pack_id).where(
+                    models.UserTagPack.user_id == user_id
+                )
+            )
+            return frozenset(result.scalars())
+
+        return await shared_cache.get_or_load(
+            owned_packs_key(user_id),
+            load,
+            ttl=OWNED_PACKS_CACHE_TTL,
+            codec=OWNED_PACKS_CODEC,
+        )
+
+    async def user_tags(self, db: AsyncSession, user_id: int) -> List[CatalogTag]:
+        """Default tags plus the tags of every pack the user owns."""
+        snapshot = await self.snapshot(db)
+        owned = await self.owned_pack_ids(db, user_id)
+        tags = list(snapshot.default_tags)
+        for pack in snapshot.packs:
+            if pack.id in owned:
+                tags.extend(tag for tag in pack.tags if not tag.is_default)
+        return tags
+
+    @staticmethod
+    async def _load(db: AsyncSession, version: int) -> CatalogSnapshot:
+        tag_rows = await db.execute(select(models.Tag).order_by(models.Tag.id))
+        tags = {tag.id: _catalog_tag(tag) for tag in tag_rows.scalars()}
+        pack_rows = await db.execute(
+            select(models.TagPack)
+            .options(selectinload(models.TagPack.tags))
+            .order_by(models.TagPack.id)
+        )
+        packs = tuple(
+            CatalogPack(
+                id=pack.id,
+                name=pack.name,
+                description=pack.description,
+                price=pack.price,
+                product_id=pack.product_id,
+                created_at=pack.created_at,
+                tags=tuple(
+                    tags[tag.id] for tag in sorted(pack.tags, key=lambda t: t.id)
+                ),
+            )
+            for pack in pack_rows.scalars()
+        )
+        content = repr((tuple(tags.values()), packs)).encode("utf-8")
+        return CatalogSnapshot(
+            version=version,
+            tags=MappingProxyType(tags),
+            default_tags=tuple(tag for tag in tags.values() if tag.is_default),
+            packs=packs,
+            content_hash=hashlib.sha256(content).hexdigest(),
+        )
+
+
+tag_catalog = TagCatalog()
+
+OWNED_PACKS_CODEC = Codec(
+    dumps=lambda ids: json.dumps(sorted(ids)).encode("utf-8"),
+    loads=lambda raw: frozenset(json.loads(raw)),
+)
+
+
+# --- Commit-time invalidation ---
+# Writers only mark the session; the cache is invalidated once the data is
+# committed, so a concurrent reload can never cache the pre-commit state
+# under the new version. AsyncSession shares `info` with, and fires its
+# events through, the synchronous Session it wraps.
+CATALOG_KEY = "catalog"
+OWNED_PACKS_PREFIX = "owned_packs:"
+
+# Invalidations from any worker, this one included, reach the catalog here;
+# owned packs live in the shared cache itself, so dropping their key is enough
+shared_cache.on_invalidate(CATALOG_KEY, lambda key: tag_catalog.bump())
+
+
+def owned_packs_key(user_id: int) -> str:
+    return f"{OWNED_PACKS_PREFIX}{user_id}"
+
+
+def mark_catalog_changed(db: AsyncSession):
+    db.info["catalog_changed"] = True
+
+
+def mark_owned_packs_changed(db: AsyncSession, user_id: int):
+    db.info.setdefault("owned_packs_changed", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(db: Session):
+    keys = [
+        owned_packs_key(user_id) for user_id in db.info.pop("owned_packs_changed", ())
+    ]
+    if db.info.pop("catalog_changed", False):
+        keys.append(CATALOG_KEY)
+    shared_cache.invalidate(*keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(db: Session):
+    db.info.pop("catalog_changed", None)
+    db.info.pop("owned_packs_changed", None)
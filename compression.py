@@ -0,0 +1,198 @@
+import gzip
+import os
+from typing import Dict, Optional
+
+import anyio
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip is offered without it
+    brotli = None
+
+# Bodies smaller than this are sent as-is; the headers would eat the savings
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+
+# gzip level (1-9) and brotli quality (0-11); higher is smaller but slower
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Bodies at least this large are compressed on a worker thread, so one huge
+# export page does not stall every other request on the event loop
+COMPRESSION_OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", "262144"))
+
+# Content types worth compressing (JSON and text; images are already packed)
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class CompressionStats:
+    """Counters behind /internal/compression."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.responses: Dict[str, int] = {}
+        self.skipped = 0
+        self.offloaded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, encoding: str, size_in: int, size_out: int):
+        self.responses[encoding] = self.responses.get(encoding, 0) + 1
+        self.bytes_in += size_in
+        self.bytes_out += size_out
+
+    def as_dict(self) -> dict:
+        return {
+            "responses": dict(self.responses),
+            "skipped": self.skipped,
+            "offloaded": self.offloaded,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+        }
+
+
+compression_stats = CompressionStats()
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks "br" or "gzip" from an Accept-Encoding header, or None.
+
+    Brotli wins ties because it compresses Korean text noticeably better;
+    codings with q=0 are refused.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    wildcard = accepted.get("*", 0.0)
+    best = max(offered, key=lambda coding: accepted.get(coding, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+def compress(body: bytes, encoding: str, gzip_level: int, brotli_quality: int):
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+class CompressionMiddleware:
+    """Compresses buffered (non-streaming) responses with gzip or brotli.
+
+    Streaming responses such as /diaries/export pass through untouched, as
+    do bodies below `minimum_size`, non-text content and responses that are
+    already encoded. A compressed response gets a weak ETag: the bytes
+    differ from the identity representation, but If-None-Match still
+    matches because it compares weakly.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+        offload_size: int = COMPRESSION_OFFLOAD_SIZE,
+        stats: CompressionStats = compression_stats,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.offload_size = offload_size
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode())
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            if start is None:  # Already sent below
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # Streaming response: send everything through as it comes
+                passthrough = True
+                self.stats.skipped += 1
+                await send(start)
+                start = None
+                await send(message)
+                return
+            response_start, start = start, None
+            await self._send_buffered(response_start, message, encoding, send)
+
+        await self.app(scope, receive, send_compressed)
+
+    async def _send_buffered(self, start, message, encoding, send):
+        body = message.get("body", b"")
+        headers = [(k.lower(), v) for k, v in start["headers"]]
+        content_type = _header(headers, b"content-type")
+        if (
+            len(body) < self.minimum_size
+            or _header(headers, b"content-encoding")
+            or not content_type.startswith(COMPRESSIBLE_TYPES)
+        ):
+            self.stats.skipped += 1
+            await send(start)
+            await send(message)
+            return
+
+        if len(body) >= self.offload_size:
+            self.stats.offloaded += 1
+            compressed = await anyio.to_thread.run_sync(
+                compress, body, encoding, self.gzip_level, self.brotli_quality
+            )
+        else:
+            compressed = compress(body, encoding, self.gzip_level, self.brotli_quality)
+        self.stats.record(encoding, len(body), len(compressed))
+
+        new_headers = []
+        vary = None
+        for key, value in headers:
+            if key == b"content-length":
+                continue
+            if key == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            if key == b"vary":
+                vary = value
+                continue
+            new_headers.append((key, value))
+        new_headers += [
+            (b"content-encoding", encoding.encode()),
+            (b"content-length", str(len(compressed)).encode()),
+            (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"),
+        ]
+        await send({**start, "headers": new_headers})
+        await send({**message, "body": compressed})
+
+
+def _header(headers, name: bytes) -> str:
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
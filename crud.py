@@ -1,135 +1,441 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, or_, select, delete, event
 from sqlalchemy.sql import func
-from datetime import datetime
-import models, schemas
-from passlib.context import CryptContext
+from datetime import date, datetime, timezone
+from collections import defaultdict
+from typing import NamedTuple, Optional, Tuple
+import json
+import models, schemas, search, pagination, dates, catalog, stats, sync, jobs
+import analysis
+from cache import Codec, shared_cache
+from passwords import hasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Seconds a diary's (user_id, updated_at) stays cached for ETag checks
+DIARY_VERSION_CACHE_TTL = 300
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# bcrypt takes 100-300 ms per call; it runs on the hasher's worker pool so the
+# event loop keeps serving other requests (raises HasherBusy when saturated)
+async def get_password_hash(password):
+    return await hasher.hash(password)
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await hasher.verify(plain_password, hashed_password)
 
 
 # --- User ---
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await get_password_hash(user.password)
     db_user = models.User(
         email=user.email, password_hash=hashed_password, nickname=user.nickname
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int):
+    """Invalidates every token issued to the user so far."""
+    db_user = await db.get(models.User, user_id)
+    db_user.token_version += 1
+    await db.commit()
     return db_user
 
 
 # --- Diary ---
-def create_diary(db: Session, diary: schemas.DiaryCreate, user_id: int):
+async def create_diary(db: AsyncSession, diary: schemas.DiaryCreate, user_id: int):
     db_diary = models.Diary(
         title=diary.title,
         content=diary.content,
         image_url=diary.image_url,
         user_id=user_id,
+        # Set here rather than by the server default so the usage day is known
+        # without reading the row back
+        created_at=datetime.now(timezone.utc),
+        sync_seq=await sync.next_sync_seq(db, user_id),
     )
     db.add(db_diary)
-    db.flush()
+    await db.flush()
 
-    for tag_id in diary.tags:
-        db_tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
-        if db_tag:
-            db_diary.tags.append(db_tag)
+    tags = await _resolve_tags(db, user_id, diary.tags)
+    tag_ids = {tag.id for tag in tags}
+    await _write_diary_tags(db, db_diary.id, set(), tag_ids)
+    await stats.record_tag_usage(
+        db, user_id, stats.usage_day(db_diary.created_at), tag_ids, 1
+    )
+    await stats.record_cooccurrence(db, user_id, set(), tag_ids)
 
-    db.commit()
-    db.refresh(db_diary)
-    return db_diary
+    await enqueue_post_processing(db, db_diary.id)
+    await db.commit()
+    # Lazy loads are not possible under asyncio, so reload the row with its tags
+    return await get_diary(db, db_diary.id)
 
 
-def get_diary(db: Session, diary_id: int):
-    return (
-        db.query(models.Diary)
-        .options(joinedload(models.Diary.tags))
-        .filter(models.Diary.id == diary_id)
-        .first()
+async def enqueue_post_processing(db: AsyncSession, diary_id: int):
+    """Queues the work that follows a diary write but need not delay the
+    response (search indexing, model analysis); it commits with the diary."""
+    await jobs.enqueue(
+        db, search.INDEX_JOB, {"diary_id": diary_id}, priority=jobs.PRIORITY_HIGH
     )
+    await analysis.enqueue_analysis(db, [diary_id])
+
 
+async def _resolve_tags(db: AsyncSession, user_id: int, tag_ids):
+    """Loads the requested tags the user may attach, in a single query.
 
-def get_diaries(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return (
-        db.query(models.Diary)
-        .filter(models.Diary.user_id == user_id)
-        .order_by(models.Diary.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    A tag is usable when it is a default tag, belongs to no pack, or belongs
+    to a pack the user owns; unknown or unowned ids are skipped.
+    """
+    if not tag_ids:
+        return []
+    owned_pack_ids = select(models.UserTagPack.tag_pack_id).where(
+        models.UserTagPack.user_id == user_id
     )
+    result = await db.execute(
+        select(models.Tag).where(
+            models.Tag.id.in_(set(tag_ids)),
+            or_(
+                models.Tag.is_default == True,
+                models.Tag.tag_pack_id.is_(None),
+                models.Tag.tag_pack_id.in_(owned_pack_ids),
+            ),
+        )
+    )
+    return result.scalars().all()
 
 
-def get_diaries_by_date(
-    db: Session, user_id: int, date_str: str, skip: int = 0, limit: int = 100
+async def _write_diary_tags(
+    db: AsyncSession, diary_id: int, current_ids: set, new_ids: set
 ):
-    from datetime import datetime
+    """Inserts the added and deletes the removed diary_tags rows in bulk."""
+    diary_tags = models.diary_tags_association
+    added = new_ids - current_ids
+    removed = current_ids - new_ids
+    if added:
+        await db.execute(
+            diary_tags.insert(),
+            [{"diary_id": diary_id, "tag_id": tag_id} for tag_id in sorted(added)],
+        )
+    if removed:
+        await db.execute(
+            diary_tags.delete().where(
+                diary_tags.c.diary_id == diary_id, diary_tags.c.tag_id.in_(removed)
+            )
+        )
+
+
+async def get_diary(db: AsyncSession, diary_id: int):
+    result = await db.execute(
+        select(models.Diary)
+        .options(selectinload(models.Diary.tags))
+        .where(models.Diary.id == diary_id)
+        # Overwrite stale state of an already-loaded instance (e.g. after a write)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+
+class DiaryRow(NamedTuple):
+    """Read-only diary as returned by the list queries (fields of DiaryResponse)."""
+
+    id: int
+    user_id: int
+    title: str
+    content: Optional[str]
+    image_url: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    tags: Tuple[catalog.CatalogTag, ...]
+
+
+# Only the columns DiaryResponse needs; no ORM identity map or instance state
+_DIARY_COLUMNS = (
+    models.Diary.id,
+    models.Diary.user_id,
+    models.Diary.title,
+    models.Diary.content,
+    models.Diary.image_url,
+    models.Diary.created_at,
+    models.Diary.updated_at,
+)
+
+
+async def _with_tags(db: AsyncSession, page: pagination.Page) -> pagination.Page:
+    """Attaches the tags of every diary on the page, loaded in one query.
+
+    DiaryResponse serializes `tags`, so list queries must fetch them up
+    front; otherwise every diary on the page would issue its own SELECT.
+    """
+    if not page.items:
+        return page
+    diary_tags = models.diary_tags_association
+    result = await db.execute(
+        select(
+            diary_tags.c.diary_id,
+            models.Tag.id,
+            models.Tag.name,
+            models.Tag.category,
+            models.Tag.is_default,
+            models.Tag.tag_pack_id,
+        )
+        .join(models.Tag, models.Tag.id == diary_tags.c.tag_id)
+        .where(diary_tags.c.diary_id.in_([row.id for row in page.items]))
+        .order_by(diary_tags.c.diary_id, models.Tag.id)
+    )
+    tags = defaultdict(list)
+    for diary_id, *tag in result.all():
+        tags[diary_id].append(catalog.CatalogTag(*tag))
+    items = [
+        DiaryRow(*row[: len(_DIARY_COLUMNS)], tags=tuple(tags[row.id]))
+        for row in page.items
+    ]
+    return page._replace(items=items)
+
+
+class DiaryVersion(NamedTuple):
+    user_id: int
+    updated_at: datetime
+
+
+def _dump_diary_version(version: DiaryVersion) -> bytes:
+    return json.dumps([version.user_id, version.updated_at.isoformat()]).encode()
+
+
+def _load_diary_version(raw: bytes) -> DiaryVersion:
+    user_id, updated_at = json.loads(raw)
+    return DiaryVersion(user_id, datetime.fromisoformat(updated_at))
+
+
+DIARY_VERSION_CODEC = Codec(dumps=_dump_diary_version, loads=_load_diary_version)
+
+
+def diary_version_key(diary_id: int) -> str:
+    return f"diary_version:{diary_id}"
+
+
+async def get_diary_version(db: AsyncSession, diary_id: int):
+    """DiaryVersion of a diary, or None; served from the shared cache, so a
+    revalidated GET /diaries/{id} usually runs no query at all."""
+
+    async def load():
+        result = await db.execute(
+            select(models.Diary.user_id, models.Diary.updated_at).where(
+                models.Diary.id == diary_id
+            )
+        )
+        row = result.first()
+        return None if row is None else DiaryVersion(*row)
+
+    return await shared_cache.get_or_load(
+        diary_version_key(diary_id),
+        load,
+        ttl=DIARY_VERSION_CACHE_TTL,
+        codec=DIARY_VERSION_CODEC,
+    )
+
+
+async def get_changes(
+    db: AsyncSession,
+    user_id: int,
+    since: Optional[str] = None,
+    limit: int = sync.SYNC_PAGE_SIZE,
+) -> sync.SyncPage:
+    """Diaries (as DiaryRow) and deleted ids changed after a /sync token."""
+    changes = await sync.changes_since(db, user_id, _DIARY_COLUMNS, since, limit)
+    page = await _with_tags(db, pagination.Page(changes.changed, None))
+    return changes._replace(changed=page.items)
+
+
+async def _diary_page(db: AsyncSession, stmt, limit: int, cursor: Optional[str]):
+    """Newest-first page of DiaryRow for a select over _DIARY_COLUMNS."""
+    page = await pagination.paginate(
+        db,
+        stmt,
+        keys=[models.Diary.created_at, models.Diary.id],
+        key_of=lambda row: (row.created_at, row.id),
+        limit=limit,
+        cursor=cursor,
+        item_of=lambda row: row,
+    )
+    return await _with_tags(db, page)
+
 
+async def get_diaries(
+    db: AsyncSession, user_id: int, limit: int = 100, cursor: Optional[str] = None
+):
+    stmt = select(*_DIARY_COLUMNS).where(models.Diary.user_id == user_id)
+    return await _diary_page(db, stmt, limit, cursor)
+
+
+async def get_diaries_by_date(
+    db: AsyncSession,
+    user_id: int,
+    date_str: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    tz: Optional[str] = None,
+):
     target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    return (
-        db.query(models.Diary)
-        .filter(
-            models.Diary.user_id == user_id,
-            func.date(models.Diary.created_at) == target_date,
+    return await get_diaries_in_range(
+        db, user_id, target_date, target_date, limit=limit, cursor=cursor, tz=tz
+    )
+
+
+async def get_diaries_in_range(
+    db: AsyncSession,
+    user_id: int,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    tz: Optional[str] = None,
+):
+    """Diaries created between two local dates (both inclusive, either open)."""
+    stmt = select(*_DIARY_COLUMNS).where(
+        models.Diary.user_id == user_id, *_created_between(first_day, last_day, tz)
+    )
+    return await _diary_page(db, stmt, limit, cursor)
+
+
+async def count_diaries_per_day(
+    db: AsyncSession,
+    user_id: int,
+    first_day: date,
+    last_day: date,
+    tz: Optional[str] = None,
+):
+    """Number of diaries per local date in [first_day, last_day], zeros included.
+
+    Only created_at is read, so the (user_id, created_at, id) index answers
+    the query on its own; bucketing by local date happens here because the
+    timezone conversion is not portable across databases.
+    """
+    zone = dates.get_timezone(tz)
+    counts = dict.fromkeys(dates.date_range(first_day, last_day), 0)
+    result = await db.execute(
+        select(models.Diary.created_at).where(
+            models.Diary.user_id == user_id, *_created_between(first_day, last_day, tz)
         )
-        .order_by(models.Diary.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
     )
+    for created_at in result.scalars():
+        counts[dates.local_date(created_at, zone)] += 1
+    return counts
 
 
-def update_diary(
-    db: Session, db_diary: models.Diary, diary_update: schemas.DiaryUpdate
+def _created_between(
+    first_day: Optional[date], last_day: Optional[date], tz: Optional[str]
 ):
+    zone = dates.get_timezone(tz)
+    criteria = []
+    if first_day is not None:
+        start, _ = dates.day_bounds(first_day, first_day, zone)
+        criteria.append(models.Diary.created_at >= start)
+    if last_day is not None:
+        _, end = dates.day_bounds(last_day, last_day, zone)
+        criteria.append(models.Diary.created_at < end)
+    return criteria
+
+
+async def update_diary(
+    db: AsyncSession, db_diary: models.Diary, diary_update: schemas.DiaryUpdate
+):
+    """Updates a diary loaded by get_diary (its tags must already be loaded)."""
     if diary_update.title is not None:
         db_diary.title = diary_update.title
     if diary_update.content is not None:
         db_diary.content = diary_update.content
     if diary_update.image_url is not None:
         db_diary.image_url = diary_update.image_url
+    # Bumped on every update, tag-only changes included, since the diary's
+    # ETag is derived from it (and set here for sub-second precision)
+    db_diary.updated_at = datetime.now(timezone.utc)
+    db_diary.sync_seq = await sync.next_sync_seq(db, db_diary.user_id)
+    mark_diary_changed(db, db_diary.id)
 
-    # Clear existing tags and add new ones
+    # Write only the difference between the current and the requested tags
     if diary_update.tags is not None:
-        db_diary.tags.clear()
-        db.flush()
+        new_tags = await _resolve_tags(db, db_diary.user_id, diary_update.tags)
+        current_ids = {tag.id for tag in db_diary.tags}
+        new_ids = {tag.id for tag in new_tags}
+        await _write_diary_tags(db, db_diary.id, current_ids, new_ids)
+        day = stats.usage_day(db_diary.created_at)
+        await stats.record_tag_usage(
+            db, db_diary.user_id, day, new_ids - current_ids, 1
+        )
+        await stats.record_tag_usage(
+            db, db_diary.user_id, day, current_ids - new_ids, -1
+        )
+        await stats.record_cooccurrence(db, db_diary.user_id, current_ids, new_ids)
 
-        for tag_id in diary_update.tags:
-            db_tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
-            if db_tag:
-                db_diary.tags.append(db_tag)
+    await enqueue_post_processing(db, db_diary.id)
+    await db.commit()
+    # The association was written behind the ORM's back; reload it with the row
+    return await get_diary(db, db_diary.id)
 
-    db.commit()
-    db.refresh(db_diary)
-    return db_diary
 
+async def delete_diary(db: AsyncSession, diary_id: int):
+    diary_tags = models.diary_tags_association
+    result = await db.execute(
+        select(models.Diary.user_id, models.Diary.created_at).where(
+            models.Diary.id == diary_id
+        )
+    )
+    row = result.first()
+    if row is not None:
+        result = await db.execute(
+            select(diary_tags.c.tag_id).where(diary_tags.c.diary_id == diary_id)
+        )
+        tag_ids = set(result.scalars())
+        await stats.record_tag_usage(
+            db, row.user_id, stats.usage_day(row.created_at), tag_ids, -1
+        )
+        await stats.record_cooccurrence(db, row.user_id, tag_ids, set())
+        await sync.record_deletion(db, row.user_id, diary_id)
+    mark_diary_changed(db, diary_id)
+    await search.remove_diary(db, diary_id)
+    await db.execute(
+        delete(models.AnalysisResult).where(
+            models.AnalysisResult.diary_id == diary_id
+        )
+    )
+    await db.execute(delete(diary_tags).where(diary_tags.c.diary_id == diary_id))
+    await db.execute(delete(models.Diary).where(models.Diary.id == diary_id))
+    await db.commit()
+
+
+# --- Commit-time invalidation ---
+# Like catalog.py: the cached versions of written diaries are dropped (in every
+# worker) once the transaction commits.
+def mark_diary_changed(db: AsyncSession, diary_id: int):
+    db.info.setdefault("diaries_changed", set()).add(diary_id)
 
-def delete_diary(db: Session, diary_id: int):
-    db_diary = db.query(models.Diary).filter(models.Diary.id == diary_id).first()
-    if db_diary:
-        db.delete(db_diary)
-        db.commit()
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(db: Session):
+    diary_ids = db.info.pop("diaries_changed", ())
+    shared_cache.invalidate(*[diary_version_key(diary_id) for diary_id in diary_ids])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(db: Session):
+    db.info.pop("diaries_changed", None)
 
 
 # --- Tag & Tag Pack ---
-def get_tag_by_name(db: Session, tag_name: str):
-    return db.query(models.Tag).filter(models.Tag.name == tag_name).first()
+async def get_tag_by_name(db: AsyncSession, tag_name: str):
+    result = await db.execute(select(models.Tag).where(models.Tag.name == tag_name))
+    return result.scalars().first()
 
 
-def create_tag(db: Session, tag: schemas.TagCreate):
+async def create_tag(db: AsyncSession, tag: schemas.TagCreate):
     db_tag = models.Tag(
         name=tag.name,
         category=tag.category,
@@ -137,12 +443,13 @@ def create_tag(db: Session, tag: schemas.TagCreate):
         tag_pack_id=tag.tag_pack_id,
     )
     db.add(db_tag)
-    db.flush()
-    db.refresh(db_tag)
+    await db.flush()
+    catalog.mark_catalog_changed(db)
+    await db.refresh(db_tag)
     return db_tag
 
 
-def create_tag_pack(db: Session, tag_pack: schemas.TagPackBase):
+async def create_tag_pack(db: AsyncSession, tag_pack: schemas.TagPackBase):
     db_tag_pack = models.TagPack(
         name=tag_pack.name,
         description=tag_pack.description,
@@ -150,69 +457,91 @@ def create_tag_pack(db: Session, tag_pack: schemas.TagPackBase):
         product_id=tag_pack.product_id,
     )
     db.add(db_tag_pack)
-    db.flush()
-    db.refresh(db_tag_pack)
+    await db.flush()
+    catalog.mark_catalog_changed(db)
+    await db.refresh(db_tag_pack)
     return db_tag_pack
 
 
-def get_user_tags(db: Session, user_id: int):
-    """Gets all default tags and tags from packs the user has purchased."""
-    # Get tags from purchased packs
-    purchased_tags = (
-        db.query(models.Tag)
-        .join(models.TagPack)
-        .join(models.UserTagPack)
-        .filter(models.UserTagPack.user_id == user_id)
-        .all()
+async def get_all_tag_packs(db: AsyncSession):
+    result = await db.execute(
+        select(models.TagPack).options(selectinload(models.TagPack.tags))
     )
-    # Get default tags (those not in any pack)
-    default_tags = db.query(models.Tag).filter(models.Tag.is_default == True).all()
-    return list(set(default_tags + purchased_tags))
-
+    return result.scalars().all()
 
-def get_all_tag_packs(db: Session):
-    return db.query(models.TagPack).options(joinedload(models.TagPack.tags)).all()
 
-
-def get_tag_pack_by_product_id(db: Session, product_id: str):
-    return (
-        db.query(models.TagPack).filter(models.TagPack.product_id == product_id).first()
+async def get_tag_pack_by_product_id(db: AsyncSession, product_id: str):
+    result = await db.execute(
+        select(models.TagPack).where(models.TagPack.product_id == product_id)
     )
+    return result.scalars().first()
 
 
-def user_owns_tag_pack(db: Session, user_id: int, tag_pack_id: int):
-    return (
-        db.query(models.UserTagPack)
-        .filter(
+async def user_owns_tag_pack(db: AsyncSession, user_id: int, tag_pack_id: int):
+    result = await db.execute(
+        select(models.UserTagPack).where(
             and_(
                 models.UserTagPack.user_id == user_id,
                 models.UserTagPack.tag_pack_id == tag_pack_id,
             )
         )
-        .first()
-        is not None
     )
+    return result.scalars().first() is not None
 
 
-def grant_tag_pack_to_user(db: Session, user_id: int, tag_pack_id: int):
+async def grant_tag_pack_to_user(db: AsyncSession, user_id: int, tag_pack_id: int):
     db_user_tag_pack = models.UserTagPack(user_id=user_id, tag_pack_id=tag_pack_id)
     db.add(db_user_tag_pack)
-    db.commit()
+    catalog.mark_owned_packs_changed(db, user_id)
+    await db.commit()
 
 
 # --- Search ---
-def search_diaries(db: Session, user_id: int, query: str):
-    return (
-        db.query(models.Diary)
-        .outerjoin(models.Diary.tags) # Use outerjoin to include diaries without tags
-        .filter(
-            models.Diary.user_id == user_id,
-            (
-                models.Diary.title.ilike(f"%{query}%")
-                | models.Diary.content.ilike(f"%{query}%")
-                | models.Tag.name.ilike(f"%{query}%")
-            ),
+async def search_diaries(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+):
+    """Ranked search over title, content and tag names using the n-gram index.
+
+    Candidates are the diaries whose postings contain every query term; the
+    LIKE on the stored search document then only runs on those candidates to
+    drop n-gram false positives (e.g. "행복한" matching "행복" + "축복한").
+    """
+    terms = search.query_terms(query)
+    if not terms:
+        return pagination.Page(items=[], next_cursor=None)
+    matches = (
+        select(
+            models.DiarySearchTerm.diary_id.label("diary_id"),
+            func.sum(models.DiarySearchTerm.weight).label("score"),
+        )
+        .where(
+            models.DiarySearchTerm.user_id == user_id,
+            models.DiarySearchTerm.term.in_(terms),
         )
-        .distinct() # Consider performance implications for large datasets
-        .all()
+        .group_by(models.DiarySearchTerm.diary_id)
+        .having(func.count(models.DiarySearchTerm.term) == len(terms))
+        .subquery()
+    )
+    stmt = (
+        select(*_DIARY_COLUMNS, matches.c.score)
+        .join(matches, matches.c.diary_id == models.Diary.id)
+        .where(
+            models.Diary.search_document.like(
+                search.like_pattern(query), escape="\\"
+            )
+        )
+    )
+    page = await pagination.paginate(
+        db,
+        stmt,
+        keys=[matches.c.score, models.Diary.created_at, models.Diary.id],
+        key_of=lambda row: (row.score, row.created_at, row.id),
+        limit=limit,
+        cursor=cursor,
+        item_of=lambda row: row,
     )
+    return await _with_tags(db, page)
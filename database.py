@@ -1,30 +1,135 @@
-from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 import os
 
+from metrics import instrument_engine
+
+# asyncio drivers used for each backend. DATABASE_URL keeps its synchronous
+# form (e.g. postgresql://...) because Alembic still runs through psycopg2.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str):
+    """Rewrites a database URL to use the asyncio driver of its backend."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url
+
+
+def _env_bool(env, name: str, default: bool) -> bool:
+    value = env.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def engine_options(url, env=os.environ) -> dict:
+    """create_async_engine keyword arguments for `url`, from the environment.
+
+    DB_POOL_SIZE / DB_MAX_OVERFLOW      connections kept open / allowed on top,
+                                        per process (multiply by the worker
+                                        count to get the total per server)
+    DB_POOL_TIMEOUT                     seconds to wait for a free connection
+    DB_POOL_RECYCLE                     seconds before a connection is replaced
+    DB_POOL_PRE_PING                    test connections on checkout
+    DB_STATEMENT_TIMEOUT_MS             per-statement limit, 0 disables it
+    DB_EXTERNAL_POOLER                  a PgBouncer-style pooler sits in front
+                                        of PostgreSQL
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "postgresql":
+        # SQLite (tests, local runs) keeps SQLAlchemy's defaults
+        return {}
+
+    options = {"pool_pre_ping": _env_bool(env, "DB_POOL_PRE_PING", True)}
+    connect_args = {}
+    timeout_ms = int(env.get("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+    if _env_bool(env, "DB_EXTERNAL_POOLER", False):
+        # The external pooler owns the connections: open one per checkout and
+        # hand it straight back. Server connections are shared between clients,
+        # so prepared statements cannot be cached on them, and startup
+        # parameters such as statement_timeout are rejected by PgBouncer, so
+        # the timeout is enforced client-side instead.
+        options["poolclass"] = NullPool
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        if timeout_ms:
+            connect_args["command_timeout"] = timeout_ms / 1000
+    else:
+        options["pool_size"] = int(env.get("DB_POOL_SIZE", "5"))
+        options["max_overflow"] = int(env.get("DB_MAX_OVERFLOW", "10"))
+        options["pool_timeout"] = float(env.get("DB_POOL_TIMEOUT", "30"))
+        # Recycle before typical server/load-balancer idle timeouts drop the socket
+        options["pool_recycle"] = int(env.get("DB_POOL_RECYCLE", "1800"))
+        if timeout_ms:
+            connect_args["server_settings"] = {"statement_timeout": str(timeout_ms)}
+
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def pool_status(engine) -> dict:
+    """Connection counts of the engine's pool, for /internal/pool."""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            # Connections opened beyond pool_size (negative until the pool fills)
+            overflow=pool.overflow(),
+        )
+    return stats
+
+
+def dialect_insert(db: AsyncSession):
+    """The session dialect's insert(), which supports ON CONFLICT clauses."""
+    return postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+
+
 # Retrieve database URL from environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Create a SQLAlchemy engine to connect to the database
-# The engine is the starting point for any SQLAlchemy application.
-engine = create_engine(DATABASE_URL)
+# Create an asyncio SQLAlchemy engine to connect to the database
+# Queries are awaited, so a slow query no longer blocks the event loop.
+engine = create_async_engine(
+    to_async_url(DATABASE_URL), **engine_options(DATABASE_URL)
+)
+# Count and time every statement for /metrics and the slow-request log
+instrument_engine(engine)
 
 # Configure a SessionLocal class for database interactions
-# sessionmaker creates a factory for Session objects.
+# sessionmaker creates a factory for AsyncSession objects.
 # autocommit=False: Ensures that changes are not committed automatically.
 # autoflush=False: Prevents the session from flushing changes to the database automatically.
+# expire_on_commit=False: Keeps loaded attributes usable after commit, since
+# lazy refreshes are not possible under asyncio.
 # bind=engine: Binds the session to the created engine.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    bind=engine,
+)
 
 # Base class for declarative models
 # This is used by SQLAlchemy to define database tables as Python classes.
 Base = declarative_base()
 
 # Dependency to get a database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
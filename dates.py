@@ -0,0 +1,53 @@
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterator, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Timezone used for day boundaries when the client does not send one
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
+
+
+def get_timezone(name: Optional[str] = None) -> ZoneInfo:
+    """Resolves an IANA timezone name, raising ValueError for unknown zones."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+
+def day_bounds(
+    first_day: date, last_day: date, tz: ZoneInfo
+) -> Tuple[datetime, datetime]:
+    """Returns the half-open UTC range [first_day 00:00, last_day + 1 00:00) in `tz`.
+
+    Comparing the bare column against these bounds keeps the filter sargable,
+    unlike wrapping created_at in date(), which defeats the index.
+    """
+    start = datetime.combine(first_day, time.min, tzinfo=tz)
+    end = datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=tz)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def local_date(value: datetime, tz: ZoneInfo) -> date:
+    """Calendar date of a stored timestamp in `tz` (naive values are UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(tz).date()
+
+
+def date_range(first_day: date, last_day: date) -> Iterator[date]:
+    """Every date from first_day to last_day, both inclusive."""
+    for offset in range((last_day - first_day).days + 1):
+        yield first_day + timedelta(days=offset)
+
+
+def month_span(day: date) -> Tuple[date, date]:
+    first = day.replace(day=1)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return first, next_month - timedelta(days=1)
+
+
+def week_span(day: date) -> Tuple[date, date]:
+    """Monday-to-Sunday week containing `day`."""
+    monday = day - timedelta(days=day.weekday())
+    return monday, monday + timedelta(days=6)
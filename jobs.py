@@ -0,0 +1,441 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import event, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Where enqueued jobs go:
+# database: the jobs table, run by `python worker.py` (production)
+# memory:   an in-process queue, run by a Worker in the same process (tests)
+# inline:   run at once in the enqueuing transaction (no worker needed)
+JOB_BACKEND = os.getenv("JOB_BACKEND", "database")
+
+# Jobs a worker claims per round trip, and seconds it sleeps when none are due
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "10"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+
+# Attempts before a job is dead-lettered, and the backoff between them
+# (doubled after every failure, capped at JOB_RETRY_MAX_DELAY seconds)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "5"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "3600"))
+
+# A running job not finished after this many seconds is assumed to belong to
+# a crashed worker and is claimed again
+JOB_LOCK_TIMEOUT = float(os.getenv("JOB_LOCK_TIMEOUT", "300"))
+
+# Higher priorities are claimed first
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+QUEUED, RUNNING, DEAD = "queued", "running", "dead"
+
+Handler = Callable[[AsyncSession, dict], Awaitable[None]]
+
+# kind -> handler(db, payload); the worker commits after the handler returns
+handlers: Dict[str, Handler] = {}
+
+
+def handler(kind: str):
+    """Registers the decorated coroutine as the handler of `kind` jobs.
+
+    Handlers must be idempotent (a job may run again after a crash or a
+    failed commit) and must not commit the session they are given. One
+    that waits on a slow external call opens a session of its own for that
+    work instead (see analysis.analyze_diary).
+    """
+
+    def register(fn: Handler) -> Handler:
+        handlers[kind] = fn
+        return fn
+
+    return register
+
+
+class Job(NamedTuple):
+    id: Optional[int]
+    kind: str
+    payload: dict
+    priority: int = PRIORITY_NORMAL
+    attempts: int = 0  # Including the current one, once claimed
+    max_attempts: int = JOB_MAX_ATTEMPTS
+    run_at: Optional[datetime] = None
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next attempt of a job that failed `attempts` times."""
+    seconds = JOB_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, JOB_RETRY_MAX_DELAY))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --- Queues ---
+class JobQueue(ABC):
+    """Storage of pending jobs; see the JOB_BACKEND comment for the variants."""
+
+    @abstractmethod
+    async def enqueue(self, db: AsyncSession, job: Job):
+        """Adds `job` as part of the caller's transaction."""
+
+    @abstractmethod
+    async def claim(self, limit: int) -> List[Job]:
+        """Marks up to `limit` due jobs as running and returns them."""
+
+    @abstractmethod
+    async def complete(self, job: Job):
+        """Removes a job that ran successfully."""
+
+    @abstractmethod
+    async def fail(self, job: Job, error: str):
+        """Schedules a retry, or dead-letters the job after its last attempt."""
+
+    @abstractmethod
+    async def requeue_dead(self, kind: Optional[str] = None) -> int:
+        """Gives dead-lettered jobs a fresh set of attempts."""
+
+    @abstractmethod
+    async def stats(self) -> dict:
+        """Job counts per kind and status."""
+
+
+class DatabaseQueue(JobQueue):
+    """Jobs stored in the jobs table and claimed with FOR UPDATE SKIP LOCKED.
+
+    Enqueueing is an INSERT in the writer's transaction, so a job exists
+    exactly when the diary change that caused it was committed. Workers
+    claim disjoint batches without blocking each other; completed jobs are
+    deleted and dead ones kept for inspection.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    async def enqueue(self, db: AsyncSession, job: Job):
+        db.add(
+            models.Job(
+                kind=job.kind,
+                payload=json.dumps(job.payload),
+                priority=job.priority,
+                status=QUEUED,
+                attempts=0,
+                max_attempts=job.max_attempts,
+                run_at=job.run_at or _now(),
+            )
+        )
+
+    async def claim(self, limit: int) -> List[Job]:
+        now = _now()
+        stale = now - timedelta(seconds=JOB_LOCK_TIMEOUT)
+        table = models.Job
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(table)
+                .where(
+                    or_(
+                        (table.status == QUEUED) & (table.run_at <= now),
+                        (table.status == RUNNING) & (table.locked_at < stale),
+                    )
+                )
+                .order_by(table.priority.desc(), table.run_at, table.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.scalars().all()
+            for row in rows:
+                row.status = RUNNING
+                row.locked_at = now
+                row.attempts += 1
+            jobs = [
+                Job(
+                    id=row.id,
+                    kind=row.kind,
+                    payload=json.loads(row.payload),
+                    priority=row.priority,
+                    attempts=row.attempts,
+                    max_attempts=row.max_attempts,
+                    run_at=row.run_at,
+                )
+                for row in rows
+            ]
+            await db.commit()
+        return jobs
+
+    async def complete(self, job: Job):
+        async with self.session_factory() as db:
+            await db.execute(
+                models.Job.__table__.delete().where(models.Job.id == job.id)
+            )
+            await db.commit()
+
+    async def fail(self, job: Job, error: str):
+        if job.attempts >= job.max_attempts:
+            values = {"status": DEAD, "locked_at": None}
+        else:
+            values = {
+                "status": QUEUED,
+                "locked_at": None,
+                "run_at": _now() + retry_delay(job.attempts),
+            }
+        async with self.session_factory() as db:
+            await db.execute(
+                update(models.Job)
+                .where(models.Job.id == job.id)
+                .values(last_error=error, **values)
+            )
+            await db.commit()
+
+    async def requeue_dead(self, kind: Optional[str] = None) -> int:
+        stmt = (
+            update(models.Job)
+            .where(models.Job.status == DEAD)
+            .values(status=QUEUED, attempts=0, run_at=_now())
+        )
+        if kind is not None:
+            stmt = stmt.where(models.Job.kind == kind)
+        async with self.session_factory() as db:
+            result = await db.execute(stmt)
+            await db.commit()
+        return result.rowcount
+
+    async def stats(self) -> dict:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(models.Job.kind, models.Job.status, func.count()).group_by(
+                    models.Job.kind, models.Job.status
+                )
+            )
+            counts: Dict[str, Dict[str, int]] = {}
+            for kind, status, count in result.all():
+                counts.setdefault(kind, {})[status] = count
+        return {"backend": "database", "jobs": counts}
+
+
+class MemoryQueue(JobQueue):
+    """In-process queue with the same ordering, retry and dead-letter rules.
+
+    Jobs become visible when the enqueuing transaction commits, as with the
+    jobs table, and are lost with the process; meant for tests.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = _now):
+        self.clock = clock
+        self._ids = itertools.count(1)
+        self._ready: List[tuple] = []  # heap of (-priority, run_at, id, job)
+        self.running: Dict[int, Job] = {}
+        self.dead: List[tuple] = []  # (job, last error)
+
+    async def enqueue(self, db: AsyncSession, job: Job):
+        await db.connection()  # Begins the transaction whose outcome decides
+        db.info.setdefault("memory_jobs", []).append((self, job))
+
+    def _push(self, job: Job):
+        if job.id is None:
+            job = job._replace(id=next(self._ids))
+        run_at = job.run_at or self.clock()
+        heapq.heappush(self._ready, (-job.priority, run_at, job.id, job))
+
+    async def claim(self, limit: int) -> List[Job]:
+        now = self.clock()
+        due, later = [], []
+        while self._ready and len(due) < limit:
+            entry = heapq.heappop(self._ready)
+            (due if entry[1] <= now else later).append(entry)
+        for entry in later:
+            heapq.heappush(self._ready, entry)
+        jobs = [entry[3]._replace(attempts=entry[3].attempts + 1) for entry in due]
+        for job in jobs:
+            self.running[job.id] = job
+        return jobs
+
+    async def complete(self, job: Job):
+        self.running.pop(job.id, None)
+
+    async def fail(self, job: Job, error: str):
+        self.running.pop(job.id, None)
+        if job.attempts >= job.max_attempts:
+            self.dead.append((job, error))
+        else:
+            self._push(job._replace(run_at=self.clock() + retry_delay(job.attempts)))
+
+    async def requeue_dead(self, kind: Optional[str] = None) -> int:
+        requeue = [job for job, _ in self.dead if kind is None or job.kind == kind]
+        self.dead = [(job, e) for job, e in self.dead if job not in requeue]
+        for job in requeue:
+            self._push(job._replace(attempts=0, run_at=self.clock()))
+        return len(requeue)
+
+    async def stats(self) -> dict:
+        counts: Dict[str, Counter] = {}
+        for status, jobs in (
+            (QUEUED, [entry[3] for entry in self._ready]),
+            (RUNNING, self.running.values()),
+            (DEAD, [job for job, _ in self.dead]),
+        ):
+            for job in jobs:
+                counts.setdefault(job.kind, Counter())[status] += 1
+        return {
+            "backend": "memory",
+            "jobs": {kind: dict(c) for kind, c in counts.items()},
+        }
+
+
+class InlineQueue(JobQueue):
+    """Runs every job as soon as it is enqueued, inside the caller's transaction.
+
+    Keeps the behaviour of doing the work in the request, for deployments
+    without a worker and for tests that read the results right away.
+    """
+
+    async def enqueue(self, db: AsyncSession, job: Job):
+        # Handlers read with Core queries, which do not autoflush; a worker
+        # would see the caller's writes, so flush them first
+        await db.flush()
+        await handlers[job.kind](db, job.payload)
+
+    async def claim(self, limit: int) -> List[Job]:
+        return []  # Nothing is ever stored
+
+    async def complete(self, job: Job):
+        pass
+
+    async def fail(self, job: Job, error: str):
+        pass  # Errors propagate to the caller instead
+
+    async def requeue_dead(self, kind: Optional[str] = None) -> int:
+        return 0
+
+    async def stats(self) -> dict:
+        return {"backend": "inline", "jobs": {}}
+
+
+def make_queue(backend: str) -> JobQueue:
+    if backend == "database":
+        return DatabaseQueue()
+    if backend == "memory":
+        return MemoryQueue()
+    if backend == "inline":
+        return InlineQueue()
+    raise ValueError(f"Unknown JOB_BACKEND {backend!r}")
+
+
+job_queue = make_queue(JOB_BACKEND)
+
+
+async def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: Dict[str, Any],
+    priority: int = PRIORITY_NORMAL,
+    delay: float = 0,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+):
+    """Queues a `kind` job; it runs only if the caller's transaction commits."""
+    if kind not in handlers:
+        raise ValueError(f"No handler registered for {kind!r} jobs")
+    run_at = _now() + timedelta(seconds=delay) if delay else None
+    await job_queue.enqueue(
+        db,
+        Job(
+            id=None,
+            kind=kind,
+            payload=payload,
+            priority=priority,
+            max_attempts=max_attempts,
+            run_at=run_at,
+        ),
+    )
+
+
+# MemoryQueue jobs are published on commit and dropped on rollback, like rows
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(db: Session):
+    for queue, job in db.info.pop("memory_jobs", ()):
+        queue._push(job)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(db: Session):
+    db.info.pop("memory_jobs", None)
+
+
+# --- Worker ---
+class Worker:
+    """Claims due jobs in batches and runs each in its own transaction."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        session_factory=SessionLocal,
+        batch_size: int = JOB_BATCH_SIZE,
+        poll_interval: float = JOB_POLL_INTERVAL,
+    ):
+        self.queue = queue
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.counts = Counter()
+
+    async def run_once(self) -> int:
+        """Runs one batch of due jobs concurrently; returns how many were claimed.
+
+        Running them together lets handlers share work, e.g. several analysis
+        jobs end up in one batched model call.
+        """
+        jobs = await self.queue.claim(self.batch_size)
+        await asyncio.gather(*[self._run(job) for job in jobs])
+        return len(jobs)
+
+    async def _run(self, job: Job):
+        fn = handlers.get(job.kind)
+        if fn is None:
+            # Nothing will handle it on a retry either
+            await self.queue.fail(
+                job._replace(attempts=job.max_attempts), f"No handler for {job.kind!r}"
+            )
+            self.counts["dead"] += 1
+            return
+        try:
+            async with self.session_factory() as db:
+                await fn(db, job.payload)
+                await db.commit()
+        except Exception as e:
+            logger.warning(
+                f"Job {job.id} ({job.kind}) failed, attempt {job.attempts}: {e!r}"
+            )
+            await self.queue.fail(job, repr(e))
+            self.counts["dead" if job.attempts >= job.max_attempts else "retried"] += 1
+        else:
+            await self.queue.complete(job)
+            self.counts["completed"] += 1
+
+    async def run(self, stop: asyncio.Event):
+        """Runs batches until `stop` is set, sleeping while the queue is idle."""
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception as e:  # Database unavailable: back off and retry
+                logger.error(f"Claiming jobs failed: {e!r}")
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
@@ -1,10 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Body
+from fastapi import (
+    FastAPI,
+    Depends,
+    HTTPException,
+    status,
+    Request,
+    Response,
+    Body,
+    Query,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import date
-import logging
+from datetime import date, datetime, timedelta, timezone
 from dotenv import load_dotenv
 import json
 import uuid
@@ -12,11 +21,15 @@ import uuid
 # Load environment variables from .env file
 load_dotenv()
 
-from database import SessionLocal, engine, Base, get_db
-import models, schemas, crud, auth
-
-# Create database tables if they don't exist
-models.Base.metadata.create_all(bind=engine)
+from database import SessionLocal, engine, Base, get_db, pool_status
+import models, schemas, crud, auth, caching, dates, responses, startup, stats
+import analysis, jobs, sync, tagger, transfer
+from pagination import InvalidCursor
+from catalog import tag_catalog
+from passwords import HasherBusy, HASH_RETRY_AFTER, hasher
+from compression import CompressionMiddleware, compression_stats
+from metrics import EXPOSITION_CONTENT_TYPE, MetricsMiddleware, metrics
+from cache import shared_cache
 
 # Initialize FastAPI application
 app = FastAPI()
@@ -35,115 +48,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses above COMPRESSION_MINIMUM_SIZE (gzip, or brotli if
+# installed and accepted); see compression.py for the settings
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency and DB query histograms for /metrics, and a log of slow
+# requests with their SQL; added last so it times the other middleware too
+app.add_middleware(MetricsMiddleware)
 
 
+# Password hashing is saturated: shed the request instead of queueing it forever
+@app.exception_handler(HasherBusy)
+async def hasher_busy_handler(request: Request, exc: HasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(HASH_RETRY_AFTER)},
+    )
 
 
-# Default tags for initial application setup
-DEFAULT_TAGS = [
-    {"name": "행복", "category": "감정"},
-    {"name": "슬픔", "category": "감정"},
-    {"name": "분노", "category": "감정"},
-    {"name": "기쁨", "category": "감정"},
-    {"name": "불안", "category": "감정"},
-    {"name": "운동", "category": "활동"},
-    {"name": "공부", "category": "활동"},
-    {"name": "독서", "category": "활동"},
-    {"name": "여행", "category": "활동"},
-    {"name": "식사", "category": "일상"},
-    {"name": "수면", "category": "일상"},
-    {"name": "업무", "category": "일상"},
-    {"name": "휴식", "category": "일상"},
-    {"name": "집", "category": "장소"},
-    {"name": "회사", "category": "장소"},
-    {"name": "학교", "category": "장소"},
-    {"name": "카페", "category": "장소"},
-    {"name": "친구", "category": "관계"},
-    {"name": "가족", "category": "관계"},
-    {"name": "연인", "category": "관계"},
-]
-
-# Default tag packs for in-app purchase simulation
-DEFAULT_TAG_PACKS = [
-    {
-        "name": "프리미엄 감정 팩",
-        "description": "다양한 감정을 표현하는 프리미엄 태그 팩입니다.",
-        "price": 1000,  # Price in cents
-        "product_id": "com.tagmind.premium_emotion_pack",
-        "tags": [
-            {"name": "환희", "category": "감정"},
-            {"name": "평온", "category": "감정"},
-            {"name": "좌절", "category": "감정"},
-            {"name": "희망", "category": "감정"},
-        ],
-    },
-    {
-        "name": "심화 활동 팩",
-        "description": "더욱 세분화된 활동을 기록할 수 있는 태그 팩입니다.",
-        "price": 1500,  # Price in cents
-        "product_id": "com.tagmind.advanced_activity_pack",
-        "tags": [
-            {"name": "요가", "category": "활동"},
-            {"name": "명상", "category": "활동"},
-            {"name": "코딩", "category": "활동"},
-            {"name": "등산", "category": "활동"},
-        ],
-    },
-]
-
-
-# Startup event handler to initialize default data in the database
+# Startup event handler: runs the phases selected by STARTUP_MODE (see startup.py)
+# Schema creation is left to Alembic unless STARTUP_MODE=dev.
 @app.on_event("startup")
 async def initialize_data():
-    db = SessionLocal()
-    try:
-        # Initialize default tags if they don't already exist
-        for tag_data in DEFAULT_TAGS:
-            existing_tag = crud.get_tag_by_name(db, tag_name=tag_data["name"])
-            if not existing_tag:
-                crud.create_tag(
-                    db=db,
-                    tag=schemas.TagCreate(
-                        name=tag_data["name"],
-                        category=tag_data["category"],
-                        is_default=True,
-                    ),
-                )
-
-        # Initialize default tag packs and their associated tags if they don't already exist
-        for pack_data in DEFAULT_TAG_PACKS:
-            existing_pack = crud.get_tag_pack_by_product_id(
-                db, product_id=pack_data["product_id"]
-            )
-            if not existing_pack:
-                tag_pack = crud.create_tag_pack(
-                    db=db,
-                    tag_pack=schemas.TagPackBase(
-                        name=pack_data["name"],
-                        description=pack_data["description"],
-                        price=pack_data["price"],
-                        product_id=pack_data["product_id"],
-                    ),
-                )
-                for tag_data in pack_data["tags"]:
-                    existing_tag = crud.get_tag_by_name(db, tag_name=tag_data["name"])
-                    if not existing_tag:
-                        crud.create_tag(
-                            db=db,
-                            tag=schemas.TagCreate(
-                                name=tag_data["name"],
-                                category=tag_data["category"],
-                                is_default=False,  # Tags in packs are not default
-                                tag_pack_id=tag_pack.id,
-                            ),
-                        )
-        db.commit()
-    except Exception as e:
-        # Rollback changes if any error occurs during initialization
-        logging.error(f"Error initializing data: {e}")
-        db.rollback()
-    finally:
-        db.close()
+    app.state.startup_report = await startup.run_startup()
+    # Listen for cache invalidations sent by other workers (when CACHE_URL is set)
+    await shared_cache.start()
+    # Load the tag suggestion model now rather than on the first suggestion
+    tagger.tag_suggester.model
 
 
 # Root endpoint for basic API health check
@@ -152,32 +84,59 @@ async def read_root():
     return {"message": "Welcome to TagMind Backend (Revised)!"}
 
 
+# Shut the password hashing workers down with the application
+@app.on_event("shutdown")
+async def shutdown_hasher():
+    hasher.shutdown()
+
+
+# Stop listening for invalidations and close the cache connection
+@app.on_event("shutdown")
+async def close_shared_cache():
+    await shared_cache.close()
+
+
 # --- Authentication Endpoints ---
 # User registration endpoint
 @app.post("/auth/signup", response_model=schemas.UserResponse)
-async def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def signup(
+    user: schemas.UserCreate, db: AsyncSession = Depends(get_db)
+):
+    db_user = await crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return await crud.create_user(db=db, user=user)
 
 
 # User login endpoint to obtain JWT token
 @app.post("/auth/token", response_model=schemas.Token)
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not crud.verify_password(form_data.password, user.password_hash):
+    user = await crud.get_user_by_email(db, email=form_data.username)
+    if not user or not await crud.verify_password(
+        form_data.password, user.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = auth.create_access_token(data={"sub": user.email})
+    access_token = auth.create_user_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+# Revoke every token issued to the current user (e.g. "log out everywhere")
+@app.post("/auth/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_tokens(
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    await crud.revoke_user_tokens(db, user_id=current_user.id)
+    return
+
+
 # Get current authenticated user's details
 @app.get("/users/me", response_model=schemas.UserResponse)
 async def read_users_me(
@@ -192,45 +151,166 @@ async def read_users_me(
 async def create_diary(
     diary_data: schemas.DiaryCreate,
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     # Image upload logic removed as per PR feedback. If image upload is needed,
     # it should be handled by a separate dedicated service or endpoint.
     try:
-        db_diary = crud.create_diary(db=db, diary=diary_data, user_id=current_user.id)
+        db_diary = await crud.create_diary(
+            db=db, diary=diary_data, user_id=current_user.id
+        )
         return db_diary
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Failed to create diary: {e}")
 
 
-# Retrieve a list of diary entries for the current user, with optional date filtering
-@app.get("/diaries", response_model=List[schemas.DiaryResponse])
+# Tags for a diary being written, predicted from its text by the local model
+# (see tagger.py); only tags the user can attach are suggested, and none
+# until the model has been trained
+@app.post("/diaries/suggest-tags", response_model=List[schemas.TagPrediction])
+async def suggest_tags_for_text(
+    request: schemas.TagPredictionRequest,
+    limit: int = Query(tagger.TAGGER_SUGGESTIONS, ge=1, le=50),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    model = tagger.tag_suggester.model
+    if model is None:
+        return []
+    chosen = set(request.tags)
+    usable = {
+        tag.id: tag
+        for tag in await tag_catalog.user_tags(db, current_user.id)
+        if tag.id not in chosen
+    }
+    suggestions = model.suggest(
+        request.title, request.content, usable.keys(), limit=limit
+    )
+    return [
+        {**usable[tag_id]._asdict(), "confidence": confidence}
+        for tag_id, confidence in suggestions
+    ]
+
+
+# Retrieve a page of diary entries for the current user, with optional date filtering
+@app.get("/diaries", response_model=schemas.DiaryPage)
 async def read_diaries(
-    skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,  # next_cursor from the previous page
     date: Optional[date] = None,  # Optional date parameter for filtering diaries by creation date
+    date_from: Optional[date] = Query(None, alias="from"),  # Inclusive range start
+    date_to: Optional[date] = Query(None, alias="to"),  # Inclusive range end
+    tz: Optional[str] = None,  # IANA timezone for day boundaries, e.g. "Asia/Seoul"
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        if date:
+            # If date is provided, fetch diaries for that specific date
+            page = await crud.get_diaries_by_date(
+                db,
+                user_id=current_user.id,
+                date_str=date.isoformat(),
+                limit=limit,
+                cursor=cursor,
+                tz=tz,
+            )
+        elif date_from or date_to:
+            page = await crud.get_diaries_in_range(
+                db,
+                user_id=current_user.id,
+                first_day=date_from,
+                last_day=date_to,
+                limit=limit,
+                cursor=cursor,
+                tz=tz,
+            )
+        else:
+            # Otherwise, return all diaries for the user
+            page = await crud.get_diaries(
+                db, user_id=current_user.id, limit=limit, cursor=cursor
+            )
+    except ValueError as e:
+        # Covers malformed cursors (InvalidCursor) and unknown timezones
+        raise HTTPException(status_code=400, detail=str(e))
+    # Rows come straight from the database, so response_model validation is skipped
+    return responses.FastJSONResponse(responses.diary_page(page))
+
+
+# Per-day diary counts for a month or week calendar view
+# Declared before /diaries/{diary_id} so "calendar" is not parsed as an id
+@app.get("/diaries/calendar", response_model=schemas.CalendarResponse)
+async def read_diary_calendar(
+    date: date,  # Any day inside the month/week to show
+    view: str = Query("month", pattern="^(month|week)$"),
+    tz: Optional[str] = None,
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    if date:
-        # If date is provided, fetch diaries for that specific date
-        return crud.get_diaries_by_date(
-            db, user_id=current_user.id, date_str=date.isoformat(), skip=skip, limit=limit
+    if view == "week":
+        first_day, last_day = dates.week_span(date)
+    else:
+        first_day, last_day = dates.month_span(date)
+    try:
+        counts = await crud.count_diaries_per_day(
+            db,
+            user_id=current_user.id,
+            first_day=first_day,
+            last_day=last_day,
+            tz=tz,
         )
-    # Otherwise, return all diaries for the user
-    return crud.get_diaries(db, user_id=current_user.id, skip=skip, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "start": first_day,
+        "end": last_day,
+        "days": [{"date": day, "count": count} for day, count in counts.items()],
+    }
+
+
+# Download all of the current user's diaries as NDJSON (one diary per line)
+@app.get("/diaries/export")
+async def export_diaries(
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+):
+    return StreamingResponse(
+        transfer.export_diaries(SessionLocal, current_user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="diaries.ndjson"'},
+    )
+
+
+# Create many diaries from an NDJSON body (the format /diaries/export writes)
+@app.post("/diaries/import", response_model=schemas.ImportResult)
+async def import_diaries(
+    request: Request,
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return await transfer.import_diaries(
+        db, current_user.id, transfer.read_lines(request.stream())
+    )
 
 
 # Retrieve a single diary entry by ID
 @app.get("/diaries/{diary_id}", response_model=schemas.DiaryResponse)
 async def read_diary(
     diary_id: int,
+    request: Request,
+    response: Response,
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_diary = crud.get_diary(db, diary_id=diary_id)
-    if db_diary is None or db_diary.user_id != current_user.id:
+    # Check the ETag against (id, updated_at) before loading the diary and its tags
+    version = await crud.get_diary_version(db, diary_id=diary_id)
+    if version is None or version.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Diary not found")
+    etag = caching.make_etag("diary", diary_id, version.updated_at.isoformat())
+    if caching.etag_matches(request.headers.get("if-none-match"), etag):
+        return caching.not_modified(etag, caching.PRIVATE_REVALIDATE)
+
+    db_diary = await crud.get_diary(db, diary_id=diary_id)
+    caching.set_validators(response, etag, caching.PRIVATE_REVALIDATE)
     return db_diary
 
 
@@ -240,12 +320,12 @@ async def update_diary(
     diary_id: int,
     diary: schemas.DiaryUpdate,
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_diary = crud.get_diary(db, diary_id=diary_id)
+    db_diary = await crud.get_diary(db, diary_id=diary_id)
     if db_diary is None or db_diary.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Diary not found")
-    return crud.update_diary(db=db, db_diary=db_diary, diary_update=diary)
+    return await crud.update_diary(db=db, db_diary=db_diary, diary_update=diary)
 
 
 # Delete a diary entry by ID
@@ -253,31 +333,164 @@ async def update_diary(
 async def delete_diary(
     diary_id: int,
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_diary = crud.get_diary(db, diary_id=diary_id)
+    db_diary = await crud.get_diary(db, diary_id=diary_id)
     if db_diary is None or db_diary.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Diary not found")
-    crud.delete_diary(db=db, diary_id=diary_id)
+    await crud.delete_diary(db=db, diary_id=diary_id)
     return
 
 
+# Sentiment and entities of a diary, filled in by the analysis job some time
+# after each write; 404 until the diary has been analyzed
+@app.get("/diaries/{diary_id}/analysis", response_model=schemas.AnalysisResponse)
+async def read_diary_analysis(
+    diary_id: int,
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    version = await crud.get_diary_version(db, diary_id=diary_id)
+    if version is None or version.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Diary not found")
+    result = await analysis.get_result(db, diary_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Diary not analyzed yet")
+    return result
+
+
+# --- Sync Endpoints ---
+# Diaries created, updated or deleted since the token of the previous sync.
+# Without `since` every diary is returned; keep calling with next_token while
+# has_more is true, then store it for the next sync.
+@app.get("/sync", response_model=schemas.SyncResponse)
+async def sync_diaries(
+    since: Optional[str] = None,
+    limit: int = Query(sync.SYNC_PAGE_SIZE, ge=1, le=sync.SYNC_PAGE_SIZE),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        changes = await crud.get_changes(
+            db, user_id=current_user.id, since=since, limit=limit
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return responses.FastJSONResponse(responses.sync_page(changes))
+
+
 # --- Tags & Tag Store Endpoints ---
 # Get all available tags for the current user (default and purchased)
 @app.get("/tags", response_model=List[schemas.TagResponse])
 async def get_available_tags(
+    request: Request,
+    response: Response,
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Returns all tags available to the current user (default + purchased)."""
-    return crud.get_user_tags(db, user_id=current_user.id)
+    snapshot = await tag_catalog.snapshot(db)
+    owned = await tag_catalog.owned_pack_ids(db, current_user.id)
+    etag = caching.make_etag(
+        "tags", current_user.id, snapshot.content_hash, *sorted(owned)
+    )
+    if caching.etag_matches(request.headers.get("if-none-match"), etag):
+        return caching.not_modified(etag, caching.PRIVATE_REVALIDATE)
+    caching.set_validators(response, etag, caching.PRIVATE_REVALIDATE)
+    return await tag_catalog.user_tags(db, user_id=current_user.id)
+
+
+# Suggest tags that usually go with the ones already picked, e.g. ?with=1,5
+@app.get("/tags/suggest", response_model=List[schemas.TagSuggestion])
+async def suggest_tags(
+    with_: str = Query(..., alias="with"),  # Comma-separated tag ids
+    limit: int = Query(10, ge=1, le=50),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        tag_ids = {int(tag_id) for tag_id in with_.split(",") if tag_id.strip()}
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="with must be comma-separated tag ids"
+        )
+    suggestions = await stats.suggest_tags(db, current_user.id, tag_ids, limit=limit)
+    tags = (await tag_catalog.snapshot(db)).tags
+    return [
+        {**tags[tag_id]._asdict(), "score": score} for tag_id, score in suggestions
+    ]
 
 
 # Get all tag packs available for purchase in the store
 @app.get("/tags/store", response_model=List[schemas.TagPackResponse])
-async def get_tag_store_packs(db: Session = Depends(get_db)):
+async def get_tag_store_packs(
+    request: Request, response: Response, db: AsyncSession = Depends(get_db)
+):
     """Returns all tag packs available for purchase in the store."""
-    return crud.get_all_tag_packs(db)
+    snapshot = await tag_catalog.snapshot(db)
+    # Public and identical for everyone, so shared caches may store it too
+    etag = caching.make_etag("tag-store", snapshot.content_hash)
+    cache_control = f"public, max-age={caching.TAG_STORE_MAX_AGE}"
+    if caching.etag_matches(request.headers.get("if-none-match"), etag):
+        return caching.not_modified(etag, cache_control)
+    caching.set_validators(response, etag, cache_control)
+    return snapshot.packs
+
+
+# --- Statistics Endpoints ---
+# Longest date range a single /stats request may cover
+MAX_STATS_DAYS = 366
+
+
+# Tag usage statistics (top tags, per-category totals, daily series)
+@app.get("/stats/tags", response_model=schemas.TagStatsResponse)
+async def read_tag_stats(
+    date_from: Optional[date] = Query(None, alias="from"),  # Defaults to 30 days back
+    date_to: Optional[date] = Query(None, alias="to"),  # Defaults to today
+    limit: int = Query(10, ge=1, le=100),  # Number of top tags
+    tag_id: Optional[int] = None,  # Restrict the daily series to one tag
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Served from the tag_usage_daily aggregate, so the cost follows the
+    size of the answer rather than the user's diary history."""
+    last_day = date_to or stats.usage_day(datetime.now(timezone.utc))
+    first_day = date_from or last_day - timedelta(days=29)
+    if first_day > last_day or (last_day - first_day).days >= MAX_STATS_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"from must not be after to, spanning at most {MAX_STATS_DAYS} days",
+        )
+    return await stats.tag_stats(
+        db, current_user.id, first_day, last_day, limit=limit, tag_id=tag_id
+    )
+
+
+# Default number of buckets /stats/mood returns per view
+MOOD_DEFAULT_SPANS = {
+    "day": timedelta(days=30),
+    "week": timedelta(weeks=12),
+    "month": timedelta(days=365),
+}
+
+
+# Emotion ("감정") tag distribution per day, week or month
+@app.get("/stats/mood", response_model=schemas.MoodResponse)
+async def read_mood_stats(
+    view: str = Query("week", pattern="^(day|week|month)$"),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),  # Defaults to today
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    last_day = date_to or stats.usage_day(datetime.now(timezone.utc))
+    first_day = date_from or last_day - MOOD_DEFAULT_SPANS[view] + timedelta(days=1)
+    if first_day > last_day or (last_day - first_day).days >= MAX_STATS_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"from must not be after to, spanning at most {MAX_STATS_DAYS} days",
+        )
+    return await stats.mood_trend(db, current_user.id, view, first_day, last_day)
 
 
 # --- In-App Purchase (IAP) Endpoints ---
@@ -286,7 +499,7 @@ async def get_tag_store_packs(db: Session = Depends(get_db)):
 async def purchase_tag_pack(
     purchase_request: schemas.PurchaseRequest,
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Handles the purchase of a tag pack. In a real app, this would involve
@@ -294,29 +507,89 @@ async def purchase_tag_pack(
     """
     product_id = purchase_request.product_id
     # 1. Verify the product_id is a valid tag pack
-    tag_pack = crud.get_tag_pack_by_product_id(db, product_id=product_id)
+    tag_pack = await crud.get_tag_pack_by_product_id(db, product_id=product_id)
     if not tag_pack:
         raise HTTPException(status_code=404, detail="Product not found.")
 
     # 2. Check if the user already owns this pack
-    if crud.user_owns_tag_pack(db, user_id=current_user.id, tag_pack_id=tag_pack.id):
+    if await crud.user_owns_tag_pack(
+        db, user_id=current_user.id, tag_pack_id=tag_pack.id
+    ):
         raise HTTPException(status_code=400, detail="You already own this item.")
 
     # 3. Grant ownership to the user
-    crud.grant_tag_pack_to_user(db, user_id=current_user.id, tag_pack_id=tag_pack.id)
-    db.commit()
+    await crud.grant_tag_pack_to_user(
+        db, user_id=current_user.id, tag_pack_id=tag_pack.id
+    )
 
     # 4. Return a success response
     return {"status": "success", "message": f"Successfully purchased {tag_pack.name}!"}
 
 
 # --- Search Endpoints ---
-# Search diary entries by query string, with optional date filtering
-@app.get("/search", response_model=List[schemas.DiaryResponse])
+# Search diary entries by query string, ranked by relevance
+@app.get("/search", response_model=schemas.DiaryPage)
 async def search_diaries(
     query: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,  # next_cursor from the previous page
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    return crud.search_diaries(db, user_id=current_user.id, query=query)
+    try:
+        page = await crud.search_diaries(
+            db, user_id=current_user.id, query=query, limit=limit, cursor=cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return responses.FastJSONResponse(responses.diary_page(page))
+
+
+# --- Internal Endpoints ---
+# Password hasher queue depth and latency
+@app.get("/internal/hasher")
+async def read_hasher_stats():
+    return hasher.stats()
+
+
+# Database connection pool usage of this process
+@app.get("/internal/pool")
+async def read_pool_stats():
+    return pool_status(engine)
+
+
+# Phase timings of this worker's startup
+@app.get("/internal/startup")
+async def read_startup_report(request: Request):
+    return request.app.state.startup_report.as_dict()
+
+
+# Responses compressed per encoding and the bytes saved by this process
+@app.get("/internal/compression")
+async def read_compression_stats():
+    return compression_stats.as_dict()
+
+
+# Shared cache tiers: hits per tier, loads and coalesced misses of this process
+@app.get("/internal/cache")
+async def read_cache_stats():
+    return shared_cache.stats()
+
+
+# Background jobs per kind and status (queued, running, dead)
+@app.get("/internal/jobs")
+async def read_job_stats():
+    return await jobs.job_queue.stats()
+
+
+# Prometheus scrape target: per-route request counts, latency, queries and DB
+# time histograms of this process (see metrics.py)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type=EXPOSITION_CONTENT_TYPE)
+
 
+# The tag suggestion model this process serves (size and training time)
+@app.get("/internal/tagger")
+async def read_tagger_stats():
+    return tagger.tag_suggester.stats()
@@ -0,0 +1,307 @@
+import bisect
+import contextvars
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Requests taking at least this long are logged with the SQL they ran
+METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "500"))
+# Statements kept per request for that log; the rest are only counted
+METRICS_SLOW_SQL_LIMIT = int(os.getenv("METRICS_SLOW_SQL_LIMIT", "50"))
+
+# Characters of each statement written to the slow-request log
+SQL_LOG_LENGTH = 500
+
+# Histogram bucket bounds: request and DB time in seconds, queries per request
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Route label of requests no route matched (404s), so that arbitrary paths
+# cannot create new label values
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """Observation counts per bucket, plus their sum (Prometheus histogram)."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, observations <= le) per bucket, ending with +Inf."""
+        bounds = [_format_number(bound) for bound in self.buckets] + ["+Inf"]
+        running, result = 0, []
+        for bound, count in zip(bounds, self.counts):
+            running += count
+            result.append((bound, running))
+        return result
+
+
+class RequestStats:
+    """The database work of one request, filled in by the engine events."""
+
+    __slots__ = ("queries", "db_time", "statements", "sql_limit")
+
+    def __init__(self, sql_limit: int = METRICS_SLOW_SQL_LIMIT):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: List[Tuple[str, float]] = []
+        self.sql_limit = sql_limit
+
+    def add(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_time += seconds
+        if len(self.statements) < self.sql_limit:
+            self.statements.append((statement, seconds))
+
+
+# Stats of the request being served; the middleware sets it and the engine
+# events, which run in the request's task, add to it
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = (
+    contextvars.ContextVar("request_stats", default=None)
+)
+
+
+class Metrics:
+    """Per-process request and database metrics, rendered at /metrics.
+
+    Each API process keeps its own; Prometheus scrapes and sums them.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_queries: Dict[Tuple[str, str], Histogram] = {}
+        self.request_db_time: Dict[Tuple[str, str], Histogram] = {}
+        self.slow_requests = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def observe_request(
+        self, method: str, route: str, status: int, seconds: float, stats: RequestStats
+    ):
+        key = (method, route)
+        self.requests[(method, route, status)] = (
+            self.requests.get((method, route, status), 0) + 1
+        )
+        for histograms, buckets, value in (
+            (self.latency, LATENCY_BUCKETS, seconds),
+            (self.request_queries, QUERY_BUCKETS, stats.queries),
+            (self.request_db_time, LATENCY_BUCKETS, stats.db_time),
+        ):
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def observe_query(self, seconds: float):
+        self.queries += 1
+        self.query_seconds += seconds
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        _counter(
+            lines,
+            "tagmind_http_requests_total",
+            "Requests served, per route and status.",
+            {
+                _labels(method=method, route=route, status=str(status)): count
+                for (method, route, status), count in sorted(self.requests.items())
+            },
+        )
+        _histograms(
+            lines,
+            "tagmind_http_request_duration_seconds",
+            "Time from receiving a request to the end of its response.",
+            self.latency,
+        )
+        _histograms(
+            lines,
+            "tagmind_http_request_db_queries",
+            "SQL statements run while serving a request.",
+            self.request_queries,
+        )
+        _histograms(
+            lines,
+            "tagmind_http_request_db_seconds",
+            "Time spent in SQL statements while serving a request.",
+            self.request_db_time,
+        )
+        _counter(
+            lines,
+            "tagmind_http_slow_requests_total",
+            "Requests slower than METRICS_SLOW_REQUEST_MS.",
+            {"": self.slow_requests},
+        )
+        _counter(
+            lines,
+            "tagmind_db_queries_total",
+            "SQL statements run by this process, in requests or not.",
+            {"": self.queries},
+        )
+        _counter(
+            lines,
+            "tagmind_db_query_seconds_total",
+            "Time spent in SQL statements by this process.",
+            {"": self.query_seconds},
+        )
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+# Content type of the text exposition format
+EXPOSITION_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _counter(
+    lines: List[str], name: str, description: str, samples: Dict[str, float]
+):
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} counter")
+    for labels, value in samples.items():
+        selector = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}{selector} {_format_number(value)}")
+
+
+def _histograms(
+    lines: List[str],
+    name: str,
+    description: str,
+    histograms: Dict[Tuple[str, str], Histogram],
+):
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), histogram in sorted(histograms.items()):
+        labels = _labels(method=method, route=route)
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {_format_number(histogram.sum)}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+# --- Database instrumentation ---
+def instrument_engine(engine):
+    """Times every statement of `engine` (async or sync); safe to call twice."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    for name, listener in (
+        ("before_cursor_execute", _before_cursor_execute),
+        ("after_cursor_execute", _after_cursor_execute),
+        ("handle_error", _handle_error),
+    ):
+        if not event.contains(sync_engine, name, listener):
+            event.listen(sync_engine, name, listener)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+    metrics.observe_query(seconds)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.add(statement, seconds)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    conn = context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+# --- Middleware ---
+class MetricsMiddleware:
+    """Records the latency, status and DB work of every HTTP request.
+
+    Requests are labelled with their route template (/diaries/{diary_id}),
+    not their path, so the number of series stays bounded. Requests slower
+    than `slow_request_ms` are logged with their SQL statements (without
+    parameters, which hold diary text).
+    """
+
+    def __init__(
+        self,
+        app,
+        slow_request_ms: float = METRICS_SLOW_REQUEST_MS,
+        registry: Metrics = metrics,
+    ):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500  # Unless a response starts, the request failed
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - started
+            _current_request.reset(token)
+            # The router stores the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            self.registry.observe_request(
+                scope["method"], route, status, seconds, stats
+            )
+            if seconds * 1000 >= self.slow_request_ms:
+                self.registry.slow_requests += 1
+                log_slow_request(scope, status, seconds, stats)
+
+
+def log_slow_request(scope, status: int, seconds: float, stats: RequestStats):
+    lines = [
+        f"Slow request {scope['method']} {scope['path']}: {seconds * 1000:.0f} ms, "
+        f"status {status}, {stats.queries} queries in {stats.db_time * 1000:.0f} ms"
+    ]
+    for statement, query_seconds in stats.statements:
+        sql = " ".join(statement.split())
+        if len(sql) > SQL_LOG_LENGTH:
+            sql = sql[:SQL_LOG_LENGTH] + "..."
+        lines.append(f"  {query_seconds * 1000:8.1f} ms  {sql}")
+    if stats.queries > len(stats.statements):
+        lines.append(f"  ... and {stats.queries - len(stats.statements)} more")
+    logger.warning("\n".join(lines))
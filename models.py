@@ -3,12 +3,15 @@ from sqlalchemy import (
     Integer,
     String,
     DateTime,
+    Date,
     ForeignKey,
     Text,
     Boolean,
     Table,
+    Index,
+    JSON,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from database import Base
 
@@ -29,6 +32,9 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)  # Hashed password for security
     nickname = Column(String, unique=True, index=True, nullable=True)
+    token_version = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )  # Embedded in issued JWTs; bumping it revokes every outstanding token
     created_at = Column(DateTime(timezone=True), server_default=func.now())  # Timestamp of user creation
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())  # Timestamp of last update
 
@@ -49,6 +55,12 @@ class Diary(Base):
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )  # Timestamp of last update, defaults to creation time
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # Foreign key to User model
+    search_document = deferred(
+        Column(Text, nullable=True)
+    )  # Normalized title + content + tag names, maintained by search.index_diary
+    sync_seq = Column(
+        Integer, nullable=False, server_default="0"
+    )  # Per-user change number of the last write, assigned by sync.next_sync_seq
 
     # Relationships to other models
     owner = relationship("User", back_populates="diaries")
@@ -56,6 +68,18 @@ class Diary(Base):
         "Tag", secondary=diary_tags_association, back_populates="diaries"
     )  # Many-to-many relationship with Tag model
 
+    __table_args__ = (
+        # Serves the newest-first keyset pagination of a user's diaries
+        Index(
+            "ix_diaries_user_id_created_at_id",
+            user_id,
+            created_at.desc(),
+            id.desc(),
+        ),
+        # Serves /sync: the diaries changed after a given change number
+        Index("ix_diaries_user_id_sync_seq", user_id, sync_seq),
+    )
+
 
 class Tag(Base):
     """Represents a tag that can be associated with diary entries."""
@@ -104,3 +128,113 @@ class UserTagPack(Base):
     # Relationships to other models
     user = relationship("User", back_populates="user_tag_packs")
     tag_pack = relationship("TagPack", back_populates="user_tag_packs")
+
+
+class DiarySearchTerm(Base):
+    """Represents one posting of the n-gram search index (a term occurring in a diary)."""
+    __tablename__ = "diary_search_terms"
+    diary_id = Column(
+        Integer, ForeignKey("diaries.id", ondelete="CASCADE"), primary_key=True
+    )
+    term = Column(String, primary_key=True)  # Character unigram or bigram
+    user_id = Column(Integer, nullable=False)  # Denormalized so lookups never touch diaries
+    weight = Column(Integer, nullable=False)  # Field-weighted term frequency
+
+    __table_args__ = (
+        Index("ix_diary_search_terms_user_id_term", "user_id", "term"),
+    )
+
+
+class CatalogState(Base):
+    """Key/value markers about the tag catalog (e.g. the seed data last applied)."""
+    __tablename__ = "catalog_state"
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class TagUsageDaily(Base):
+    """Number of a user's diaries carrying a tag, per local day (maintained by stats.py)."""
+    __tablename__ = "tag_usage_daily"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # Local date of the diary in DEFAULT_TIMEZONE
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+
+class TagUsageRollup(Base):
+    """Weekly and monthly totals of TagUsageDaily, maintained alongside it."""
+    __tablename__ = "tag_usage_rollups"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    period = Column(String, primary_key=True)  # "week" or "month"
+    start = Column(Date, primary_key=True)  # Monday of the week / first of the month
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+
+class TagCooccurrence(Base):
+    """How many diaries carry both tags, per user and globally (maintained by stats.py)."""
+    __tablename__ = "tag_cooccurrence"
+    user_id = Column(Integer, primary_key=True)  # 0 for the counts over all users
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    other_tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    count = Column(Integer, nullable=False)  # Stored for both (a, b) and (b, a)
+
+    __table_args__ = (
+        # Sums a pair over every user when its global count is refreshed
+        Index("ix_tag_cooccurrence_tag_id_other_tag_id", "tag_id", "other_tag_id"),
+    )
+
+
+class SyncCounter(Base):
+    """Last change number handed out per user (see sync.py)."""
+    __tablename__ = "sync_counters"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    seq = Column(Integer, nullable=False)
+
+
+class DiaryTombstone(Base):
+    """Marks a deleted diary so /sync can report the deletion."""
+    __tablename__ = "diary_tombstones"
+    diary_id = Column(Integer, primary_key=True)  # No FK: the diary row is gone
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sync_seq = Column(Integer, nullable=False)  # Change number of the deletion
+    deleted_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_diary_tombstones_user_id_sync_seq", "user_id", "sync_seq"),
+    )
+
+
+class Job(Base):
+    """A background job waiting for, or being run by, a worker (see jobs.py)."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # Name of the registered handler
+    payload = Column(Text, nullable=False)  # JSON arguments of the handler
+    priority = Column(Integer, nullable=False, default=0)  # Higher runs first
+    status = Column(String, nullable=False)  # "queued", "running" or "dead"
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False)  # Not claimed before this
+    locked_at = Column(DateTime(timezone=True), nullable=True)  # When a worker claimed it
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Serves the claim query: due jobs of a status, highest priority first
+        Index("ix_jobs_status_priority_run_at", status, priority.desc(), run_at),
+    )
+
+
+class AnalysisResult(Base):
+    """Model analysis of a diary's text (see analysis.py)."""
+    __tablename__ = "analysis_results"
+    diary_id = Column(
+        Integer, ForeignKey("diaries.id", ondelete="CASCADE"), primary_key=True
+    )
+    content_hash = Column(String, nullable=False, index=True)  # Of the analyzed text and model
+    model = Column(String, nullable=False)
+    sentiment = Column(JSON, nullable=True)  # {"label": ..., "score": ...}
+    entities = Column(JSON, nullable=True)  # People, places and things mentioned
+    analyzed_at = Column(DateTime(timezone=True), server_default=func.now())
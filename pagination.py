@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import bindparam, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor this server did not issue."""
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Packs the sort key of the last row into an opaque, URL-safe token."""
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(
+    token: str, size: int, types: Optional[Sequence[type]] = None
+) -> List[Any]:
+    """The values of a cursor, checked against the Python `types` of its keys
+    when given, so that a forged cursor is rejected instead of being bound
+    to a parameter of another type."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        values = [
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Malformed cursor")
+    if len(values) != size:
+        raise InvalidCursor("Cursor does not belong to this listing")
+    if types is not None and not all(map(_is_a, values, types)):
+        raise InvalidCursor("Malformed cursor")
+    return values
+
+
+def _is_a(value: Any, python_type: type) -> bool:
+    if isinstance(value, bool):  # bool is an int, but no key is a flag
+        return python_type is bool
+    if python_type is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+
+def _python_type(key) -> type:
+    try:
+        return key.type.python_type
+    except NotImplementedError:  # Untyped expressions accept any value
+        return object
+
+
+async def paginate(
+    db: AsyncSession,
+    stmt,
+    keys: Sequence,
+    key_of: Callable[[Any], Sequence[Any]],
+    limit: int,
+    cursor: Optional[str] = None,
+    item_of: Callable[[Any], Any] = lambda row: row[0],
+) -> Page:
+    """Keyset pagination over `keys`, all sorted descending.
+
+    The cursor is the key of the last row already returned, so every page is
+    a bounded index range scan (`keys < cursor`) no matter how deep it is.
+    One extra row is fetched to know whether another page exists.
+    """
+    if cursor is not None:
+        values = decode_cursor(cursor, len(keys), [_python_type(k) for k in keys])
+        bound = [
+            bindparam(None, value, type_=key.type) for key, value in zip(keys, values)
+        ]
+        stmt = stmt.where(tuple_(*keys) < tuple_(*bound))
+    stmt = stmt.order_by(*[key.desc() for key in keys]).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key_of(rows[-1]))
+    return Page(items=[item_of(row) for row in rows], next_cursor=next_cursor)
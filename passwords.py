@@ -0,0 +1,116 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+# bcrypt cost factor (log2 of the number of rounds). Each step doubles the
+# time of a hash, so lowering it trades brute-force resistance for latency.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Threads dedicated to hashing. The bcrypt C extension releases the GIL, so
+# these run in parallel with the event loop instead of pinning it.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Hashes allowed to wait for a free worker before new ones are rejected.
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "32"))
+
+# Seconds a client is told to wait (Retry-After) when the hasher is saturated.
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "1"))
+
+
+class HasherBusy(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool with backpressure.
+
+    At most `workers` hashes run at once and at most `max_queue` more wait
+    for a worker; anything beyond that fails fast with HasherBusy so a
+    login burst cannot pile up unbounded work behind diary traffic.
+    """
+
+    def __init__(
+        self,
+        rounds: int = BCRYPT_ROUNDS,
+        workers: int = HASH_WORKERS,
+        max_queue: int = HASH_MAX_QUEUE,
+    ):
+        self.context = CryptContext(
+            schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds
+        )
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hasher"
+        )
+        self._pending = 0  # running + queued, only touched on the event loop
+        self._lock = threading.Lock()  # guards _busy_seconds across workers
+        self.completed = 0
+        self.rejected = 0
+        self._busy_seconds = 0.0  # time spent hashing inside the workers
+        self._total_seconds = 0.0  # time from submission to result
+        self._max_seconds = 0.0
+
+    @property
+    def running(self) -> int:
+        return min(self._pending, self.workers)
+
+    @property
+    def queued(self) -> int:
+        return self._pending - self.running
+
+    async def hash(self, password: str) -> str:
+        return await self.run(self.context.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self.run(self.context.verify, password, password_hash)
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) on a hashing worker, or raises HasherBusy."""
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherBusy("Password hashing is saturated, try again later")
+
+        def work():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._busy_seconds += time.perf_counter() - started
+
+        self._pending += 1
+        submitted = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, work)
+        finally:
+            self._pending -= 1
+            elapsed = time.perf_counter() - submitted
+            self.completed += 1
+            self._total_seconds += elapsed
+            self._max_seconds = max(self._max_seconds, elapsed)
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_hash_ms": round(self._busy_seconds / completed * 1000, 2),
+            "avg_latency_ms": round(self._total_seconds / completed * 1000, 2),
+            "max_latency_ms": round(self._max_seconds * 1000, 2),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+hasher = PasswordHasher()
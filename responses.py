@@ -0,0 +1,57 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+import pagination
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard json module is used without it
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson when it is installed.
+
+    Meant for content that is already plain dicts/lists of trusted database
+    values: returning it from an endpoint skips response_model validation.
+    UTC datetimes are written with a "Z" suffix, as pydantic does.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+        return json.dumps(
+            content, ensure_ascii=False, separators=(",", ":"), default=_default
+        ).encode("utf-8")
+
+
+def _default(value):
+    isoformat = getattr(value, "isoformat", None)
+    if isoformat is None:
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+    return isoformat().replace("+00:00", "Z")
+
+
+def diary_item(row) -> dict:
+    """DiaryResponse content of a crud.DiaryRow."""
+    return {**row._asdict(), "tags": [tag._asdict() for tag in row.tags]}
+
+
+def diary_page(page: pagination.Page) -> dict:
+    """DiaryPage content from a page of crud.DiaryRow, without pydantic models."""
+    return {
+        "items": [diary_item(row) for row in page.items],
+        "next_cursor": page.next_cursor,
+    }
+
+
+def sync_page(changes) -> dict:
+    """SyncResponse content from a sync.SyncPage of crud.DiaryRow."""
+    return {
+        "changed": [diary_item(row) for row in changes.changed],
+        "deleted": changes.deleted,
+        "next_token": changes.next_token,
+        "has_more": changes.has_more,
+    }
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from typing import Dict, Optional, List, Literal
+from datetime import date, datetime
 
 
 # --- User Schemas ---
@@ -55,6 +55,11 @@ class TagResponse(BaseModel):
         from_attributes = True
 
 
+# Schema for a suggested tag, ranked by how often it goes with the selected tags
+class TagSuggestion(TagResponse):
+    score: int
+
+
 # --- Tag Pack Schemas ---
 # Base schema for a tag pack (used for creation/request bodies)
 class TagPackBase(BaseModel):
@@ -106,6 +111,128 @@ class DiaryResponse(BaseModel):
         from_attributes = True
 
 
+# Schema for a page of diary entries (keyset pagination envelope)
+class DiaryPage(BaseModel):
+    items: List[DiaryResponse]
+    next_cursor: Optional[str] = None  # Opaque token for the next page, None on the last page
+
+
+# Schema for the diary changes since a /sync token
+class SyncResponse(BaseModel):
+    changed: List[DiaryResponse]  # Created or updated diaries, oldest change first
+    deleted: List[int]  # Ids of deleted diaries
+    next_token: str  # Pass as `since` next time (also when has_more is false)
+    has_more: bool  # More changes are waiting; call again with next_token
+
+
+# Schema for one line of a diary import (NDJSON, the format /diaries/export writes)
+class DiaryImport(BaseModel):
+    title: str
+    content: Optional[str] = None
+    image_url: Optional[str] = None
+    created_at: Optional[datetime] = None  # Defaults to the time of the import
+    tags: List[str] = []  # Tag names
+
+
+# Schema for an import line that was skipped
+class ImportRowError(BaseModel):
+    line: int  # 1-based line number in the request body
+    error: str
+
+
+# Schema for the outcome of a diary import
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportRowError]  # The first errors, up to a fixed limit
+
+
+# Schema for the number of diaries written on one day
+class DayCount(BaseModel):
+    date: date
+    count: int
+
+
+# Schema for a calendar view (month or week) with per-day diary counts
+class CalendarResponse(BaseModel):
+    start: date
+    end: date
+    days: List[DayCount]
+
+
+# Schema for the text of a diary being written, to suggest tags for
+class TagPredictionRequest(BaseModel):
+    title: str = ""
+    content: Optional[str] = None
+    tags: List[int] = []  # Tags already chosen; these are not suggested again
+
+
+# Schema for a tag predicted from the text of a diary
+class TagPrediction(TagResponse):
+    confidence: float  # Share of the probability among the user's tags, 0 to 1
+
+
+# --- Statistics Schemas ---
+# Schema for how often one tag was used
+class TagUsage(BaseModel):
+    tag_id: int
+    name: str
+    category: str
+    count: int
+
+
+# Schema for how often the tags of one category were used
+class CategoryUsage(BaseModel):
+    category: str
+    count: int
+
+
+# Schema for tag usage statistics over a date range
+class TagStatsResponse(BaseModel):
+    start: date
+    end: date
+    top: List[TagUsage]  # Most used tags, descending
+    categories: List[CategoryUsage]  # Uses per tag category, descending
+    days: List[DayCount]  # Tag uses per day (of `tag_id` when given)
+
+
+# Schema for the emotion tag uses of one day, week or month
+class MoodBucket(BaseModel):
+    start: date  # The day, the Monday of the week or the first of the month
+    # Uses on the bucket's days between the response's start and end: the
+    # first and last weeks or months may be partial
+    total: int
+    counts: Dict[str, int]  # Tag name -> uses, tags without uses omitted
+
+
+# Schema for emotion tag trends over a date range
+class MoodResponse(BaseModel):
+    view: str  # "day", "week" or "month"
+    start: date
+    end: date
+    tags: List[str]  # Every emotion tag name
+    buckets: List[MoodBucket]
+
+
+# --- Analysis Schemas ---
+# Schema for the overall mood of a diary as judged by the analysis model
+class Sentiment(BaseModel):
+    label: Literal["positive", "neutral", "negative"]
+    score: float  # -1.0 (most negative) to 1.0 (most positive)
+
+
+# Schema for the stored analysis of a diary
+class AnalysisResponse(BaseModel):
+    diary_id: int
+    model: str
+    sentiment: Sentiment
+    entities: List[str]
+    analyzed_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 # --- In-App Purchase Schemas ---
 # Schema for purchase request body
 class PurchaseRequest(BaseModel):
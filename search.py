@@ -0,0 +1,154 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import jobs, models
+
+# Field weights used when building the postings for a diary.
+# A hit in the title ranks above a hit in a tag name, which ranks above body text.
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+CONTENT_WEIGHT = 1
+
+# Job that (re)indexes a diary after it was written, off the request path
+INDEX_JOB = "index_diary"
+
+# Hangul, latin and digits are all matched by \w, so Korean text is split on
+# whitespace/punctuation exactly like everything else.
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """NFKC-normalizes and case-folds text so documents and queries compare equal."""
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def _ngrams(word: str):
+    # Character unigrams and bigrams. Korean words carry particles/endings
+    # ("행복" vs "행복했다"), so whole-word tokens would miss most searches;
+    # syllable n-grams match any substring regardless of inflection.
+    for i, ch in enumerate(word):
+        yield ch
+        if i + 1 < len(word):
+            yield word[i : i + 2]
+
+
+def extract_terms(text: str, weight: int = 1) -> Counter:
+    terms = Counter()
+    for word in _WORD_RE.findall(normalize(text)):
+        for gram in _ngrams(word):
+            terms[gram] += weight
+    return terms
+
+
+def query_terms(query: str) -> List[str]:
+    """Returns the distinct terms a document must contain to match `query`.
+
+    Bigrams are enough to pin down any word of two or more characters, so
+    unigrams are only used for one-character words (e.g. "집").
+    """
+    terms = set()
+    for word in _WORD_RE.findall(normalize(query)):
+        if len(word) == 1:
+            terms.add(word)
+        else:
+            terms.update(word[i : i + 2] for i in range(len(word) - 1))
+    return sorted(terms)
+
+
+def build_document(title: str, content: str, tag_names: Iterable[str]) -> str:
+    """Builds the normalized text a diary is matched against (one field per line)."""
+    return "\n".join(normalize(part) for part in [title, content or "", *tag_names])
+
+
+def build_terms(title: str, content: str, tag_names: Iterable[str]) -> Counter:
+    terms = extract_terms(title, TITLE_WEIGHT)
+    terms.update(extract_terms(content or "", CONTENT_WEIGHT))
+    for name in tag_names:
+        terms.update(extract_terms(name, TAG_WEIGHT))
+    return terms
+
+
+def postings(
+    diary_id: int, user_id: int, title: str, content: str, tag_names: Iterable[str]
+) -> List[dict]:
+    """diary_search_terms rows of one diary."""
+    return [
+        {"diary_id": diary_id, "user_id": user_id, "term": term, "weight": weight}
+        for term, weight in build_terms(title, content, tag_names).items()
+    ]
+
+
+async def index_diary(
+    db: AsyncSession,
+    diary_id: int,
+    user_id: int,
+    title: str,
+    content: Optional[str],
+    tag_names: Iterable[str],
+):
+    """(Re)builds the search document and postings of a single diary.
+
+    The document is written with a Core UPDATE that sets updated_at to
+    itself, since indexing is not an edit: Diary.updated_at's onupdate would
+    otherwise move it without a new sync_seq or cached-version invalidation.
+    """
+    tag_names = list(tag_names)
+    diaries = models.Diary.__table__
+    await db.execute(
+        update(diaries)
+        .where(diaries.c.id == diary_id)
+        .values(
+            search_document=build_document(title, content, tag_names),
+            updated_at=diaries.c.updated_at,
+        )
+    )
+    await remove_diary(db, diary_id)
+    rows = postings(diary_id, user_id, title, content, tag_names)
+    if rows:
+        await db.execute(models.DiarySearchTerm.__table__.insert(), rows)
+
+
+@jobs.handler(INDEX_JOB)
+async def reindex_diary(db: AsyncSession, payload: dict):
+    """Indexes a diary with its current title, content and tags (idempotent)."""
+    row = (
+        await db.execute(
+            select(
+                models.Diary.id,
+                models.Diary.user_id,
+                models.Diary.title,
+                models.Diary.content,
+            ).where(models.Diary.id == payload["diary_id"])
+        )
+    ).first()
+    if row is None:  # Deleted before the job ran
+        return
+    diary_tags = models.diary_tags_association
+    result = await db.execute(
+        select(models.Tag.name)
+        .join(diary_tags, diary_tags.c.tag_id == models.Tag.id)
+        .where(diary_tags.c.diary_id == row.id)
+    )
+    await index_diary(
+        db, row.id, row.user_id, row.title, row.content, result.scalars().all()
+    )
+
+
+async def remove_diary(db: AsyncSession, diary_id: int):
+    await db.execute(
+        delete(models.DiarySearchTerm).where(
+            models.DiarySearchTerm.diary_id == diary_id
+        )
+    )
+
+
+def like_pattern(query: str) -> str:
+    """Escapes LIKE wildcards in the normalized query and wraps it in `%...%`."""
+    needle = normalize(query).strip()
+    needle = needle.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{needle}%"
@@ -0,0 +1,158 @@
+import hashlib
+import json
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from catalog import mark_catalog_changed
+from database import dialect_insert
+
+# Default tags for initial application setup
+DEFAULT_TAGS = [
+    {"name": "행복", "category": "감정"},
+    {"name": "슬픔", "category": "감정"},
+    {"name": "분노", "category": "감정"},
+    {"name": "기쁨", "category": "감정"},
+    {"name": "불안", "category": "감정"},
+    {"name": "운동", "category": "활동"},
+    {"name": "공부", "category": "활동"},
+    {"name": "독서", "category": "활동"},
+    {"name": "여행", "category": "활동"},
+    {"name": "식사", "category": "일상"},
+    {"name": "수면", "category": "일상"},
+    {"name": "업무", "category": "일상"},
+    {"name": "휴식", "category": "일상"},
+    {"name": "집", "category": "장소"},
+    {"name": "회사", "category": "장소"},
+    {"name": "학교", "category": "장소"},
+    {"name": "카페", "category": "장소"},
+    {"name": "친구", "category": "관계"},
+    {"name": "가족", "category": "관계"},
+    {"name": "연인", "category": "관계"},
+]
+
+# Default tag packs for in-app purchase simulation
+DEFAULT_TAG_PACKS = [
+    {
+        "name": "프리미엄 감정 팩",
+        "description": "다양한 감정을 표현하는 프리미엄 태그 팩입니다.",
+        "price": 1000,  # Price in cents
+        "product_id": "com.tagmind.premium_emotion_pack",
+        "tags": [
+            {"name": "환희", "category": "감정"},
+            {"name": "평온", "category": "감정"},
+            {"name": "좌절", "category": "감정"},
+            {"name": "희망", "category": "감정"},
+        ],
+    },
+    {
+        "name": "심화 활동 팩",
+        "description": "더욱 세분화된 활동을 기록할 수 있는 태그 팩입니다.",
+        "price": 1500,  # Price in cents
+        "product_id": "com.tagmind.advanced_activity_pack",
+        "tags": [
+            {"name": "요가", "category": "활동"},
+            {"name": "명상", "category": "활동"},
+            {"name": "코딩", "category": "활동"},
+            {"name": "등산", "category": "활동"},
+        ],
+    },
+]
+
+
+# Key of the catalog_state row holding the fingerprint of the applied seed
+SEED_STATE_KEY = "seed"
+
+# pg_advisory_xact_lock key serializing seeding across workers ("TMSEED")
+SEED_LOCK_KEY = 0x544D53454544
+
+
+def seed_fingerprint() -> str:
+    """Hash of the seed data; editing DEFAULT_TAGS or the packs changes it."""
+    payload = json.dumps(
+        [DEFAULT_TAGS, DEFAULT_TAG_PACKS], sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _applied_fingerprint(db: AsyncSession):
+    result = await db.execute(
+        select(models.CatalogState.value).where(
+            models.CatalogState.key == SEED_STATE_KEY
+        )
+    )
+    return result.scalar()
+
+
+async def seed_catalog(db: AsyncSession) -> bool:
+    """Inserts the default tags and tag packs unless this seed was already applied.
+
+    Runs a handful of set-based statements instead of a lookup per tag. The
+    catalog_state row makes every later boot of the same deploy a single
+    SELECT, the advisory lock lets only one of several starting workers do
+    the work, and ON CONFLICT DO NOTHING keeps rows that already exist (so
+    concurrent or partial seeds never fail on the unique names). Returns
+    whether anything was written.
+    """
+    fingerprint = seed_fingerprint()
+    if await _applied_fingerprint(db) == fingerprint:
+        return False
+
+    if db.bind.dialect.name == "postgresql":
+        # Held until commit; workers that waited then see the new fingerprint
+        await db.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": SEED_LOCK_KEY}
+        )
+        if await _applied_fingerprint(db) == fingerprint:
+            await db.commit()
+            return False
+
+    insert = dialect_insert(db)
+    await db.execute(
+        insert(models.TagPack)
+        .values(
+            [
+                {
+                    "name": pack["name"],
+                    "description": pack["description"],
+                    "price": pack["price"],
+                    "product_id": pack["product_id"],
+                }
+                for pack in DEFAULT_TAG_PACKS
+            ]
+        )
+        .on_conflict_do_nothing()
+    )
+    result = await db.execute(
+        select(models.TagPack.product_id, models.TagPack.id).where(
+            models.TagPack.product_id.in_(
+                [pack["product_id"] for pack in DEFAULT_TAG_PACKS]
+            )
+        )
+    )
+    pack_ids = dict(result.all())
+
+    tags = [
+        {**tag, "is_default": True, "tag_pack_id": None} for tag in DEFAULT_TAGS
+    ]
+    for pack in DEFAULT_TAG_PACKS:
+        tags.extend(
+            # Tags in packs are not default
+            {**tag, "is_default": False, "tag_pack_id": pack_ids[pack["product_id"]]}
+            for tag in pack["tags"]
+        )
+    await db.execute(insert(models.Tag).values(tags).on_conflict_do_nothing())
+
+    state = insert(models.CatalogState).values(
+        key=SEED_STATE_KEY, value=fingerprint
+    )
+    await db.execute(
+        state.on_conflict_do_update(
+            index_elements=[models.CatalogState.key],
+            set_={"value": state.excluded.value},
+        )
+    )
+    mark_catalog_changed(db)
+    await db.commit()
+    return True
@@ -0,0 +1,136 @@
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+
+from sqlalchemy import inspect, text
+
+import dates, seed
+from catalog import tag_catalog
+from database import DATABASE_URL, Base, SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+# full: every phase, verifying that the migrated schema has all model tables
+# fast: skips schema introspection (for autoscaled workers of a known deploy)
+# dev:  creates missing tables with metadata.create_all instead of Alembic
+STARTUP_MODES = ("full", "fast", "dev")
+STARTUP_MODE = os.getenv("STARTUP_MODE", "full")
+
+
+class SchemaMismatch(RuntimeError):
+    """Raised when tables the models need are missing (migrations not applied)."""
+
+
+class PhaseTiming(NamedTuple):
+    name: str
+    status: str  # "ok", "skipped" or "failed"
+    duration_ms: float
+    error: Optional[str] = None
+
+
+class StartupReport:
+    """How long each startup phase took in the last boot of this process."""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.phases: List[PhaseTiming] = []
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(phase.duration_ms for phase in self.phases), 2)
+
+    def as_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "total_ms": self.total_ms,
+            "phases": [phase._asdict() for phase in self.phases],
+        }
+
+
+# --- Phases ---
+async def check_config():
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is not set")
+    dates.get_timezone(dates.DEFAULT_TIMEZONE)  # Fails on an unknown zone name
+
+
+async def ping_engine():
+    # Opens the first pooled connection, so the first request does not pay for it
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def check_schema():
+    def missing_tables(conn):
+        existing = set(inspect(conn).get_table_names())
+        return sorted(set(Base.metadata.tables) - existing)
+
+    async with engine.connect() as conn:
+        missing = await conn.run_sync(missing_tables)
+    if missing:
+        raise SchemaMismatch(
+            f"Missing tables {', '.join(missing)}; run `alembic upgrade head`"
+        )
+
+
+async def create_schema():
+    # DDL goes through run_sync because metadata.create_all is synchronous
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def seed_data():
+    async with SessionLocal() as db:
+        await seed.seed_catalog(db)
+
+
+async def warm_caches():
+    # Load the tag catalog so the first /tags and /tags/store hit memory
+    async with SessionLocal() as db:
+        await tag_catalog.snapshot(db)
+
+
+class Phase(NamedTuple):
+    name: str
+    run: Callable[[], Awaitable[None]]
+    modes: tuple  # Modes the phase runs in
+    required: bool = True  # A failing required phase aborts startup
+
+
+PHASES = (
+    Phase("config", check_config, STARTUP_MODES),
+    Phase("engine", ping_engine, STARTUP_MODES),
+    Phase("schema", check_schema, ("full",)),
+    Phase("create_schema", create_schema, ("dev",)),
+    # The app can serve diaries without the default catalog, so these only log
+    Phase("seed", seed_data, STARTUP_MODES, required=False),
+    Phase("warm", warm_caches, STARTUP_MODES, required=False),
+)
+
+
+async def run_startup(mode: str = STARTUP_MODE, phases=PHASES) -> StartupReport:
+    """Runs the startup phases selected by `mode` and times each of them."""
+    if mode not in STARTUP_MODES:
+        raise ValueError(
+            f"Unknown STARTUP_MODE {mode!r}, expected one of {', '.join(STARTUP_MODES)}"
+        )
+    report = StartupReport(mode)
+    for phase in phases:
+        if mode not in phase.modes:
+            report.phases.append(PhaseTiming(phase.name, "skipped", 0.0))
+            continue
+        started = time.perf_counter()
+        try:
+            await phase.run()
+        except Exception as e:
+            elapsed = round((time.perf_counter() - started) * 1000, 2)
+            report.phases.append(PhaseTiming(phase.name, "failed", elapsed, str(e)))
+            if phase.required:
+                raise
+            logger.error(f"Startup phase {phase.name} failed: {e}")
+            continue
+        elapsed = round((time.perf_counter() - started) * 1000, 2)
+        report.phases.append(PhaseTiming(phase.name, "ok", elapsed))
+    logger.info(f"Startup ({mode}) finished in {report.total_ms} ms")
+    return report
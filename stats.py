@@ -0,0 +1,453 @@
+from collections import Counter
+from itertools import permutations
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import dates, jobs, models
+from catalog import tag_catalog
+from database import dialect_insert
+
+# Usage is bucketed by the server's day boundaries: the aggregate cannot be
+# re-cut per request, so a client's own timezone is not applied here.
+
+# Coarser grains kept in tag_usage_rollups next to the daily counts
+ROLLUP_PERIODS = ("week", "month")
+
+# Tag category whose usage is reported by /stats/mood
+EMOTION_CATEGORY = "감정"
+
+# tag_cooccurrence.user_id of the counts summed over every user
+GLOBAL_USER_ID = 0
+
+# A pair seen in the user's own diaries counts this many times a global one
+PERSONAL_COOCCURRENCE_WEIGHT = 5
+
+# Job kind that brings the GLOBAL_USER_ID counts of some pairs up to date
+GLOBAL_COOCCURRENCE_JOB = "global_cooccurrence"
+
+
+def usage_day(created_at: datetime) -> date:
+    """The tag_usage_daily bucket of a diary created at `created_at`."""
+    return dates.local_date(created_at, dates.get_timezone(dates.DEFAULT_TIMEZONE))
+
+
+def period_start(day: date, period: str) -> date:
+    """First day of the week (Monday) or month containing `day`."""
+    if period == "week":
+        return dates.week_span(day)[0]
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+async def _add_counts(db: AsyncSession, table, rows: List[dict]):
+    """Upserts `rows` into a counter table, adding their counts to existing ones."""
+    insert = dialect_insert(db)
+    stmt = insert(table).values(rows)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={"count": table.c["count"] + stmt.excluded["count"]},
+        )
+    )
+
+
+async def record_tag_usage(
+    db: AsyncSession, user_id: int, day: date, tag_ids: Iterable[int], delta: int
+):
+    """Adds `delta` to the day, week and month counters of the given tags.
+
+    Runs inside the caller's transaction, so the aggregates commit or roll
+    back together with the diary change they describe.
+    """
+    await add_tag_usage(db, user_id, {(day, tag_id): delta for tag_id in tag_ids})
+
+
+async def add_tag_usage(
+    db: AsyncSession, user_id: int, deltas: Mapping[Tuple[date, int], int]
+):
+    """Applies {(day, tag_id): delta} to the daily counters and their rollups."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rollups = Counter()
+    for (day, tag_id), delta in deltas.items():
+        for period in ROLLUP_PERIODS:
+            rollups[period, period_start(day, period), tag_id] += delta
+
+    daily = models.TagUsageDaily.__table__
+    rollup = models.TagUsageRollup.__table__
+    await _add_counts(
+        db,
+        daily,
+        [
+            {"user_id": user_id, "day": day, "tag_id": tag_id, "count": delta}
+            for (day, tag_id), delta in sorted(deltas.items())
+        ],
+    )
+    await _add_counts(
+        db,
+        rollup,
+        [
+            {
+                "user_id": user_id,
+                "period": period,
+                "start": start,
+                "tag_id": tag_id,
+                "count": delta,
+            }
+            for (period, start, tag_id), delta in sorted(rollups.items())
+        ],
+    )
+    decreased = {tag_id for (_, tag_id), delta in deltas.items() if delta < 0}
+    if decreased:
+        for table in (daily, rollup):
+            await db.execute(
+                delete(table).where(
+                    table.c.user_id == user_id,
+                    table.c.tag_id.in_(decreased),
+                    table.c.count <= 0,
+                )
+            )
+
+
+def _in_range(first_day: Optional[date], last_day: Optional[date]):
+    usage = models.TagUsageDaily
+    criteria = []
+    if first_day is not None:
+        criteria.append(usage.day >= first_day)
+    if last_day is not None:
+        criteria.append(usage.day <= last_day)
+    return criteria
+
+
+async def tag_counts(
+    db: AsyncSession,
+    user_id: int,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+) -> Dict[int, int]:
+    """Total uses per tag id between two days (both inclusive, either open)."""
+    usage = models.TagUsageDaily
+    result = await db.execute(
+        select(usage.tag_id, func.sum(usage.count))
+        .where(usage.user_id == user_id, *_in_range(first_day, last_day))
+        .group_by(usage.tag_id)
+    )
+    return dict(result.all())
+
+
+def top_tags(counts: Dict[int, int], limit: int) -> List[Tuple[int, int]]:
+    """The `limit` most used (tag_id, count) pairs, ties broken by tag id."""
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def category_counts(counts: Dict[int, int], categories: Dict[int, str]) -> Counter:
+    """Sums per-tag counts into per-category counts."""
+    totals = Counter()
+    for tag_id, count in counts.items():
+        totals[categories.get(tag_id, "")] += count
+    return totals
+
+
+async def daily_series(
+    db: AsyncSession,
+    user_id: int,
+    first_day: date,
+    last_day: date,
+    tag_id: Optional[int] = None,
+) -> Dict[date, int]:
+    """Uses per day in [first_day, last_day] (of one tag, or all), zeros included."""
+    usage = models.TagUsageDaily
+    stmt = (
+        select(usage.day, func.sum(usage.count))
+        .where(usage.user_id == user_id, *_in_range(first_day, last_day))
+        .group_by(usage.day)
+    )
+    if tag_id is not None:
+        stmt = stmt.where(usage.tag_id == tag_id)
+    series = dict.fromkeys(dates.date_range(first_day, last_day), 0)
+    for day, count in (await db.execute(stmt)).all():
+        series[day] = count
+    return series
+
+
+async def tag_stats(
+    db: AsyncSession,
+    user_id: int,
+    first_day: date,
+    last_day: date,
+    limit: int = 10,
+    tag_id: Optional[int] = None,
+) -> dict:
+    """Top tags, per-category totals and the daily series for /stats/tags.
+
+    Tag names and categories come from the in-memory catalog, so only the
+    aggregate table is queried.
+    """
+    snapshot = await tag_catalog.snapshot(db)
+    counts = {
+        usage_tag_id: count
+        for usage_tag_id, count in (
+            await tag_counts(db, user_id, first_day, last_day)
+        ).items()
+        if usage_tag_id in snapshot.tags
+    }
+    categories = category_counts(
+        counts, {tag.id: tag.category for tag in snapshot.tags.values()}
+    )
+    series = await daily_series(db, user_id, first_day, last_day, tag_id=tag_id)
+    return {
+        "start": first_day,
+        "end": last_day,
+        "top": [
+            {
+                "tag_id": top_id,
+                "name": snapshot.tags[top_id].name,
+                "category": snapshot.tags[top_id].category,
+                "count": count,
+            }
+            for top_id, count in top_tags(counts, limit)
+        ],
+        "categories": [
+            {"category": category, "count": count}
+            for category, count in categories.most_common()
+        ],
+        "days": [{"date": day, "count": count} for day, count in series.items()],
+    }
+
+
+def period_end(start: date, period: str) -> date:
+    """Last day of the week or month starting on `start`."""
+    if period == "week":
+        return start + timedelta(days=6)
+    return (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def period_starts(first_day: date, last_day: date, period: str) -> List[date]:
+    """Start of every day/week/month bucket overlapping [first_day, last_day]."""
+    if period == "day":
+        return list(dates.date_range(first_day, last_day))
+    starts = []
+    start = period_start(first_day, period)
+    while start <= last_day:
+        starts.append(start)
+        if period == "week":
+            start += timedelta(days=7)
+        else:
+            start = (start + timedelta(days=32)).replace(day=1)
+    return starts
+
+
+async def mood_trend(
+    db: AsyncSession, user_id: int, period: str, first_day: date, last_day: date
+) -> dict:
+    """Distribution of emotion tags per day, week or month for /stats/mood.
+
+    Weeks and months inside the range are read from the precomputed
+    rollups, so a year of history is at most a few hundred rows per tag
+    instead of a diary scan. The first and last buckets may stick out of
+    [first_day, last_day]; they are summed from the daily counts of the
+    days inside it, so no use outside the range is counted.
+    """
+    snapshot = await tag_catalog.snapshot(db)
+    emotions = {
+        tag.id: tag.name
+        for tag in snapshot.tags.values()
+        if tag.category == EMOTION_CATEGORY
+    }
+    starts = period_starts(first_day, last_day, period)
+    buckets = {start: Counter() for start in starts}
+
+    if emotions:
+        daily = models.TagUsageDaily
+        days = select(daily.day, daily.tag_id, daily.count).where(
+            daily.user_id == user_id,
+            daily.tag_id.in_(emotions),
+            daily.day.between(first_day, last_day),
+        )
+        if period == "day":
+            rows = (await db.execute(days)).all()
+        else:
+            whole = [
+                start
+                for start in starts
+                if start >= first_day and period_end(start, period) <= last_day
+            ]
+            if whole:
+                # Only the partial edge buckets are read per day
+                days = days.where(
+                    (daily.day < whole[0])
+                    | (daily.day > period_end(whole[-1], period))
+                )
+            rows = [
+                (period_start(day, period), tag_id, count)
+                for day, tag_id, count in (await db.execute(days)).all()
+            ]
+            if whole:
+                usage = models.TagUsageRollup
+                result = await db.execute(
+                    select(usage.start, usage.tag_id, usage.count).where(
+                        usage.user_id == user_id,
+                        usage.period == period,
+                        usage.start.between(whole[0], whole[-1]),
+                        usage.tag_id.in_(emotions),
+                    )
+                )
+                rows.extend(result.all())
+        for start, tag_id, count in rows:
+            buckets[start][emotions[tag_id]] += count
+
+    return {
+        "view": period,
+        "start": first_day,
+        "end": last_day,
+        "tags": sorted(emotions.values()),
+        "buckets": [
+            {"start": start, "total": sum(counts.values()), "counts": dict(counts)}
+            for start, counts in buckets.items()
+        ],
+    }
+
+
+# --- Tag co-occurrence ---
+def tag_pairs(tag_ids: Iterable[int]):
+    """Every ordered pair of distinct tags of one diary."""
+    return permutations(set(tag_ids), 2)
+
+
+async def record_cooccurrence(
+    db: AsyncSession,
+    user_id: int,
+    old_tag_ids: Iterable[int],
+    new_tag_ids: Iterable[int],
+):
+    """Applies a diary's tag-set change to the co-occurrence counts.
+
+    Every ordered pair of tags on the diary is one count, stored per user
+    and summed for GLOBAL_USER_ID, so "tags seen with X" is a primary-key
+    range scan. Only pairs that appeared or disappeared are written.
+    """
+    old_pairs = set(tag_pairs(old_tag_ids))
+    new_pairs = set(tag_pairs(new_tag_ids))
+    deltas = Counter(new_pairs - old_pairs)
+    deltas.subtract(old_pairs - new_pairs)
+    await add_cooccurrence(db, user_id, deltas)
+
+
+async def add_cooccurrence(
+    db: AsyncSession, user_id: int, deltas: Mapping[Tuple[int, int], int]
+):
+    """Applies {(tag_id, other_tag_id): delta} to the user's counts.
+
+    The global counts of the same pairs are refreshed by a job: common
+    pairs are shared by every user, and upserting them in the writer's
+    transaction would serialize diary writes across users until commit.
+    """
+    deltas = {pair: delta for pair, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = models.TagCooccurrence.__table__
+    await _add_counts(
+        db,
+        table,
+        [
+            {
+                "user_id": user_id,
+                "tag_id": tag_id,
+                "other_tag_id": other_tag_id,
+                "count": delta,
+            }
+            for (tag_id, other_tag_id), delta in sorted(deltas.items())
+        ],
+    )
+    decreased = {tag_id for (tag_id, _), delta in deltas.items() if delta < 0}
+    if decreased:
+        await db.execute(
+            delete(table).where(
+                table.c.user_id == user_id,
+                table.c.tag_id.in_(decreased),
+                table.c.count <= 0,
+            )
+        )
+    await jobs.enqueue(
+        db,
+        GLOBAL_COOCCURRENCE_JOB,
+        {"pairs": [list(pair) for pair in sorted(deltas)]},
+        priority=jobs.PRIORITY_LOW,
+    )
+
+
+@jobs.handler(GLOBAL_COOCCURRENCE_JOB)
+async def refresh_global_cooccurrence(db: AsyncSession, payload: dict):
+    """Recomputes the global counts of the given pairs from the per-user
+    counts (idempotent), using the (tag_id, other_tag_id) index."""
+    pairs = [tuple(pair) for pair in payload["pairs"]]
+    table = models.TagCooccurrence.__table__
+    key = tuple_(table.c.tag_id, table.c.other_tag_id)
+    result = await db.execute(
+        select(table.c.tag_id, table.c.other_tag_id, func.sum(table.c.count))
+        .where(table.c.user_id != GLOBAL_USER_ID, key.in_(pairs))
+        .group_by(table.c.tag_id, table.c.other_tag_id)
+    )
+    totals = {(tag_id, other): count for tag_id, other, count in result.all()}
+    rows = [
+        {
+            "user_id": GLOBAL_USER_ID,
+            "tag_id": tag_id,
+            "other_tag_id": other_tag_id,
+            "count": count,
+        }
+        for (tag_id, other_tag_id), count in sorted(totals.items())
+        if count > 0
+    ]
+    if rows:
+        stmt = dialect_insert(db)(table).values(rows)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=list(table.primary_key.columns),
+                set_={"count": stmt.excluded["count"]},
+            )
+        )
+    gone = [pair for pair in pairs if totals.get(pair, 0) <= 0]
+    if gone:
+        await db.execute(
+            delete(table).where(table.c.user_id == GLOBAL_USER_ID, key.in_(gone))
+        )
+
+
+async def suggest_tags(
+    db: AsyncSession, user_id: int, tag_ids: Iterable[int], limit: int = 10
+) -> List[Tuple[int, int]]:
+    """Ranked (tag_id, score) of the tags that go with the selected `tag_ids`.
+
+    Scores add up the pair counts with every selected tag, the user's own
+    counts weighted by PERSONAL_COOCCURRENCE_WEIGHT over the global ones.
+    Only tags the user may attach are suggested.
+    """
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return []
+    pairs = models.TagCooccurrence
+    result = await db.execute(
+        select(pairs.other_tag_id, pairs.user_id, func.sum(pairs.count))
+        .where(
+            pairs.user_id.in_([user_id, GLOBAL_USER_ID]),
+            pairs.tag_id.in_(tag_ids),
+            pairs.other_tag_id.notin_(tag_ids),
+        )
+        .group_by(pairs.other_tag_id, pairs.user_id)
+    )
+    scores = Counter()
+    for other_tag_id, owner, count in result.all():
+        weight = PERSONAL_COOCCURRENCE_WEIGHT if owner == user_id else 1
+        scores[other_tag_id] += weight * count
+    usable = {tag.id for tag in await tag_catalog.user_tags(db, user_id)}
+    ranked = sorted(
+        ((tag_id, score) for tag_id, score in scores.items() if tag_id in usable),
+        key=lambda item: (-item[1], item[0]),
+    )
+    return ranked[:limit]
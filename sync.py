@@ -0,0 +1,127 @@
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import exists, not_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models, pagination
+from database import dialect_insert
+
+# Changes (diaries and deletions together) returned per /sync call
+SYNC_PAGE_SIZE = 500
+
+# Every diary write takes the next number of a per-user counter (sync_counters)
+# and stores it as diaries.sync_seq, or as diary_tombstones.sync_seq for a
+# delete. The counter row is locked by the upsert until the transaction ends,
+# so a user's changes commit in counter order and "everything after N" never
+# skips a change that was still in flight. Timestamps cannot promise that:
+# updated_at is taken before commit and may come from different clocks.
+
+
+class SyncPage(NamedTuple):
+    changed: List[tuple]  # _DIARY_COLUMNS rows, in change order
+    deleted: List[int]  # Ids of deleted diaries
+    next_token: str  # Pass as `since` to get the changes after this page
+    has_more: bool
+
+
+async def next_sync_seq(db: AsyncSession, user_id: int, count: int = 1) -> int:
+    """Reserves `count` change numbers of the user and returns the first one."""
+    counters = models.SyncCounter.__table__
+    insert = dialect_insert(db)
+    stmt = insert(counters).values(user_id=user_id, seq=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[counters.c.user_id],
+        set_={"seq": counters.c.seq + stmt.excluded.seq},
+    )
+    if db.bind.dialect.name == "postgresql":
+        last = (await db.execute(stmt.returning(counters.c.seq))).scalar()
+    else:  # No RETURNING for SQLite in SQLAlchemy 1.4; it holds the write lock
+        await db.execute(stmt)
+        last = (
+            await db.execute(
+                select(counters.c.seq).where(counters.c.user_id == user_id)
+            )
+        ).scalar()
+    return last - count + 1
+
+
+async def record_deletion(db: AsyncSession, user_id: int, diary_id: int):
+    """Writes the tombstone that tells synced clients to drop the diary."""
+    tombstones = models.DiaryTombstone.__table__
+    values = {
+        "diary_id": diary_id,
+        "user_id": user_id,
+        "sync_seq": await next_sync_seq(db, user_id),
+        "deleted_at": datetime.now(timezone.utc),
+    }
+    insert = dialect_insert(db)
+    # SQLite may hand a deleted id out again, so a tombstone can be rewritten
+    await db.execute(
+        insert(tombstones)
+        .values(values)
+        .on_conflict_do_update(index_elements=[tombstones.c.diary_id], set_=values)
+    )
+
+
+def decode_token(token: Optional[str]) -> int:
+    if token is None:
+        return 0
+    (seq,) = pagination.decode_cursor(token, 1)
+    # bool is a subclass of int, but `true` is not a sequence number
+    if type(seq) is not int or seq < 0:
+        raise pagination.InvalidCursor("Malformed sync token")
+    return seq
+
+
+async def changes_since(
+    db: AsyncSession,
+    user_id: int,
+    columns,
+    since: Optional[str] = None,
+    limit: int = SYNC_PAGE_SIZE,
+) -> SyncPage:
+    """Diaries written and deleted after the `since` token, oldest change first.
+
+    Both lookups are range scans of a (user_id, sync_seq) index, so the cost
+    follows the number of changes, not the size of the history. Without a
+    token every diary is returned and no tombstones (nothing to delete yet).
+    """
+    seq = decode_token(since)
+    diary = models.Diary
+    diaries = (
+        await db.execute(
+            select(*columns, diary.sync_seq)
+            .where(diary.user_id == user_id, diary.sync_seq > seq)
+            .order_by(diary.sync_seq)
+            .limit(limit + 1)
+        )
+    ).all()
+    changes = [(row.sync_seq, row, None) for row in diaries]
+    if seq:
+        tombstone = models.DiaryTombstone
+        # A tombstone of an id that exists again (SQLite reuse) is superseded
+        recreated = exists().where(diary.id == tombstone.diary_id)
+        result = await db.execute(
+            select(tombstone.sync_seq, tombstone.diary_id)
+            .where(
+                tombstone.user_id == user_id,
+                tombstone.sync_seq > seq,
+                not_(recreated),
+            )
+            .order_by(tombstone.sync_seq)
+            .limit(limit + 1)
+        )
+        changes += [(number, None, diary_id) for number, diary_id in result.all()]
+    changes.sort(key=lambda change: change[0])
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if changes:
+        seq = changes[-1][0]
+    return SyncPage(
+        changed=[row for _, row, _ in changes if row is not None],
+        deleted=[diary_id for _, _, diary_id in changes if diary_id is not None],
+        next_token=pagination.encode_cursor([seq]),
+        has_more=has_more,
+    )
@@ -0,0 +1,289 @@
+"""Tag suggestions from diary text, from a model trained on tagged diaries.
+
+A multinomial naive Bayes classifier over hashed character n-grams (the same
+unigrams and bigrams search.py indexes), with one column of log-probability
+weights per tag learned from the diary_tags pairs. Inference gathers the
+weight rows of a diary's n-grams and sums them in NumPy, so a suggestion
+for a long diary takes about a millisecond once the model is in memory
+(benchmarks/tag_suggestion.py).
+
+Retrain periodically (cron, or a scheduled container) with
+`python train_tagger.py`; the API processes reload the model file when it
+changes.
+"""
+
+import logging
+import os
+import tempfile
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Collection, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models, search
+
+logger = logging.getLogger(__name__)
+
+# Where the model is written by `python train_tagger.py` and read by the API
+TAGGER_MODEL_PATH = os.getenv("TAGGER_MODEL_PATH", "tag_model.npz")
+# Hash buckets for n-grams; memory is 4 bytes per bucket per tag
+TAGGER_FEATURES = int(os.getenv("TAGGER_FEATURES", str(2**15)))
+# Tags attached to fewer diaries than this are never suggested
+TAGGER_MIN_EXAMPLES = int(os.getenv("TAGGER_MIN_EXAMPLES", "3"))
+# Suggestions returned, and the share of the probability a tag needs to be one
+TAGGER_SUGGESTIONS = int(os.getenv("TAGGER_SUGGESTIONS", "5"))
+TAGGER_MIN_CONFIDENCE = float(os.getenv("TAGGER_MIN_CONFIDENCE", "0.05"))
+# Seconds between checks of the model file for a newer version
+TAGGER_RELOAD_INTERVAL = float(os.getenv("TAGGER_RELOAD_INTERVAL", "60"))
+
+# Additive smoothing of the n-gram counts of each tag
+SMOOTHING = 0.1
+
+
+def features(
+    title: str, content: Optional[str], n_features: int = TAGGER_FEATURES
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed n-gram buckets of a diary and their log-scaled counts.
+
+    Title n-grams count TITLE_WEIGHT times, as in search. crc32 is used
+    because, unlike hash(), it is the same in every process.
+    """
+    terms = search.extract_terms(title, search.TITLE_WEIGHT)
+    terms.update(search.extract_terms(content or "", search.CONTENT_WEIGHT))
+    buckets = Counter()
+    for term, count in terms.items():
+        buckets[zlib.crc32(term.encode("utf-8")) % n_features] += count
+    indices = np.fromiter(buckets.keys(), dtype=np.int64, count=len(buckets))
+    counts = np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets))
+    return indices, np.log1p(counts)
+
+
+class Suggestion(NamedTuple):
+    tag_id: int
+    confidence: float
+
+
+class TagModel:
+    """Per-tag linear weights over hashed n-grams, held in memory."""
+
+    def __init__(
+        self,
+        tag_ids: np.ndarray,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        trained_at: Optional[datetime] = None,
+        examples: int = 0,
+    ):
+        self.tag_ids = tag_ids  # (tags,)
+        self.weights = weights  # (features, tags) log P(n-gram | tag)
+        self.bias = bias  # (tags,) log P(tag)
+        self.trained_at = trained_at
+        self.examples = examples
+        self._column = {int(tag_id): i for i, tag_id in enumerate(tag_ids)}
+
+    @property
+    def n_features(self) -> int:
+        return self.weights.shape[0]
+
+    def scores(self, title: str, content: Optional[str]) -> np.ndarray:
+        indices, values = features(title, content, self.n_features)
+        return values @ self.weights[indices] + self.bias
+
+    def suggest(
+        self,
+        title: str,
+        content: Optional[str],
+        allowed: Collection[int],
+        limit: int = TAGGER_SUGGESTIONS,
+        min_confidence: float = TAGGER_MIN_CONFIDENCE,
+    ) -> List[Suggestion]:
+        """The most likely of the `allowed` tags, most likely first.
+
+        Confidence is the tag's share of the probability among the allowed
+        tags the model knows.
+        """
+        known = [self._column[tag_id] for tag_id in allowed if tag_id in self._column]
+        columns = np.array(sorted(known), dtype=np.int64)
+        if not columns.size or not (title or content):
+            return []
+        scores = self.scores(title, content)[columns]
+        probabilities = np.exp(scores - scores.max())
+        probabilities /= probabilities.sum()
+        best = np.argsort(-probabilities, kind="stable")[:limit]
+        return [
+            Suggestion(int(self.tag_ids[columns[i]]), float(probabilities[i]))
+            for i in best
+            if probabilities[i] >= min_confidence
+        ]
+
+    def save(self, path: str):
+        """Writes the model next to `path` and then renames it into place, so
+        a process reloading it never reads a partial file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    tag_ids=self.tag_ids,
+                    weights=self.weights,
+                    bias=self.bias,
+                    trained_at=np.array(
+                        (self.trained_at or datetime.now(timezone.utc)).isoformat()
+                    ),
+                    examples=np.array(self.examples),
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "TagModel":
+        with np.load(path) as data:
+            return cls(
+                tag_ids=data["tag_ids"],
+                weights=data["weights"],
+                bias=data["bias"],
+                trained_at=datetime.fromisoformat(str(data["trained_at"])),
+                examples=int(data["examples"]),
+            )
+
+
+# --- Training ---
+async def train(
+    db: AsyncSession,
+    n_features: int = TAGGER_FEATURES,
+    min_examples: int = TAGGER_MIN_EXAMPLES,
+) -> Optional[TagModel]:
+    """Fits a model to every tagged diary; None when no tag has enough examples.
+
+    Tags are chosen with one aggregate query first, so the diaries can be
+    streamed into the count matrix without holding them in memory.
+    """
+    diary_tags = models.diary_tags_association
+    result = await db.execute(
+        select(diary_tags.c.tag_id, func.count())
+        .group_by(diary_tags.c.tag_id)
+        .having(func.count() >= min_examples)
+        .order_by(diary_tags.c.tag_id)
+    )
+    tag_counts = result.all()
+    if not tag_counts:
+        return None
+    tag_ids = np.array([tag_id for tag_id, _ in tag_counts], dtype=np.int64)
+    column = {int(tag_id): i for i, tag_id in enumerate(tag_ids)}
+
+    counts = np.zeros((n_features, len(tag_ids)), dtype=np.float32)
+    documents = np.zeros(len(tag_ids), dtype=np.float32)
+    examples = 0
+    rows = await db.stream(
+        select(
+            models.Diary.id,
+            models.Diary.title,
+            models.Diary.content,
+            diary_tags.c.tag_id,
+        )
+        .join(diary_tags, diary_tags.c.diary_id == models.Diary.id)
+        .where(diary_tags.c.tag_id.in_([int(tag_id) for tag_id in tag_ids]))
+        .order_by(models.Diary.id)
+    )
+
+    def add(title, content, columns):
+        indices, values = features(title, content, n_features)
+        columns = np.array(columns, dtype=np.int64)
+        np.add.at(counts, (indices[:, None], columns[None, :]), values[:, None])
+        documents[columns] += 1
+
+    current, columns = None, []
+    async for diary_id, title, content, tag_id in rows:
+        if current is not None and diary_id != current[0]:
+            add(current[1], current[2], columns)
+            examples += 1
+            columns = []
+        current = (diary_id, title, content)
+        columns.append(column[tag_id])
+    if current is not None:
+        add(current[1], current[2], columns)
+        examples += 1
+
+    weights = np.log(counts + SMOOTHING) - np.log(
+        counts.sum(axis=0) + SMOOTHING * n_features
+    )
+    bias = np.log(documents / documents.sum())
+    return TagModel(
+        tag_ids,
+        weights.astype(np.float32),
+        bias.astype(np.float32),
+        trained_at=datetime.now(timezone.utc),
+        examples=examples,
+    )
+
+
+# --- Serving ---
+class TagSuggester:
+    """The model the API serves, reloaded when the file on disk changes."""
+
+    def __init__(
+        self,
+        path: str = TAGGER_MODEL_PATH,
+        reload_interval: float = TAGGER_RELOAD_INTERVAL,
+        clock=time.monotonic,
+    ):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._clock = clock
+        self._model: Optional[TagModel] = None
+        self._mtime: Optional[float] = None
+        self._checked: Optional[float] = None
+
+    @property
+    def model(self) -> Optional[TagModel]:
+        now = self._clock()
+        if self._checked is None or now - self._checked >= self.reload_interval:
+            self._checked = now
+            self._reload()
+        return self._model
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return  # Not trained yet; keep whatever is loaded
+        if mtime == self._mtime:
+            return
+        try:
+            self._model = TagModel.load(self.path)
+        except Exception:
+            logger.exception(f"Could not load the tag model from {self.path}")
+            return
+        self._mtime = mtime
+        logger.info(
+            f"Loaded tag model: {len(self._model.tag_ids)} tags, "
+            f"{self._model.examples} diaries, trained {self._model.trained_at}"
+        )
+
+    def use(self, model: Optional[TagModel]):
+        """Serves `model` until the file on disk changes."""
+        self._model = model
+
+    def stats(self) -> dict:
+        model = self._model
+        if model is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "tags": len(model.tag_ids),
+            "features": model.n_features,
+            "examples": model.examples,
+            "trained_at": model.trained_at.isoformat() if model.trained_at else None,
+        }
+
+
+tag_suggester = TagSuggester()
+
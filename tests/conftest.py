@@ -0,0 +1,102 @@
+import os
+
+# database.py builds its engine from DATABASE_URL at import time
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+# Background jobs run in the writing transaction, so tests can read their
+# results right away (tests/test_jobs.py exercises the real queues)
+os.environ.setdefault("JOB_BACKEND", "inline")
+
+import httpx
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import auth
+from cache import shared_cache
+from catalog import tag_catalog
+from database import get_db
+from main import app
+from models import Base, User
+
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
+TestingSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    bind=engine,
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(name="db")
+async def session_fixture():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    db = TestingSessionLocal()
+    yield db
+    await db.close()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    tag_catalog.clear()
+    shared_cache.clear()
+
+
+@pytest.fixture(name="user")
+async def user_fixture(db):
+    user = User(email="tester@example.com", password_hash="hashed", nickname="tester")
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+@pytest.fixture(name="client")
+async def client_fixture(db, user):
+    """An HTTP client of the app, signed in as `user` and using `db`."""
+
+    async def override_get_db():
+        yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    headers = {"Authorization": f"Bearer {auth.create_user_token(user)}"}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://test",
+        headers=headers,
+    ) as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+class QueryCounter:
+    """Records the SQL statements sent to the engine while the block runs."""
+
+    def __init__(self, bind):
+        self.bind = bind
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.bind, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.bind, "before_cursor_execute", self._record)
+
+    def __len__(self):
+        return len(self.statements)
+
+
+@pytest.fixture(name="count_queries")
+def count_queries_fixture():
+    # Engine events are registered on the synchronous engine behind the async one
+    return lambda: QueryCounter(engine.sync_engine)
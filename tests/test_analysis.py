@@ -0,0 +1,198 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import analysis
+import jobs
+import search
+import transfer
+from crud import create_diary, delete_diary, get_diary, update_diary
+from schemas import DiaryCreate, DiaryUpdate
+
+pytestmark = pytest.mark.anyio
+
+
+def model_server():
+    """A fake model server: 좋 reads as positive, and every Korean word of two
+    or more letters is an entity. `batches` records the inputs of each call."""
+    app = FastAPI()
+    app.state.batches = []
+
+    @app.post("/analyze")
+    async def analyze(body: dict):
+        app.state.batches.append(body["inputs"])
+        results = []
+        for text in body["inputs"]:
+            positive = "좋" in text
+            results.append(
+                {
+                    "sentiment": {
+                        "label": "positive" if positive else "neutral",
+                        "score": 0.8 if positive else 0.0,
+                    },
+                    "entities": [word for word in text.split() if len(word) > 1],
+                }
+            )
+        return {"results": results}
+
+    return app
+
+
+@pytest.fixture
+def server():
+    return model_server()
+
+
+@pytest.fixture
+def batcher(server):
+    http = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=server), base_url="http://model"
+    )
+    client = analysis.HTTPModelClient("http://model", model="fake", http=http)
+    return analysis.AnalysisBatcher(client, batch_size=3, max_wait=0.01)
+
+
+@pytest.fixture
+def worker(db, batcher, monkeypatch):
+    """Runs diary jobs through a MemoryQueue with analysis pointed at `batcher`."""
+    queue = jobs.MemoryQueue()
+
+    def session_factory():
+        return AsyncSession(db.bind, expire_on_commit=False)
+
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    monkeypatch.setattr(analysis, "ANALYSIS_URL", "http://model")
+    monkeypatch.setattr(analysis, "_batcher", batcher)
+    monkeypatch.setattr(analysis, "SessionLocal", session_factory)
+    return jobs.Worker(queue, session_factory)
+
+
+async def test_concurrent_texts_are_batched(batcher, server):
+    texts = ["좋은 하루", "그냥 하루", "좋은 저녁", "비 오는 날", "산책"]
+    results = await asyncio.gather(*[batcher.submit(text) for text in texts])
+
+    assert [result.sentiment.label for result in results] == [
+        "positive",
+        "neutral",
+        "positive",
+        "neutral",
+        "neutral",
+    ]
+    assert results[3].entities == ["오는"]
+    # A full batch of three, then the rest once the batch wait ran out
+    assert server.state.batches == [texts[:3], texts[3:]]
+    assert batcher.calls == 2
+
+
+async def test_malformed_answer_fails_the_whole_batch(batcher, server):
+    server.router.routes.clear()
+
+    @server.post("/analyze")
+    async def analyze(body: dict):
+        return {"results": [{"sentiment": {"label": "ecstatic", "score": 2}}]}
+
+    results = await asyncio.gather(
+        batcher.submit("하나"), batcher.submit("둘"), return_exceptions=True
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_token_bucket_spaces_calls():
+    now = [0.0]
+    waits = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    bucket = analysis.TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        await bucket.acquire()
+    # The burst of two is free; after that one call every half second
+    assert waits == [0.5, 0.5]
+    now[0] += 10
+    await bucket.acquire()
+    assert waits == [0.5, 0.5]
+
+
+async def test_diaries_are_analyzed_once_per_text(db, user, worker, server):
+    trip = DiaryCreate(title="좋은 날", content="제주 바다")
+    first = await create_diary(db, trip, user.id)
+    second = await create_diary(db, DiaryCreate(title="회의", content="긴 회의"), user.id)
+    # Index and analysis jobs of both diaries run together
+    assert await worker.run_once() == 4
+    assert len(server.state.batches) == 1
+
+    result = await analysis.get_result(db, first.id)
+    assert result.sentiment == {"label": "positive", "score": 0.8}
+    assert result.entities == ["좋은", "제주", "바다"]
+
+    # Same text again, and a copy of it in another diary: no model call
+    await update_diary(db, await get_diary(db, first.id), DiaryUpdate(title="좋은 날"))
+    copy = await create_diary(db, trip, user.id)
+    await worker.run_once()
+    assert len(server.state.batches) == 1
+    await db.refresh(result)
+    assert (await analysis.get_result(db, copy.id)).content_hash == result.content_hash
+
+    shorter = DiaryUpdate(content="짧은 회의")
+    await update_diary(db, await get_diary(db, second.id), shorter)
+    await worker.run_once()
+    assert server.state.batches[1:] == [["회의\n\n짧은 회의"]]
+
+    await delete_diary(db, second.id)
+    db.expire_all()
+    assert await analysis.get_result(db, second.id) is None
+
+
+async def test_analysis_is_off_without_a_model(db, user, monkeypatch):
+    queue = jobs.MemoryQueue()
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    await create_diary(db, DiaryCreate(title="좋은 날"), user.id)
+    assert (await queue.stats())["jobs"] == {search.INDEX_JOB: {"queued": 1}}
+
+
+async def test_model_is_called_outside_a_transaction(db, user, monkeypatch):
+    diary = await create_diary(db, DiaryCreate(title="좋은 날"), user.id)
+    session = AsyncSession(db.bind, expire_on_commit=False)
+    monkeypatch.setattr(analysis, "SessionLocal", lambda: session)
+
+    class Client(analysis.AnalysisClient):
+        model = "fake"
+
+        async def analyze(self, texts):
+            assert not session.in_transaction()
+            label = {"label": "positive", "score": 1.0}
+            return [analysis.Analysis(sentiment=label) for _ in texts]
+
+    monkeypatch.setattr(analysis, "_batcher", analysis.AnalysisBatcher(Client()))
+    async with AsyncSession(db.bind) as worker_session:
+        await analysis.analyze_diary(worker_session, {"diary_id": diary.id})
+        # The handler stores its result itself and leaves the worker's session
+        assert not worker_session.in_transaction()
+    assert (await analysis.get_result(db, diary.id)).sentiment["label"] == "positive"
+
+
+async def test_imported_diaries_are_analyzed(db, user, worker, server):
+    lines = ['{"title": "좋은 아침"}', '{"title": "회의"}']
+
+    async def body():
+        for line in lines:
+            yield line.encode("utf-8")
+
+    report = await transfer.import_diaries(db, user.id, body())
+    assert report["imported"] == 2
+    await worker.run_once()
+    assert sorted(server.state.batches[0]) == ["좋은 아침", "회의"]
+
+
+async def test_analysis_is_not_run_inline(db, user, batcher, server, monkeypatch):
+    monkeypatch.setattr(jobs, "job_queue", jobs.InlineQueue())
+    monkeypatch.setattr(analysis, "ANALYSIS_URL", "http://model")
+    monkeypatch.setattr(analysis, "_batcher", batcher)
+    diary = await create_diary(db, DiaryCreate(title="좋은 날"), user.id)
+    assert server.state.batches == []
+    assert await analysis.get_result(db, diary.id) is None
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+from cache import TTLCache, shared_cache
+from crud import revoke_user_tokens
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cached_principal_skips_the_users_table(db, user, count_queries):
+    token = auth.create_user_token(user)
+
+    principal = await auth.get_current_user(token=token, db=db)
+    assert principal.id == user.id
+    assert principal.email == user.email
+
+    with count_queries() as queries:
+        again = await auth.get_current_user(token=token, db=db)
+    assert again == principal
+    assert len(queries) == 0
+
+
+async def test_revoked_token_is_rejected(db, user):
+    old_token = auth.create_user_token(user)
+    await auth.get_current_user(token=old_token, db=db)  # cached
+
+    await revoke_user_tokens(db, user.id)
+
+    with pytest.raises(HTTPException) as exc:
+        await auth.get_current_user(token=old_token, db=db)
+    assert exc.value.status_code == 401
+
+    new_token = auth.create_user_token(user)
+    assert (await auth.get_current_user(token=new_token, db=db)).id == user.id
+
+
+async def test_user_update_invalidates_the_cache(db, user):
+    token = auth.create_user_token(user)
+    await auth.get_current_user(token=token, db=db)
+
+    user.nickname = "renamed"
+    await db.commit()
+    assert shared_cache.near.get(auth.principal_key(user.id)) is None
+
+    principal = await auth.get_current_user(token=token, db=db)
+    assert principal.nickname == "renamed"
+
+
+async def test_rejects_expired_and_legacy_tokens(db, user):
+    expired = auth.create_user_token(user, expires_delta=timedelta(minutes=-1))
+    legacy = auth.create_access_token(data={"sub": user.email})
+    for token in (expired, legacy, "not-a-jwt"):
+        with pytest.raises(HTTPException):
+            await auth.get_current_user(token=token, db=db)
+
+
+def test_ttl_cache_expires_and_evicts():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now the most recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now[0] = 10.0
+    assert cache.get("a") is None
+    assert len(cache) == 1
@@ -0,0 +1,206 @@
+import asyncio
+
+import pytest
+
+from cache import CacheBackend, MemoryBackend, RedisBackend, SharedCache
+
+pytestmark = pytest.mark.anyio
+
+
+class Loader:
+    """Counts calls and returns the current `value`, optionally after a delay."""
+
+    def __init__(self, value, delay: float = 0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+async def wait_until(predicate, timeout: float = 2.0):
+    """Lets background listeners run until `predicate()` holds."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def workers():
+    """Two SharedCaches on one far tier, like two uvicorn workers."""
+    backend = MemoryBackend()
+    caches = [SharedCache(backend), SharedCache(backend)]
+    for cache in caches:
+        await cache.start()
+    yield caches
+    for cache in caches:
+        await cache.close()
+
+
+async def test_concurrent_misses_load_once():
+    cache = SharedCache()
+    loader = Loader({"n": 1}, delay=0.05)
+
+    values = await asyncio.gather(
+        *[cache.get_or_load("key", loader, ttl=60) for _ in range(20)]
+    )
+    assert values == [{"n": 1}] * 20
+    assert loader.calls == 1
+    assert cache.stats()["coalesced"] == 19
+
+    assert await cache.get_or_load("key", loader, ttl=60) == {"n": 1}
+    assert loader.calls == 1
+
+
+async def test_failed_load_is_shared_but_not_cached():
+    cache = SharedCache()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database down")
+
+    results = await asyncio.gather(
+        *[cache.get_or_load("key", failing, ttl=60) for _ in range(3)],
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert await cache.get_or_load("key", Loader(1), ttl=60) == 1
+
+
+async def test_none_is_not_cached():
+    cache = SharedCache()
+    loader = Loader(None)
+    await cache.get_or_load("key", loader, ttl=60)
+    await cache.get_or_load("key", loader, ttl=60)
+    assert loader.calls == 2
+
+
+async def test_near_entries_expire_without_a_far_tier():
+    # Other workers are never told about writes, so a long ttl must not apply
+    cache = SharedCache(near_ttl=0.05)
+    loader = Loader("old")
+    await cache.get_or_load("key", loader, ttl=300)
+    loader.value = "new"
+    await asyncio.sleep(0.06)
+    assert await cache.get_or_load("key", loader, ttl=300) == "new"
+    assert loader.calls == 2
+
+
+async def test_far_tier_is_shared(workers):
+    first, second = workers
+    loader = Loader([1, 2, 3])
+
+    assert await first.get_or_load("key", loader, ttl=60) == [1, 2, 3]
+    assert await second.get_or_load("key", loader, ttl=60) == [1, 2, 3]
+    assert loader.calls == 1
+    assert second.stats()["far_hits"] == 1
+
+
+async def test_invalidation_reaches_other_workers(workers):
+    first, second = workers
+    hooked = []
+    second.on_invalidate("catalog", hooked.append)
+    loader = Loader("old")
+    await first.get_or_load("key", loader, ttl=60)
+    await second.get_or_load("key", loader, ttl=60)
+
+    loader.value = "new"
+    first.invalidate("key", "catalog")
+    await first.flush()
+    await wait_until(lambda: second.near.get("key") is None and hooked)
+
+    assert hooked == ["catalog"]
+    assert await second.get_or_load("key", loader, ttl=60) == "new"
+    assert await first.get_or_load("key", loader, ttl=60) == "new"
+    assert loader.calls == 2
+
+
+async def test_unavailable_far_tier_falls_back_to_loader():
+    class BrokenBackend(MemoryBackend):
+        async def get(self, key):
+            raise ConnectionError("no route to cache")
+
+        async def set(self, key, value, ttl):
+            raise ConnectionError("no route to cache")
+
+    cache = SharedCache(BrokenBackend())
+    assert await cache.get_or_load("key", Loader(7), ttl=60) == 7
+
+
+async def test_listener_resubscribes_after_the_subscription_drops(
+    monkeypatch, caplog
+):
+    monkeypatch.setattr("cache.RESUBSCRIBE_DELAY", 0.01)
+
+    class FlakyBackend(MemoryBackend):
+        drops = 1
+
+        async def subscribe(self, channel):
+            messages = await super().subscribe(channel)
+            if not self.drops:
+                return messages
+            self.drops -= 1
+
+            async def dropping():
+                yield await messages.__anext__()
+                raise ConnectionError("connection reset")
+
+            return dropping()
+
+    backend = FlakyBackend()
+    worker, other = SharedCache(backend), SharedCache(backend)
+    await worker.start()
+    try:
+        await worker.get_or_load("key", Loader(1), ttl=60)
+        other.invalidate("first")
+        await wait_until(lambda: worker.stats()["resubscribes"] == 1)
+        assert "subscription lost (connection reset)" in caplog.text
+        assert worker.stats()["listener"] == "subscribed"
+        # What was cached while disconnected may have missed an invalidation
+        assert worker.near.get("key") is None
+
+        await worker.get_or_load("key", Loader(1), ttl=60)
+        other.invalidate("key")
+        await wait_until(lambda: worker.near.get("key") is None)
+    finally:
+        await other.close()
+        await worker.close()
+    assert worker.stats()["listener"] is None
+
+
+async def test_redis_backend_round_trip():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    caches = [
+        SharedCache(RedisBackend(fakeredis.FakeAsyncRedis(server=server)))
+        for _ in range(2)
+    ]
+    for cache in caches:
+        await cache.start()
+    first, second = caches
+    try:
+        loader = Loader({"tags": ["행복"]})
+        await first.get_or_load("key", loader, ttl=60)
+        assert await second.get_or_load("key", loader, ttl=60) == {"tags": ["행복"]}
+        assert loader.calls == 1
+
+        first.invalidate("key")
+        await first.flush()
+        await wait_until(lambda: second.near.get("key") is None)
+        assert await second.far.get("key") is None
+    finally:
+        for cache in caches:
+            await cache.close()
+
+
+def test_backends_implement_every_operation():
+    class Partial(CacheBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,82 @@
+import pytest
+
+from caching import etag_matches, make_etag
+from crud import create_diary, create_tag, create_tag_pack, grant_tag_pack_to_user
+from schemas import DiaryCreate, TagCreate, TagPackBase
+
+pytestmark = pytest.mark.anyio
+
+
+async def revalidate(client, url):
+    first = await client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    second = await client.get(url, headers={"If-None-Match": etag})
+    return first, second
+
+
+async def test_diary_etag(client, db, user, count_queries):
+    tag = await create_tag(db, TagCreate(name="행복", category="감정"))
+    diary = await create_diary(db, DiaryCreate(title="일기", tags=[tag.id]), user.id)
+    url = f"/diaries/{diary.id}"
+
+    first, second = await revalidate(client, url)
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    # A 304 is decided from the cached (user_id, updated_at) alone
+    with count_queries() as queries:
+        await client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert len(queries) == 0
+
+    # A tag-only change must produce a new ETag
+    await client.put(url, json={"tags": []})
+    third = await client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert third.status_code == 200
+    assert third.json()["tags"] == []
+    assert third.headers["etag"] != first.headers["etag"]
+
+
+async def test_tag_store_etag(client, db):
+    first, second = await revalidate(client, "/tags/store")
+    assert second.status_code == 304
+    assert first.headers["cache-control"].startswith("public, max-age=")
+
+    await create_tag_pack(
+        db, TagPackBase(name="Pack", description="", price=1, product_id="p")
+    )
+    await db.commit()
+    third = await client.get(
+        "/tags/store", headers={"If-None-Match": first.headers["etag"]}
+    )
+    assert third.status_code == 200
+    assert [pack["product_id"] for pack in third.json()] == ["p"]
+
+
+async def test_tags_etag_changes_with_ownership(client, db, user):
+    pack = await create_tag_pack(
+        db, TagPackBase(name="Pack", description="", price=1, product_id="p")
+    )
+    await create_tag(
+        db, TagCreate(name="환희", category="감정", tag_pack_id=pack.id)
+    )
+    await db.commit()
+
+    first, second = await revalidate(client, "/tags")
+    assert second.status_code == 304
+
+    await grant_tag_pack_to_user(db, user.id, pack.id)
+    third = await client.get("/tags", headers={"If-None-Match": first.headers["etag"]})
+    assert third.status_code == 200
+    assert [tag["name"] for tag in third.json()] == ["환희"]
+
+
+def test_etag_matches():
+    etag = make_etag("diary", 1, "2026-10-17T00:00:00")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from cache import shared_cache
+from catalog import tag_catalog
+from crud import create_tag, create_tag_pack, grant_tag_pack_to_user
+from models import UserTagPack
+from schemas import TagCreate, TagPackBase, TagPackResponse, TagResponse
+
+pytestmark = pytest.mark.anyio
+
+
+async def _seed(db):
+    await create_tag(db, TagCreate(name="행복", category="감정", is_default=True))
+    pack = await create_tag_pack(
+        db, TagPackBase(name="Pack", price=100, product_id="pack")
+    )
+    await create_tag(db, TagCreate(name="평온", category="감정", tag_pack_id=pack.id))
+    await db.commit()
+    return pack
+
+
+async def test_user_tags_include_owned_packs_only(db, user):
+    pack = await _seed(db)
+    assert [t.name for t in await tag_catalog.user_tags(db, user.id)] == ["행복"]
+
+    await grant_tag_pack_to_user(db, user.id, pack.id)
+    tags = await tag_catalog.user_tags(db, user.id)
+    assert [t.name for t in tags] == ["행복", "평온"]
+
+
+async def test_steady_state_runs_no_queries(db, user, count_queries):
+    await _seed(db)
+    await tag_catalog.user_tags(db, user.id)
+
+    with count_queries() as counter:
+        tags = await tag_catalog.user_tags(db, user.id)
+        packs = (await tag_catalog.snapshot(db)).packs
+
+    assert len(counter) == 0
+    assert [TagResponse.model_validate(t, from_attributes=True).name for t in tags]
+    store = [TagPackResponse.model_validate(p, from_attributes=True) for p in packs]
+    assert [t.name for t in store[0].tags] == ["평온"]
+
+
+async def test_catalog_reloads_only_after_commit(db, user):
+    await _seed(db)
+    before = await tag_catalog.snapshot(db)
+
+    await create_tag(db, TagCreate(name="기쁨", category="감정", is_default=True))
+    assert await tag_catalog.snapshot(db) is before
+    await db.rollback()
+    assert await tag_catalog.snapshot(db) is before
+
+    await create_tag(db, TagCreate(name="기쁨", category="감정", is_default=True))
+    await db.commit()
+    default_tags = (await tag_catalog.snapshot(db)).default_tags
+    assert [t.name for t in default_tags] == ["행복", "기쁨"]
+
+
+async def test_purchase_elsewhere_shows_up_after_the_near_ttl(db, user, monkeypatch):
+    pack = await _seed(db)
+    # Another worker commits the purchase; its invalidation never arrives here
+    monkeypatch.setattr(shared_cache.near, "ttl", 0.05)
+    assert [t.name for t in await tag_catalog.user_tags(db, user.id)] == ["행복"]
+    db.add(UserTagPack(user_id=user.id, tag_pack_id=pack.id))
+    await db.commit()
+
+    await asyncio.sleep(0.06)
+    tags = await tag_catalog.user_tags(db, user.id)
+    assert [t.name for t in tags] == ["행복", "평온"]
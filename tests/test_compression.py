@@ -0,0 +1,110 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+import compression
+from compression import CompressionMiddleware, CompressionStats, choose_encoding
+
+pytestmark = pytest.mark.anyio
+
+ENTRY = {"title": "오늘의 일기", "content": "비가 와서 조금 우울했다. " * 20}
+
+
+@pytest.fixture
+def stats():
+    return CompressionStats()
+
+
+@pytest.fixture
+def make_client(stats):
+    def make(**options):
+        app = FastAPI()
+        app.add_middleware(CompressionMiddleware, stats=stats, **options)
+
+        @app.get("/diaries")
+        async def diaries():
+            return JSONResponse([ENTRY] * 10, headers={"ETag": '"abc"'})
+
+        @app.get("/small")
+        async def small():
+            return {"ok": True}
+
+        @app.get("/export")
+        async def export():
+            async def lines():
+                for _ in range(3):
+                    yield b'{"title": "x"}\n' * 100
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        )
+
+    return make
+
+
+def test_choose_encoding(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("br") is None
+    assert choose_encoding("gzip;q=0, *;q=0.5") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("") is None
+    assert choose_encoding("identity") is None
+
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip, br;q=0.5") == "gzip"
+    assert choose_encoding("br;q=0") is None
+
+
+async def test_compresses_large_json(make_client, stats, monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    async with make_client() as client:
+        response = await client.get(
+            "/diaries", headers={"Accept-Encoding": "gzip, br"}
+        )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert response.json() == [ENTRY] * 10  # httpx decodes gzip
+    assert stats.responses == {"gzip": 1}
+    assert stats.bytes_out == int(response.headers["content-length"])
+    assert stats.as_dict()["bytes_saved"] > 0
+
+
+async def test_skips_without_accept_encoding(make_client, stats):
+    async with make_client() as client:
+        response = await client.get("/diaries", headers={"Accept-Encoding": ""})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+    assert stats.as_dict()["responses"] == {}
+
+
+async def test_skips_small_and_streaming(make_client, stats):
+    async with make_client() as client:
+        small = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+        export = await client.get("/export", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in export.headers
+    assert export.content == b'{"title": "x"}\n' * 300
+    assert stats.skipped == 2
+
+
+async def test_offloads_large_bodies(make_client, stats):
+    async with make_client(offload_size=1024) as client:
+        response = await client.get("/diaries", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == [ENTRY] * 10
+    assert stats.offloaded == 1
+
+
+async def test_brotli(make_client, stats):
+    brotli = pytest.importorskip("brotli")
+    async with make_client() as client:
+        response = await client.get("/diaries", headers={"Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "br"
+    assert stats.responses == {"br": 1}
+    assert brotli is compression.brotli
@@ -0,0 +1,57 @@
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from database import engine_options, pool_status
+
+POSTGRES_URL = "postgresql://user:password@db/tagmind"
+
+
+def test_sqlite_keeps_defaults():
+    assert engine_options("sqlite:///./test.db", env={}) == {}
+
+
+def test_pool_options_from_env():
+    options = engine_options(
+        POSTGRES_URL,
+        env={
+            "DB_POOL_SIZE": "20",
+            "DB_MAX_OVERFLOW": "0",
+            "DB_POOL_PRE_PING": "false",
+            "DB_STATEMENT_TIMEOUT_MS": "5000",
+        },
+    )
+    assert options["pool_size"] == 20
+    assert options["max_overflow"] == 0
+    assert options["pool_pre_ping"] is False
+    assert options["pool_recycle"] == 1800
+    assert options["connect_args"] == {
+        "server_settings": {"statement_timeout": "5000"}
+    }
+
+
+def test_external_pooler_mode():
+    options = engine_options(
+        POSTGRES_URL,
+        env={"DB_EXTERNAL_POOLER": "true", "DB_STATEMENT_TIMEOUT_MS": "2500"},
+    )
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+    assert options["connect_args"] == {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "command_timeout": 2.5,
+    }
+
+
+def test_pool_status():
+    engine = create_async_engine(
+        "postgresql+asyncpg://user:password@db/tagmind",
+        **engine_options(POSTGRES_URL, env={"DB_POOL_SIZE": "3"}),
+    )
+    assert pool_status(engine) == {
+        "pool": "AsyncAdaptedQueuePool",
+        "size": 3,
+        "checked_out": 0,
+        "idle": 0,
+        "overflow": -3,
+    }
@@ -0,0 +1,64 @@
+from datetime import date, datetime
+
+import pytest
+
+from crud import count_diaries_per_day, get_diaries_in_range
+from dates import day_bounds, get_timezone, month_span, week_span
+from models import Diary
+
+pytestmark = pytest.mark.anyio
+
+
+def test_day_bounds_are_half_open_utc():
+    start, end = day_bounds(date(2026, 3, 1), date(2026, 3, 1), get_timezone("Asia/Seoul"))
+    assert start == datetime.fromisoformat("2026-02-28T15:00:00+00:00")
+    assert end == datetime.fromisoformat("2026-03-01T15:00:00+00:00")
+
+
+def test_unknown_timezone_is_rejected():
+    with pytest.raises(ValueError):
+        get_timezone("Mars/Olympus_Mons")
+
+
+def test_calendar_spans():
+    assert month_span(date(2024, 2, 10)) == (date(2024, 2, 1), date(2024, 2, 29))
+    assert week_span(date(2026, 10, 17)) == (date(2026, 10, 12), date(2026, 10, 18))
+
+
+async def _add(db, user, *timestamps):
+    for ts in timestamps:
+        db.add(Diary(title=ts, user_id=user.id, created_at=datetime.fromisoformat(ts)))
+    await db.commit()
+
+
+async def test_range_respects_client_timezone(db, user):
+    # 16:00 UTC on March 1st is already March 2nd in Seoul
+    await _add(db, user, "2026-03-01 10:00:00", "2026-03-01 16:00:00")
+
+    in_utc = await get_diaries_in_range(db, user.id, date(2026, 3, 1), date(2026, 3, 1))
+    in_seoul = await get_diaries_in_range(
+        db, user.id, date(2026, 3, 2), date(2026, 3, 2), tz="Asia/Seoul"
+    )
+
+    assert len(in_utc.items) == 2
+    assert [d.title for d in in_seoul.items] == ["2026-03-01 16:00:00"]
+
+
+async def test_open_ended_range(db, user):
+    await _add(db, user, "2026-01-05 12:00:00", "2026-02-05 12:00:00")
+
+    page = await get_diaries_in_range(db, user.id, first_day=date(2026, 2, 1))
+    assert [d.title for d in page.items] == ["2026-02-05 12:00:00"]
+
+
+async def test_count_diaries_per_day_fills_gaps(db, user):
+    await _add(
+        db, user, "2026-10-12 09:00:00", "2026-10-12 21:00:00", "2026-10-14 09:00:00"
+    )
+
+    counts = await count_diaries_per_day(db, user.id, date(2026, 10, 12), date(2026, 10, 14))
+    assert counts == {
+        date(2026, 10, 12): 2,
+        date(2026, 10, 13): 0,
+        date(2026, 10, 14): 1,
+    }
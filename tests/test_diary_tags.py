@@ -0,0 +1,63 @@
+import pytest
+
+from crud import create_diary, create_tag, create_tag_pack, get_diary, update_diary
+from crud import grant_tag_pack_to_user
+from schemas import DiaryCreate, DiaryUpdate, TagCreate, TagPackBase
+
+pytestmark = pytest.mark.anyio
+
+
+async def _tags(db, count, prefix="t"):
+    return [
+        await create_tag(db, TagCreate(name=f"{prefix}{i}", category="활동"))
+        for i in range(count)
+    ]
+
+
+async def test_create_diary_query_count_is_independent_of_tag_count(
+    db, user, count_queries
+):
+    # Two tags rather than one, so both diaries have tag pairs to count
+    two = DiaryCreate(title="a", tags=[t.id for t in await _tags(db, 2, "two")])
+    eight = DiaryCreate(title="b", tags=[t.id for t in await _tags(db, 8, "eight")])
+    await db.commit()
+
+    with count_queries() as two_tags:
+        await create_diary(db, two, user.id)
+    with count_queries() as eight_tags:
+        await create_diary(db, eight, user.id)
+
+    assert len(two_tags) == len(eight_tags)
+
+
+async def test_update_diary_writes_only_the_difference(db, user, count_queries):
+    a, b, c = await _tags(db, 3)
+    diary = await create_diary(db, DiaryCreate(title="d", tags=[a.id, b.id]), user.id)
+    diary = await get_diary(db, diary.id)
+
+    with count_queries() as counter:
+        await update_diary(db, diary, DiaryUpdate(tags=[b.id, c.id]))
+
+    writes = [s for s in counter.statements if "diary_tags" in s and "SELECT" not in s]
+    assert len(writes) == 2  # one INSERT for c, one DELETE for a
+    diary = await get_diary(db, diary.id)
+    assert sorted(t.name for t in diary.tags) == ["t1", "t2"]
+
+
+async def test_tags_from_unowned_packs_are_skipped(db, user):
+    pack = await create_tag_pack(db, TagPackBase(name="P", price=100, product_id="p"))
+    premium = await create_tag(
+        db, TagCreate(name="premium", category="감정", tag_pack_id=pack.id)
+    )
+    default = await create_tag(
+        db, TagCreate(name="default", category="감정", is_default=True)
+    )
+    await db.commit()
+
+    tag_ids = [premium.id, default.id]
+    diary = await create_diary(db, DiaryCreate(title="d", tags=tag_ids), user.id)
+    assert [t.name for t in diary.tags] == ["default"]
+
+    await grant_tag_pack_to_user(db, user.id, pack.id)
+    diary = await update_diary(db, diary, DiaryUpdate(tags=tag_ids))
+    assert sorted(t.name for t in diary.tags) == ["default", "premium"]
@@ -0,0 +1,47 @@
+from datetime import date
+
+import pytest
+
+from crud import create_diary, create_tag, get_diaries, get_diaries_in_range
+from crud import search_diaries
+from schemas import DiaryCreate, DiaryPage, TagCreate
+
+pytestmark = pytest.mark.anyio
+
+LIST_ENDPOINTS = {
+    "diaries": lambda db, user_id: get_diaries(db, user_id),
+    "date_range": lambda db, user_id: get_diaries_in_range(
+        db, user_id, first_day=date(2000, 1, 1)
+    ),
+    "search": lambda db, user_id: search_diaries(db, user_id, "일기"),
+}
+
+
+async def _serialize_count(db, count_queries, user_id, fetch):
+    db.expunge_all()
+    with count_queries() as counter:
+        # Serialization runs outside the greenlet, so any lazy load would fail
+        page = DiaryPage.model_validate(await fetch(db, user_id), from_attributes=True)
+    return len(page.items), len(counter)
+
+
+@pytest.mark.parametrize("endpoint", sorted(LIST_ENDPOINTS))
+async def test_list_query_count_does_not_grow_with_page_size(
+    db, user, count_queries, endpoint
+):
+    fetch = LIST_ENDPOINTS[endpoint]
+    tags = [
+        await create_tag(db, TagCreate(name=f"태그{i}", category="활동"))
+        for i in range(3)
+    ]
+    tag_ids = [tag.id for tag in tags]
+
+    await create_diary(db, DiaryCreate(title="일기 0", tags=tag_ids), user.id)
+    small = await _serialize_count(db, count_queries, user.id, fetch)
+
+    for i in range(1, 10):
+        await create_diary(db, DiaryCreate(title=f"일기 {i}", tags=tag_ids), user.id)
+    large = await _serialize_count(db, count_queries, user.id, fetch)
+
+    assert (small[0], large[0]) == (1, 10)
+    assert small[1] == large[1]
@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import jobs
+from crud import create_diary, search_diaries
+from models import Diary as DiaryRow, Job as JobRow
+from schemas import DiaryCreate
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2026, 10, 17, tzinfo=timezone.utc)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Registers "record" (appends its payload) and "flaky" (always raises)."""
+    calls = []
+
+    async def record(db, payload):
+        calls.append(payload)
+
+    async def flaky(db, payload):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setitem(jobs.handlers, "record", record)
+    monkeypatch.setitem(jobs.handlers, "flaky", flaky)
+    return calls
+
+
+@pytest.fixture
+def session_factory(db):
+    return lambda: AsyncSession(db.bind, expire_on_commit=False)
+
+
+async def enqueue(db, queue, kind, payload, **options):
+    await queue.enqueue(db, jobs.Job(id=None, kind=kind, payload=payload, **options))
+
+
+async def test_memory_jobs_are_published_on_commit(db, calls, session_factory):
+    queue = jobs.MemoryQueue()
+    worker = jobs.Worker(queue, session_factory)
+
+    await enqueue(db, queue, "record", {"n": 1})
+    await db.rollback()
+    await enqueue(db, queue, "record", {"n": 2})
+    assert await worker.run_once() == 0  # Not committed yet
+
+    await db.commit()
+    assert await worker.run_once() == 1
+    assert calls == [{"n": 2}]
+
+
+async def test_higher_priority_runs_first(db, calls, session_factory):
+    queue = jobs.MemoryQueue()
+    for n, priority in enumerate([jobs.PRIORITY_LOW, jobs.PRIORITY_HIGH, 0]):
+        await enqueue(db, queue, "record", {"n": n}, priority=priority)
+    await db.commit()
+
+    await jobs.Worker(queue, session_factory).run_once()
+    assert calls == [{"n": 1}, {"n": 2}, {"n": 0}]
+
+
+async def test_failed_job_is_retried_then_dead_lettered(db, calls, session_factory):
+    clock = Clock()
+    queue = jobs.MemoryQueue(clock=clock)
+    worker = jobs.Worker(queue, session_factory)
+    await enqueue(db, queue, "flaky", {}, max_attempts=2)
+    await db.commit()
+
+    assert await worker.run_once() == 1
+    assert await worker.run_once() == 0  # Backing off
+    clock.advance(jobs.retry_delay(1).total_seconds())
+    assert await worker.run_once() == 1
+    assert worker.counts == {"retried": 1, "dead": 1}
+    [(job, error)] = queue.dead
+    assert job.attempts == 2 and "model unavailable" in error
+
+    assert await queue.requeue_dead("flaky") == 1
+    assert (await queue.stats())["jobs"] == {"flaky": {"queued": 1}}
+
+
+async def test_database_queue_claims_completes_and_retries(
+    db, calls, session_factory
+):
+    queue = jobs.DatabaseQueue(session_factory)
+    worker = jobs.Worker(queue, session_factory)
+    await enqueue(db, queue, "record", {"n": 1})
+    await enqueue(db, queue, "flaky", {}, max_attempts=1)
+    await enqueue(db, queue, "flaky", {}, max_attempts=3)
+    await db.commit()
+
+    assert await worker.run_once() == 3
+    assert calls == [{"n": 1}]
+    rows = (await db.execute(select(JobRow).order_by(JobRow.id))).scalars().all()
+    # The completed job is deleted; the failures are dead-lettered or retried
+    assert [(row.status, row.attempts) for row in rows] == [
+        ("dead", 1),
+        ("queued", 1),
+    ]
+    assert "model unavailable" in rows[1].last_error
+    assert rows[1].run_at.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+    assert await worker.run_once() == 0
+
+    assert await queue.requeue_dead() == 1
+    assert (await queue.stats())["jobs"] == {"flaky": {"queued": 2}}
+
+
+async def test_abandoned_running_job_is_claimed_again(db, calls, session_factory):
+    queue = jobs.DatabaseQueue(session_factory)
+    await enqueue(db, queue, "record", {"n": 1})
+    await db.commit()
+    [job] = await queue.claim(10)
+    assert await queue.claim(10) == []  # Still locked by the first claim
+
+    row = await db.get(JobRow, job.id)
+    row.locked_at = datetime.now(timezone.utc) - timedelta(
+        seconds=jobs.JOB_LOCK_TIMEOUT + 1
+    )
+    await db.commit()
+    [again] = await queue.claim(10)
+    assert again.id == job.id and again.attempts == 2
+
+
+async def test_diary_is_indexed_by_the_worker(
+    db, user, session_factory, monkeypatch
+):
+    queue = jobs.MemoryQueue()
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    await create_diary(db, DiaryCreate(title="제주 여행", content="바다"), user.id)
+    assert (await search_diaries(db, user.id, "제주")).items == []
+
+    assert await jobs.Worker(queue, session_factory).run_once() == 1
+    results = (await search_diaries(db, user.id, "제주")).items
+    assert [row.title for row in results] == ["제주 여행"]
+
+
+async def test_indexing_does_not_touch_updated_at(
+    db, user, session_factory, monkeypatch
+):
+    queue = jobs.MemoryQueue()
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    diary = await create_diary(db, DiaryCreate(title="제주 여행"), user.id)
+    written = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    await db.execute(
+        update(DiaryRow).where(DiaryRow.id == diary.id).values(updated_at=written)
+    )
+    await db.commit()
+
+    assert await jobs.Worker(queue, session_factory).run_once() == 1
+    row = (
+        await db.execute(
+            select(DiaryRow.updated_at, DiaryRow.search_document).where(
+                DiaryRow.id == diary.id
+            )
+        )
+    ).one()
+    assert row.updated_at.replace(tzinfo=timezone.utc) == written
+    assert "제주" in row.search_document
+
+
+async def test_enqueue_rejects_unknown_kinds(db):
+    with pytest.raises(ValueError):
+        await jobs.enqueue(db, "no-such-job", {})
+
+
+async def test_queues_implement_every_operation(db):
+    with pytest.raises(TypeError):
+        jobs.JobQueue()
+    queue = jobs.InlineQueue()
+    job = jobs.Job(id=None, kind="record", payload={})
+    await queue.complete(job)
+    await queue.fail(job, "ignored")
+    assert await queue.claim(10) == []
@@ -0,0 +1,101 @@
+import logging
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+
+from crud import create_diary
+from metrics import (
+    Histogram,
+    Metrics,
+    MetricsMiddleware,
+    instrument_engine,
+    metrics,
+)
+from schemas import DiaryCreate
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def recorded(db):
+    # The tests run on their own engine, not the one database.py instruments
+    instrument_engine(db.bind)
+    metrics.clear()
+
+
+def samples(exposition: str) -> dict:
+    """Sample lines of a /metrics response, by name and labels."""
+    return dict(
+        line.rsplit(" ", 1)
+        for line in exposition.splitlines()
+        if line and not line.startswith("#")
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram([0.1, 1])
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert histogram.count == 4 and histogram.sum == pytest.approx(3.65)
+
+
+async def test_requests_are_recorded_per_route(recorded, client, db, user):
+    diary = await create_diary(db, DiaryCreate(title="일기"), user.id)
+    for _ in range(2):
+        assert (await client.get(f"/diaries/{diary.id}")).status_code == 200
+    assert (await client.get("/diaries/999999")).status_code == 404
+    assert (await client.get("/no/such/path")).status_code == 404
+
+    response = await client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    values = samples(response.text)
+
+    route = 'method="GET",route="/diaries/{diary_id}"'
+    assert values[f'tagmind_http_requests_total{{{route},status="200"}}'] == "2"
+    assert values[f'tagmind_http_requests_total{{{route},status="404"}}'] == "1"
+    assert values[f"tagmind_http_request_duration_seconds_count{{{route}}}"] == "3"
+    duration = "tagmind_http_request_duration_seconds"
+    assert values[f'{duration}_bucket{{{route},le="+Inf"}}'] == "3"
+    unmatched = 'method="GET",route="unmatched",status="404"'
+    assert values[f"tagmind_http_requests_total{{{unmatched}}}"] == "1"
+
+    # The first read loads the diary; the cached version serves the others
+    assert int(values[f"tagmind_http_request_db_queries_sum{{{route}}}"]) >= 1
+    assert float(values[f"tagmind_http_request_db_seconds_sum{{{route}}}"]) > 0
+    assert int(values["tagmind_db_queries_total"]) >= int(
+        values[f"tagmind_http_request_db_queries_sum{{{route}}}"]
+    )
+
+
+async def test_slow_requests_are_logged_with_their_sql(db, caplog):
+    instrument_engine(db.bind)
+    api = FastAPI()
+
+    async def session():
+        yield db
+
+    @api.get("/report")
+    async def report(db=Depends(session)):
+        await db.execute(text("SELECT 1 AS first_statement"))
+        await db.execute(text("SELECT 2 AS second_statement"))
+        return {}
+
+    registry = Metrics()
+    wrapped = MetricsMiddleware(api, slow_request_ms=0, registry=registry)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=wrapped), base_url="http://test"
+    ) as client:
+        with caplog.at_level(logging.WARNING, logger="metrics"):
+            assert (await client.get("/report")).status_code == 200
+
+    [record] = caplog.records
+    assert "Slow request GET /report" in record.message
+    assert "2 queries" in record.message
+    assert "first_statement" in record.message
+    assert "second_statement" in record.message
+    assert registry.slow_requests == 1
+    histogram = registry.request_queries[("GET", "/report")]
+    assert histogram.sum == 2
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from crud import create_diary, get_diaries, search_diaries
+from models import Diary
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+from schemas import DiaryCreate
+
+pytestmark = pytest.mark.anyio
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 17, 9, 30)
+    token = encode_cursor([created_at, 42])
+    assert decode_cursor(token, 2) == [created_at, 42]
+
+
+def test_cursor_rejects_garbage_and_wrong_shape():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor", 2)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor([1, 2, 3]), 2)
+
+
+def test_cursor_values_must_match_the_key_types():
+    created_at = datetime(2026, 10, 17, 9, 30)
+    types = [datetime, int]
+    assert decode_cursor(encode_cursor([created_at, 42]), 2, types) == [
+        created_at,
+        42,
+    ]
+    for values in ([created_at, "abc"], [created_at, True], ["2026-10-17", 42]):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(encode_cursor(values), 2, types)
+
+
+async def test_get_diaries_walks_every_page_once(db, user):
+    start = datetime(2026, 1, 1)
+    for i in range(5):
+        db.add(Diary(title=f"d{i}", user_id=user.id, created_at=start + timedelta(days=i)))
+    # Two entries sharing a timestamp are ordered by id
+    db.add(Diary(title="tie", user_id=user.id, created_at=start + timedelta(days=4)))
+    await db.commit()
+
+    titles, cursor = [], None
+    while True:
+        page = await get_diaries(db, user.id, limit=2, cursor=cursor)
+        titles += [d.title for d in page.items]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert titles == ["tie", "d4", "d3", "d2", "d1", "d0"]
+
+
+async def test_search_pages_follow_rank_order(db, user):
+    for title, content in [("산책", "산책 산책"), ("산책", ""), ("일기", "산책")]:
+        diary = await create_diary(db, DiaryCreate(title=title, content=content), user.id)
+        # SQLite's CURRENT_TIMESTAMP has no fractional part; store a full
+        # timestamp so the cursor round-trips exactly as it does on PostgreSQL
+        diary.created_at = datetime(2026, 1, 1)
+    await db.commit()
+
+    first = await search_diaries(db, user.id, "산책", limit=2)
+    second = await search_diaries(db, user.id, "산책", limit=2, cursor=first.next_cursor)
+
+    assert [d.content for d in first.items] == ["산책 산책", ""]
+    assert [d.title for d in second.items] == ["일기"]
+    assert second.next_cursor is None
+
+
+async def test_get_diaries_rejects_a_cursor_of_the_wrong_types(db, user):
+    cursor = encode_cursor([datetime(2026, 1, 1), "abc"])
+    with pytest.raises(InvalidCursor):
+        await get_diaries(db, user.id, cursor=cursor)
@@ -0,0 +1,48 @@
+import threading
+
+import anyio
+import pytest
+
+from passwords import HasherBusy, PasswordHasher
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def hasher():
+    # The minimum bcrypt cost keeps the tests fast
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=1)
+    yield hasher
+    hasher.shutdown()
+
+
+async def test_hash_and_verify(hasher):
+    password_hash = await hasher.hash("secret")
+    assert password_hash.startswith("$2b$04$")
+    assert await hasher.verify("secret", password_hash) is True
+    assert await hasher.verify("wrong", password_hash) is False
+    assert hasher.stats()["completed"] == 3
+
+
+async def test_rejects_when_saturated(hasher):
+    release = threading.Event()
+    results = []
+
+    async def blocked():
+        results.append(await hasher.run(release.wait, 5))
+
+    async with anyio.create_task_group() as tg:
+        # One call runs on the only worker, the second waits in the queue
+        tg.start_soon(blocked)
+        tg.start_soon(blocked)
+        await anyio.sleep(0.05)
+        assert hasher.stats()["running"] == 1
+        assert hasher.stats()["queued"] == 1
+
+        with pytest.raises(HasherBusy):
+            await hasher.hash("secret")
+        assert hasher.stats()["rejected"] == 1
+        release.set()
+
+    assert results == [True, True]
+    assert hasher.stats()["queued"] == 0
@@ -0,0 +1,39 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+import responses
+from crud import create_diary, create_tag, get_diaries
+from schemas import DiaryCreate, DiaryPage, TagCreate
+
+pytestmark = pytest.mark.anyio
+
+
+def default_json(page):
+    model = DiaryPage.model_validate(page, from_attributes=True)
+    return json.loads(json.dumps(jsonable_encoder(model)))
+
+
+async def test_fast_path_matches_response_model(db, user):
+    tag = await create_tag(db, TagCreate(name="행복", category="감정"))
+    await create_diary(
+        db, DiaryCreate(title="일기", content="내용", tags=[tag.id]), user.id
+    )
+    await create_diary(db, DiaryCreate(title="빈 일기"), user.id)
+
+    page = await get_diaries(db, user.id, limit=1)
+    body = responses.FastJSONResponse(responses.diary_page(page)).body
+
+    assert json.loads(body) == default_json(page)
+    assert json.loads(body)["next_cursor"] is not None
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_utc_datetimes_match_pydantic(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(responses, "orjson", None)
+    value = datetime(2026, 10, 17, 9, 30, 0, 123456, tzinfo=timezone.utc)
+    body = responses.FastJSONResponse({"at": value}).body
+    assert json.loads(body) == {"at": "2026-10-17T09:30:00.123456Z"}
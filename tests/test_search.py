@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import func, select
+
+from crud import create_diary, create_tag, delete_diary, search_diaries, update_diary
+from models import DiarySearchTerm
+from schemas import DiaryCreate, DiaryUpdate, TagCreate
+from search import query_terms
+
+pytestmark = pytest.mark.anyio
+
+
+def test_query_terms_use_bigrams_and_single_syllables():
+    assert query_terms("행복한") == ["복한", "행복"]
+    assert query_terms("집") == ["집"]
+    assert query_terms("  ") == []
+
+
+async def test_search_matches_inflected_korean(db, user):
+    await create_diary(db, DiaryCreate(title="오늘", content="정말 행복했다"), user.id)
+    await create_diary(db, DiaryCreate(title="어제", content="조금 슬펐다"), user.id)
+
+    results = (await search_diaries(db, user.id, "행복")).items
+    assert [d.title for d in results] == ["오늘"]
+
+
+async def test_search_drops_ngram_false_positives(db, user):
+    await create_diary(db, DiaryCreate(title="행복 그리고 축복한 날", content=""), user.id)
+
+    assert (await search_diaries(db, user.id, "행복한")).items == []
+
+
+async def test_search_ranks_title_hits_first(db, user):
+    await create_diary(db, DiaryCreate(title="일기", content="카페에서 공부"), user.id)
+    await create_diary(db, DiaryCreate(title="카페", content="카페 투어"), user.id)
+
+    results = (await search_diaries(db, user.id, "카페")).items
+    assert [d.title for d in results] == ["카페", "일기"]
+
+
+async def test_search_is_scoped_to_user(db, user):
+    await create_diary(db, DiaryCreate(title="Shared word"), user.id)
+
+    assert (await search_diaries(db, user.id + 1, "shared")).items == []
+
+
+async def test_index_follows_updates_and_deletes(db, user):
+    tag = await create_tag(db, TagCreate(name="독서", category="활동"))
+    diary = await create_diary(db, DiaryCreate(title="Title", content="old text"), user.id)
+
+    await update_diary(db, diary, DiaryUpdate(content="new text", tags=[tag.id]))
+    assert (await search_diaries(db, user.id, "old")).items == []
+    assert len((await search_diaries(db, user.id, "독서")).items) == 1
+
+    await delete_diary(db, diary.id)
+    assert (await search_diaries(db, user.id, "new")).items == []
+    assert await db.scalar(select(func.count()).select_from(DiarySearchTerm)) == 0
@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import func, select
+
+from models import CatalogState, Tag, TagPack
+from schemas import TagCreate
+from crud import create_tag
+from seed import DEFAULT_TAGS, DEFAULT_TAG_PACKS, seed_catalog, seed_fingerprint
+
+pytestmark = pytest.mark.anyio
+
+PACK_TAG_COUNT = sum(len(pack["tags"]) for pack in DEFAULT_TAG_PACKS)
+
+
+async def count(db, model):
+    return (await db.execute(select(func.count()).select_from(model))).scalar()
+
+
+async def test_seeds_tags_and_packs(db):
+    assert await seed_catalog(db) is True
+
+    assert await count(db, Tag) == len(DEFAULT_TAGS) + PACK_TAG_COUNT
+    assert await count(db, TagPack) == len(DEFAULT_TAG_PACKS)
+    pack_tag_name = DEFAULT_TAG_PACKS[0]["tags"][0]["name"]
+    pack_tag = (
+        await db.execute(select(Tag).where(Tag.name == pack_tag_name))
+    ).scalar_one()
+    assert pack_tag.is_default is False
+    assert pack_tag.tag_pack_id is not None
+    state = await db.get(CatalogState, "seed")
+    assert state.value == seed_fingerprint()
+
+
+async def test_second_boot_is_a_single_select(db, count_queries):
+    await seed_catalog(db)
+
+    with count_queries() as queries:
+        assert await seed_catalog(db) is False
+    assert len(queries) == 1
+
+
+async def test_keeps_existing_rows(db):
+    # A tag created before seeding (e.g. by a previous deploy) is left alone
+    existing = await create_tag(db, TagCreate(name="행복", category="기분"))
+    await db.commit()
+
+    await seed_catalog(db)
+
+    tags = (await db.execute(select(Tag).where(Tag.name == "행복"))).scalars().all()
+    assert [(tag.id, tag.category) for tag in tags] == [(existing.id, "기분")]
+    assert await count(db, Tag) == len(DEFAULT_TAGS) + PACK_TAG_COUNT
+
+
+async def test_reseeds_when_the_seed_data_changes(db):
+    await seed_catalog(db)
+    state = await db.get(CatalogState, "seed")
+    state.value = "outdated"
+    await db.commit()
+
+    assert await seed_catalog(db) is True
+    assert await count(db, Tag) == len(DEFAULT_TAGS) + PACK_TAG_COUNT
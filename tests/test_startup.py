@@ -0,0 +1,67 @@
+import pytest
+
+import startup
+from catalog import tag_catalog
+from models import CatalogState
+
+pytestmark = pytest.mark.anyio
+
+
+def statuses(report):
+    return {phase.name: phase.status for phase in report.phases}
+
+
+async def test_full_mode_checks_schema_and_seeds(db):
+    report = await startup.run_startup("full")
+
+    assert statuses(report) == {
+        "config": "ok",
+        "engine": "ok",
+        "schema": "ok",
+        "create_schema": "skipped",
+        "seed": "ok",
+        "warm": "ok",
+    }
+    assert report.as_dict()["total_ms"] == report.total_ms
+    assert await db.get(CatalogState, "seed") is not None
+    assert (await tag_catalog.snapshot(db)).default_tags
+
+
+async def test_fast_mode_skips_schema_introspection(db):
+    report = await startup.run_startup("fast")
+    assert statuses(report)["schema"] == "skipped"
+    assert statuses(report)["seed"] == "ok"
+
+
+async def test_missing_tables_abort_full_startup(db):
+    async with db.bind.begin() as conn:
+        await conn.run_sync(CatalogState.__table__.drop)
+
+    with pytest.raises(startup.SchemaMismatch, match="catalog_state"):
+        await startup.run_startup("full")
+
+
+async def test_optional_phase_failures_do_not_abort():
+    async def ok():
+        pass
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    phases = (
+        startup.Phase("first", ok, startup.STARTUP_MODES),
+        startup.Phase("optional", broken, startup.STARTUP_MODES, required=False),
+        startup.Phase("last", ok, startup.STARTUP_MODES),
+    )
+    report = await startup.run_startup("fast", phases=phases)
+    assert statuses(report) == {"first": "ok", "optional": "failed", "last": "ok"}
+    assert report.phases[1].error == "boom"
+
+    required = (startup.Phase("required", broken, startup.STARTUP_MODES),)
+    with pytest.raises(RuntimeError):
+        await startup.run_startup("fast", phases=required)
+
+
+async def test_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        await startup.run_startup("turbo")
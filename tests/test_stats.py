@@ -0,0 +1,256 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import create_diary, create_tag, delete_diary, get_diary, update_diary
+from models import Diary, TagCooccurrence, TagUsageDaily, TagUsageRollup, User
+from schemas import DiaryCreate, DiaryUpdate, TagCreate
+import jobs
+import stats
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def tags(db):
+    names = [("행복", "감정"), ("슬픔", "감정"), ("운동", "활동")]
+    return [
+        await create_tag(db, TagCreate(name=name, category=category, is_default=True))
+        for name, category in names
+    ]
+
+
+async def usage_rows(db, user_id):
+    result = await db.execute(
+        select(TagUsageDaily.tag_id, TagUsageDaily.count)
+        .where(TagUsageDaily.user_id == user_id)
+        .order_by(TagUsageDaily.tag_id)
+    )
+    return result.all()
+
+
+async def test_usage_follows_diary_writes(db, user, tags):
+    happy, sad, exercise = tags
+    first = await create_diary(
+        db, DiaryCreate(title="a", tags=[happy.id, exercise.id]), user.id
+    )
+    await create_diary(db, DiaryCreate(title="b", tags=[happy.id]), user.id)
+    assert await usage_rows(db, user.id) == [(happy.id, 2), (exercise.id, 1)]
+
+    # Only the tag-set difference is applied
+    await update_diary(db, first, DiaryUpdate(tags=[sad.id, exercise.id]))
+    assert await usage_rows(db, user.id) == [
+        (happy.id, 1),
+        (sad.id, 1),
+        (exercise.id, 1),
+    ]
+
+    # Rows that drop to zero are removed
+    await delete_diary(db, first.id)
+    assert await usage_rows(db, user.id) == [(happy.id, 1)]
+
+
+async def test_usage_is_bucketed_by_diary_day(db, user, tags):
+    happy = tags[0]
+    diary = Diary(
+        title="old",
+        user_id=user.id,
+        created_at=datetime(2026, 1, 5, 12, tzinfo=timezone.utc),
+    )
+    db.add(diary)
+    await db.commit()
+
+    await update_diary(db, await get_diary(db, diary.id), DiaryUpdate(tags=[happy.id]))
+
+    result = await db.execute(
+        select(TagUsageDaily.day).where(TagUsageDaily.user_id == user.id)
+    )
+    assert result.scalars().all() == [date(2026, 1, 5)]
+
+
+async def test_tag_stats(db, user, tags, count_queries):
+    happy, sad, exercise = tags
+    await stats.record_tag_usage(db, user.id, date(2026, 3, 1), [happy.id], 3)
+    await stats.record_tag_usage(db, user.id, date(2026, 3, 2), [sad.id], 2)
+    await stats.record_tag_usage(
+        db, user.id, date(2026, 3, 2), [happy.id, exercise.id], 1
+    )
+    # Outside the requested range
+    await stats.record_tag_usage(db, user.id, date(2026, 2, 1), [exercise.id], 9)
+    await db.commit()
+    await stats.tag_stats(db, user.id, date(2026, 3, 1), date(2026, 3, 1))  # warm
+
+    with count_queries() as queries:
+        report = await stats.tag_stats(
+            db, user.id, date(2026, 3, 1), date(2026, 3, 3), limit=2
+        )
+    # One aggregate query for the counts, one for the series
+    assert len(queries) == 2
+
+    top = [(tag["name"], tag["count"]) for tag in report["top"]]
+    assert top == [("행복", 4), ("슬픔", 2)]
+    assert report["categories"] == [
+        {"category": "감정", "count": 6},
+        {"category": "활동", "count": 1},
+    ]
+    assert [day["count"] for day in report["days"]] == [3, 4, 0]
+
+    series = await stats.daily_series(
+        db, user.id, date(2026, 3, 1), date(2026, 3, 2), tag_id=sad.id
+    )
+    assert list(series.values()) == [0, 2]
+
+
+async def test_rollups_follow_daily_counts(db, user, tags):
+    happy = tags[0]
+    for day in (date(2026, 3, 30), date(2026, 3, 31), date(2026, 4, 1)):
+        await stats.record_tag_usage(db, user.id, day, [happy.id], 1)
+    await stats.record_tag_usage(db, user.id, date(2026, 4, 1), [happy.id], -1)
+    await db.commit()
+
+    result = await db.execute(
+        select(TagUsageRollup.period, TagUsageRollup.start, TagUsageRollup.count)
+        .where(TagUsageRollup.user_id == user.id)
+        .order_by(TagUsageRollup.period, TagUsageRollup.start)
+    )
+    # 2026-03-30 is a Monday; the April month row dropped to zero and is gone
+    assert result.all() == [
+        ("month", date(2026, 3, 1), 2),
+        ("week", date(2026, 3, 30), 2),
+    ]
+
+
+async def test_mood_trend(db, user, tags):
+    happy, sad, exercise = tags
+    await stats.record_tag_usage(db, user.id, date(2026, 1, 15), [happy.id], 2)
+    await stats.record_tag_usage(
+        db, user.id, date(2026, 3, 2), [sad.id, exercise.id], 1
+    )
+    await db.commit()
+
+    trend = await stats.mood_trend(
+        db, user.id, "month", date(2026, 1, 10), date(2026, 3, 5)
+    )
+    assert trend["tags"] == ["슬픔", "행복"]
+    # Non-emotion tags (운동) are left out
+    assert trend["buckets"] == [
+        {"start": date(2026, 1, 1), "total": 2, "counts": {"행복": 2}},
+        {"start": date(2026, 2, 1), "total": 0, "counts": {}},
+        {"start": date(2026, 3, 1), "total": 1, "counts": {"슬픔": 1}},
+    ]
+
+    weekly = await stats.mood_trend(
+        db, user.id, "week", date(2026, 3, 1), date(2026, 3, 8)
+    )
+    assert [bucket["start"] for bucket in weekly["buckets"]] == [
+        date(2026, 2, 23),
+        date(2026, 3, 2),
+    ]
+    assert [bucket["total"] for bucket in weekly["buckets"]] == [0, 1]
+
+    # Edge buckets only count the days inside the range
+    await stats.record_tag_usage(db, user.id, date(2026, 3, 31), [happy.id], 1)
+    await db.commit()
+    clamped = await stats.mood_trend(
+        db, user.id, "month", date(2026, 1, 16), date(2026, 3, 2)
+    )
+    assert [bucket["total"] for bucket in clamped["buckets"]] == [0, 0, 1]
+    clamped = await stats.mood_trend(
+        db, user.id, "week", date(2026, 3, 3), date(2026, 3, 31)
+    )
+    assert [bucket["total"] for bucket in clamped["buckets"]] == [0, 0, 0, 0, 1]
+
+    daily = await stats.mood_trend(
+        db, user.id, "day", date(2026, 3, 1), date(2026, 3, 3)
+    )
+    assert [bucket["total"] for bucket in daily["buckets"]] == [0, 1, 0]
+
+
+async def pair_counts(db, user_id):
+    result = await db.execute(
+        select(
+            TagCooccurrence.tag_id,
+            TagCooccurrence.other_tag_id,
+            TagCooccurrence.count,
+        )
+        .where(TagCooccurrence.user_id == user_id)
+        .order_by(TagCooccurrence.tag_id, TagCooccurrence.other_tag_id)
+    )
+    return result.all()
+
+
+async def test_cooccurrence_follows_diary_writes(db, user, tags):
+    happy, sad, exercise = tags
+    diary = await create_diary(
+        db, DiaryCreate(title="a", tags=[happy.id, exercise.id]), user.id
+    )
+    expected = [(happy.id, exercise.id, 1), (exercise.id, happy.id, 1)]
+    assert await pair_counts(db, user.id) == expected
+    assert await pair_counts(db, stats.GLOBAL_USER_ID) == expected
+
+    await update_diary(db, diary, DiaryUpdate(tags=[sad.id, exercise.id]))
+    assert await pair_counts(db, user.id) == [
+        (sad.id, exercise.id, 1),
+        (exercise.id, sad.id, 1),
+    ]
+
+    await delete_diary(db, diary.id)
+    assert await pair_counts(db, user.id) == []
+    assert await pair_counts(db, stats.GLOBAL_USER_ID) == []
+
+
+async def test_global_cooccurrence_is_written_by_a_job(db, user, tags, monkeypatch):
+    happy, sad, exercise = tags
+    queue = jobs.MemoryQueue()
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    worker = jobs.Worker(queue, lambda: AsyncSession(db.bind, expire_on_commit=False))
+    other = User(email="other@example.com", password_hash="hashed", nickname="other")
+    db.add(other)
+    await db.commit()
+
+    diary = await create_diary(
+        db, DiaryCreate(title="a", tags=[happy.id, exercise.id]), user.id
+    )
+    await create_diary(
+        db, DiaryCreate(title="b", tags=[happy.id, exercise.id]), other.id
+    )
+    # The writes touched only their own users' rows
+    assert await pair_counts(db, stats.GLOBAL_USER_ID) == []
+
+    await worker.run_once()
+    expected = [(happy.id, exercise.id, 2), (exercise.id, happy.id, 2)]
+    assert await pair_counts(db, stats.GLOBAL_USER_ID) == expected
+
+    await delete_diary(db, diary.id)
+    await worker.run_once()
+    # A refresh that runs again (a retried job) does not count twice
+    payload = {"pairs": [[happy.id, exercise.id], [exercise.id, happy.id]]}
+    await stats.refresh_global_cooccurrence(db, payload)
+    await db.commit()
+    expected = [(happy.id, exercise.id, 1), (exercise.id, happy.id, 1)]
+    assert await pair_counts(db, stats.GLOBAL_USER_ID) == expected
+
+
+async def test_suggest_tags(db, user, tags):
+    happy, sad, exercise = tags
+    other = User(email="other@example.com", password_hash="hashed", nickname="other")
+    db.add(other)
+    await db.commit()
+
+    # Globally 행복 mostly goes with 슬픔, but this user pairs it with 운동
+    for _ in range(3):
+        await create_diary(
+            db, DiaryCreate(title="o", tags=[happy.id, sad.id]), other.id
+        )
+    await create_diary(
+        db, DiaryCreate(title="u", tags=[happy.id, exercise.id]), user.id
+    )
+
+    suggestions = await stats.suggest_tags(db, user.id, [happy.id])
+    assert suggestions == [(exercise.id, 6), (sad.id, 3)]
+    assert await stats.suggest_tags(db, user.id, [happy.id, exercise.id]) == [
+        (sad.id, 3)
+    ]
+    assert await stats.suggest_tags(db, user.id, []) == []
@@ -0,0 +1,119 @@
+import pytest
+
+import transfer
+from crud import create_diary, delete_diary, get_changes, get_diary, update_diary
+from pagination import InvalidCursor, encode_cursor
+from schemas import DiaryCreate, DiaryUpdate
+
+pytestmark = pytest.mark.anyio
+
+
+async def lines_of(*lines):
+    for line in lines:
+        yield line.encode("utf-8")
+
+
+async def test_full_then_incremental_sync(db, user):
+    first = await create_diary(db, DiaryCreate(title="first"), user.id)
+    second = await create_diary(db, DiaryCreate(title="second"), user.id)
+
+    initial = await get_changes(db, user.id)
+    assert [row.title for row in initial.changed] == ["first", "second"]
+    assert initial.deleted == []
+    assert not initial.has_more
+
+    # Nothing changed since the initial sync
+    empty = await get_changes(db, user.id, since=initial.next_token)
+    assert empty.changed == [] and empty.deleted == []
+    assert empty.next_token == initial.next_token
+
+    await update_diary(db, await get_diary(db, first.id), DiaryUpdate(title="edited"))
+    third = await create_diary(db, DiaryCreate(title="third"), user.id)
+    await delete_diary(db, second.id)
+
+    changes = await get_changes(db, user.id, since=initial.next_token)
+    assert [row.title for row in changes.changed] == ["edited", "third"]
+    assert [row.id for row in changes.changed] == [first.id, third.id]
+    assert changes.deleted == [second.id]
+
+
+async def test_reused_id_supersedes_tombstone(db, user):
+    await create_diary(db, DiaryCreate(title="first"), user.id)
+    last = await create_diary(db, DiaryCreate(title="last"), user.id)
+    token = (await get_changes(db, user.id)).next_token
+    await delete_diary(db, last.id)
+    # SQLite hands the highest id out again
+    again = await create_diary(db, DiaryCreate(title="again"), user.id)
+    assert again.id == last.id
+
+    changes = await get_changes(db, user.id, since=token)
+    assert [row.title for row in changes.changed] == ["again"]
+    assert changes.deleted == []
+
+
+async def test_sync_pages_by_change(db, user):
+    for i in range(5):
+        await create_diary(db, DiaryCreate(title=f"d{i}"), user.id)
+
+    titles = []
+    token = None
+    while True:
+        page = await get_changes(db, user.id, since=token, limit=2)
+        titles += [row.title for row in page.changed]
+        token = page.next_token
+        if not page.has_more:
+            break
+    assert titles == ["d0", "d1", "d2", "d3", "d4"]
+
+
+async def test_sync_is_per_user(db, user, count_queries):
+    other = await create_diary(db, DiaryCreate(title="other"), user.id + 1)
+    mine = await create_diary(db, DiaryCreate(title="mine"), user.id)
+    token = (await get_changes(db, user.id)).next_token
+    await delete_diary(db, other.id)
+
+    with count_queries() as queries:
+        changes = await get_changes(db, user.id, since=token)
+    assert changes.changed == [] and changes.deleted == []
+    # Diaries and tombstones; no tag query when nothing changed
+    assert len(queries) == 2
+    assert mine.sync_seq == 1
+
+
+async def test_imported_diaries_are_synced(db, user):
+    token = (await get_changes(db, user.id)).next_token
+    report = await transfer.import_diaries(
+        db, user.id, lines_of('{"title": "a"}', '{"title": "b"}')
+    )
+    assert report["imported"] == 2
+
+    changes = await get_changes(db, user.id, since=token)
+    assert [row.title for row in changes.changed] == ["a", "b"]
+
+
+async def test_rejects_malformed_token(db, user):
+    with pytest.raises(InvalidCursor):
+        await get_changes(db, user.id, since="not a token")
+    with pytest.raises(InvalidCursor):
+        await get_changes(db, user.id, since=encode_cursor(["x"]))
+    with pytest.raises(InvalidCursor):
+        await get_changes(db, user.id, since=encode_cursor([True]))
+
+
+async def test_sync_endpoint(client, db, user):
+    diary = await create_diary(db, DiaryCreate(title="first"), user.id)
+
+    response = await client.get("/sync")
+    assert response.status_code == 200
+    body = response.json()
+    assert [row["id"] for row in body["changed"]] == [diary.id]
+    assert body["deleted"] == [] and not body["has_more"]
+
+    await delete_diary(db, diary.id)
+    response = await client.get("/sync", params={"since": body["next_token"]})
+    assert response.json()["changed"] == []
+    assert response.json()["deleted"] == [diary.id]
+
+    for token in ("not a token", encode_cursor([True])):
+        response = await client.get("/sync", params={"since": token})
+        assert response.status_code == 400
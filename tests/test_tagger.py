@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+import tagger
+from crud import create_diary, create_tag
+from schemas import DiaryCreate, TagCreate
+
+pytestmark = pytest.mark.anyio
+
+DIARIES = {
+    "여행": [
+        ("제주 여행 첫날", "공항에서 렌터카를 빌려 해안도로를 달렸다"),
+        ("부산 여행", "해운대 바다를 보고 기차로 돌아왔다"),
+        ("여행 준비", "가방을 싸고 숙소와 기차표를 예약했다"),
+    ],
+    "운동": [
+        ("아침 운동", "헬스장에서 스쿼트와 런닝머신"),
+        ("저녁 러닝", "한강에서 5킬로 달리기, 운동 끝나고 스트레칭"),
+        ("운동 기록", "헬스장 PT 수업, 데드리프트 자세 교정"),
+    ],
+    "음식": [
+        ("맛집 탐방", "파스타와 피자가 맛있는 식당"),
+        ("집밥", "김치찌개를 끓여 먹었다. 음식은 역시 집밥"),
+        ("디저트", "케이크와 커피, 달콤한 음식이 최고"),
+    ],
+}
+
+
+@pytest.fixture
+async def tags(db):
+    tags = {
+        name: await create_tag(db, TagCreate(name=name, category="활동", is_default=True))
+        for name in [*DIARIES, "독서"]
+    }
+    await db.commit()
+    return tags
+
+
+@pytest.fixture
+async def model(db, user, tags):
+    for name, diaries in DIARIES.items():
+        for title, content in diaries:
+            diary = DiaryCreate(title=title, content=content, tags=[tags[name].id])
+            await create_diary(db, diary, user.id)
+    # Below the minimum number of examples: never suggested
+    diary = DiaryCreate(title="책", content="소설을 읽었다", tags=[tags["독서"].id])
+    await create_diary(db, diary, user.id)
+    return await tagger.train(db, n_features=2**12, min_examples=2)
+
+
+def names(suggestions, tags):
+    by_id = {tag.id: name for name, tag in tags.items()}
+    return [by_id[tag_id] for tag_id, _ in suggestions]
+
+
+async def test_suggests_tags_from_text(model, tags):
+    allowed = [tag.id for tag in tags.values()]
+    assert model.examples == 9
+    assert sorted(model.tag_ids) == sorted(tags[name].id for name in DIARIES)
+
+    travel = model.suggest("강릉 여행", "바다 보러 기차 타고", allowed)
+    assert names(travel, tags)[0] == "여행"
+    assert travel[0].confidence > 0.5
+    workout = model.suggest("오늘", "헬스장에서 스쿼트", allowed)
+    assert names(workout, tags)[0] == "운동"
+    assert sum(confidence for _, confidence in workout) <= 1.0 + 1e-6
+
+
+async def test_suggests_only_allowed_tags(model, tags):
+    allowed = [tags["운동"].id, tags["음식"].id]
+    suggestions = model.suggest("제주 여행", "해안도로", allowed, min_confidence=0)
+    assert set(names(suggestions, tags)) == {"운동", "음식"}
+    assert model.suggest("제주 여행", None, []) == []
+    assert model.suggest("", None, allowed) == []
+
+
+async def test_nothing_to_train_on(db, tags):
+    assert await tagger.train(db) is None
+
+
+async def test_model_file_is_reloaded_when_it_changes(model, tmp_path):
+    path = str(tmp_path / "tag_model.npz")
+    clock = [0.0]
+    suggester = tagger.TagSuggester(path, reload_interval=60, clock=lambda: clock[0])
+    assert suggester.model is None  # Not trained yet
+
+    model.save(path)
+    assert suggester.model is None  # Checked less than a minute ago
+    clock[0] += 60
+    loaded = suggester.model
+    assert loaded.examples == model.examples
+    assert np.array_equal(loaded.weights, model.weights)
+    assert suggester.stats()["tags"] == 3
+
+    clock[0] += 60
+    assert suggester.model is loaded  # Unchanged file, not loaded again
+
+
+async def test_suggest_tags_endpoint(client, model, tags, monkeypatch, tmp_path):
+    suggester = tagger.TagSuggester(str(tmp_path / "missing.npz"))
+    suggester.use(model)
+    monkeypatch.setattr(tagger, "tag_suggester", suggester)
+
+    response = await client.post(
+        "/diaries/suggest-tags", json={"title": "맛집", "content": "피자"}
+    )
+    assert response.status_code == 200
+    [first, *_] = response.json()
+    assert first["name"] == "음식" and 0 < first["confidence"] <= 1
+
+    response = await client.post(
+        "/diaries/suggest-tags?limit=1",
+        json={"title": "맛집", "content": "피자", "tags": [tags["음식"].id]},
+    )
+    assert [tag["name"] for tag in response.json()] != ["음식"]
+    assert len(response.json()) <= 1
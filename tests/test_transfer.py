@@ -0,0 +1,178 @@
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import transfer
+from crud import create_diary, create_tag, search_diaries
+from catalog import tag_catalog
+from models import Diary, Tag, TagUsageDaily, diary_tags_association
+from schemas import DiaryCreate, TagCreate
+
+pytestmark = pytest.mark.anyio
+
+
+async def lines_of(*lines):
+    for line in lines:
+        yield line.encode("utf-8")
+
+
+async def body_of(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_export_streams_ndjson_in_chunks(db, user, count_queries):
+    tag = await create_tag(
+        db, TagCreate(name="행복", category="감정", is_default=True)
+    )
+    await db.commit()
+    for i in range(5):
+        await create_diary(
+            db, DiaryCreate(title=f"d{i}", content="c", tags=[tag.id]), user.id
+        )
+
+    def session_factory():
+        return AsyncSession(db.bind, expire_on_commit=False)
+
+    with count_queries() as queries:
+        chunks = [
+            chunk
+            async for chunk in transfer.export_diaries(
+                session_factory, user.id, chunk_size=2
+            )
+        ]
+    # Three chunks of at most two diaries, one tag query per chunk
+    assert len(chunks) == 3
+    assert len([q for q in queries.statements if "diary_tags" in q]) == 3
+
+    rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [row["title"] for row in rows] == ["d0", "d1", "d2", "d3", "d4"]
+    assert rows[0]["tags"] == ["행복"]
+    assert rows[0]["created_at"].endswith("+00:00")
+
+
+async def test_export_does_not_depend_on_the_tag_catalog(db, user):
+    diary = await create_diary(db, DiaryCreate(title="일기"), user.id)
+    await tag_catalog.snapshot(db)
+    # A tag created by another process, before this one heard about it
+    await db.execute(
+        Tag.__table__.insert().values(id=99, name="새태그", category="활동")
+    )
+    await db.execute(
+        diary_tags_association.insert().values(diary_id=diary.id, tag_id=99)
+    )
+    await db.commit()
+
+    def session_factory():
+        return AsyncSession(db.bind, expire_on_commit=False)
+
+    chunks = [
+        chunk async for chunk in transfer.export_diaries(session_factory, user.id)
+    ]
+    assert json.loads(b"".join(chunks))["tags"] == ["새태그"]
+
+
+async def test_read_lines_splits_across_chunks():
+    lines = transfer.read_lines(body_of(b'{"a": 1}\n{"b"', b": 2}\n", b'{"c": 3}'))
+    assert [line async for line in lines] == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+async def test_read_lines_cuts_long_lines():
+    lines = transfer.read_lines(body_of(b"x" * 6, b"x" * 6, b"\nok"), max_length=4)
+    assert [line async for line in lines] == [b"xxxxx", b"ok"]
+
+
+async def test_import_reports_undecodable_and_long_lines(db, user, monkeypatch):
+    monkeypatch.setattr(transfer, "MAX_IMPORT_LINE_BYTES", 40)
+    body = body_of(
+        b'{"title": "first"}\n\xff\xfe bad\n{"title": "' + b"x" * 50,
+        b'"}\n{"title": "last"}\n',
+    )
+
+    report = await transfer.import_diaries(db, user.id, transfer.read_lines(body, 40))
+
+    assert report["imported"] == 2
+    assert report["errors"] == [
+        {"line": 2, "error": "Line is not valid UTF-8"},
+        {"line": 3, "error": "Line is longer than 40 bytes"},
+    ]
+
+
+async def test_import_writes_rows_and_reports_errors(db, user):
+    tag = await create_tag(
+        db, TagCreate(name="여행", category="활동", is_default=True)
+    )
+    await db.commit()
+
+    report = await transfer.import_diaries(
+        db,
+        user.id,
+        lines_of(
+            json.dumps({"title": "제주 여행", "tags": ["여행"]}),
+            "",
+            "not json",
+            json.dumps({"content": "no title"}),
+            json.dumps({"title": "bad tag", "tags": ["없는태그"]}),
+            json.dumps(
+                {"title": "old", "created_at": "2025-05-01T09:00:00+00:00"},
+            ),
+            json.dumps({"title": "third", "tags": ["여행", "여행"]}),
+        ),
+        chunk_size=2,
+    )
+
+    assert report["imported"] == 3
+    assert report["failed"] == 3
+    assert [error["line"] for error in report["errors"]] == [3, 4, 5]
+    assert report["errors"][1]["error"].startswith("title")
+    assert "없는태그" in report["errors"][2]["error"]
+
+    diaries = (await db.execute(select(Diary).order_by(Diary.id))).scalars().all()
+    assert [d.title for d in diaries] == ["제주 여행", "old", "third"]
+    assert diaries[1].created_at.date() == date(2025, 5, 1)
+
+    # Imported diaries are searchable and counted like created ones
+    assert [d.title for d in (await search_diaries(db, user.id, "제주")).items] == [
+        "제주 여행"
+    ]
+    usage = await db.execute(
+        select(func.sum(TagUsageDaily.count)).where(TagUsageDaily.tag_id == tag.id)
+    )
+    assert usage.scalar() == 2
+
+
+async def test_import_continues_after_existing_rows(db, user):
+    await create_diary(db, DiaryCreate(title="existing"), user.id)
+
+    report = await transfer.import_diaries(
+        db, user.id, lines_of(*(json.dumps({"title": f"n{i}"}) for i in range(3)))
+    )
+
+    assert report == {"imported": 3, "failed": 0, "errors": []}
+    count = await db.execute(select(func.count()).select_from(Diary))
+    assert count.scalar() == 4
+
+
+async def test_import_and_export_endpoints(client):
+    body = "\n".join(
+        json.dumps({"title": title}, ensure_ascii=False) for title in ("하나", "둘")
+    )
+    response = await client.post("/diaries/import", content=body.encode("utf-8"))
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert response.json()["errors"] == []
+
+    response = await client.post("/diaries/import", content=b"\xff\xfe bad\n")
+    assert response.status_code == 200
+    assert response.json()["errors"] == [
+        {"line": 1, "error": "Line is not valid UTF-8"}
+    ]
+
+    response = await client.get("/diaries/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == ["하나", "둘"]
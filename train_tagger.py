@@ -0,0 +1,47 @@
+"""Retrains the tag suggestion model: `python train_tagger.py` (see tagger.py).
+
+Run it periodically, e.g. nightly from cron; API processes pick up the new
+model file within TAGGER_RELOAD_INTERVAL seconds.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before the database is configured
+load_dotenv()
+
+import tagger
+from database import SessionLocal
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--output",
+        default=tagger.TAGGER_MODEL_PATH,
+        help="where to write the model (default: TAGGER_MODEL_PATH)",
+    )
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    async with SessionLocal() as db:
+        model = await tagger.train(db)
+    if model is None:
+        tagger.logger.warning(
+            f"No tag is on {tagger.TAGGER_MIN_EXAMPLES} diaries yet; nothing written"
+        )
+        return
+    model.save(args.output)
+    tagger.logger.info(
+        f"Trained on {model.examples} diaries for {len(model.tag_ids)} tags in "
+        f"{time.perf_counter() - started:.1f}s, written to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,263 @@
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import analysis, models, schemas, search, stats, sync
+from catalog import tag_catalog
+
+# Diaries fetched per round trip while exporting
+EXPORT_CHUNK_SIZE = 500
+
+# Diaries written per transaction while importing
+IMPORT_CHUNK_SIZE = 500
+
+# Rows a single import request may contain
+MAX_IMPORT_ROWS = 10000
+
+# Bytes a single import line may hold; longer lines are reported, not buffered
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+
+# Error entries returned by an import (the failed count is always complete)
+MAX_IMPORT_ERRORS = 100
+
+
+# --- Export ---
+async def export_diaries(
+    session_factory, user_id: int, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Yields the user's diaries as NDJSON lines, oldest first.
+
+    Rows are streamed from a server-side cursor a chunk at a time, with the
+    tags of each chunk loaded in one query, so memory use is bounded by the
+    chunk size rather than by the number of diaries. The generator opens
+    its own session because it outlives the request's dependencies.
+    """
+    diary = models.Diary
+    diary_tags = models.diary_tags_association
+    async with session_factory() as db:
+        result = await db.stream(
+            select(
+                diary.id,
+                diary.title,
+                diary.content,
+                diary.image_url,
+                diary.created_at,
+                diary.updated_at,
+            )
+            .where(diary.user_id == user_id)
+            .order_by(diary.created_at, diary.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions(chunk_size):
+            # Names are joined in rather than read from the tag catalog, whose
+            # snapshot may predate a tag created by another process
+            tag_rows = await db.execute(
+                select(diary_tags.c.diary_id, models.Tag.name)
+                .join(models.Tag, models.Tag.id == diary_tags.c.tag_id)
+                .where(diary_tags.c.diary_id.in_([row.id for row in rows]))
+            )
+            tag_names = defaultdict(list)
+            for diary_id, name in tag_rows.all():
+                tag_names[diary_id].append(name)
+            yield "".join(
+                json.dumps(
+                    {
+                        "id": row.id,
+                        "title": row.title,
+                        "content": row.content,
+                        "image_url": row.image_url,
+                        "created_at": _isoformat(row.created_at),
+                        "updated_at": _isoformat(row.updated_at),
+                        "tags": sorted(tag_names[row.id]),
+                    },
+                    ensure_ascii=False,
+                )
+                + "\n"
+                for row in rows
+            ).encode("utf-8")
+
+
+def _isoformat(value: datetime):
+    if value is None:
+        return None
+    if value.tzinfo is None:  # SQLite drops the offset; stored values are UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+# --- Import ---
+async def read_lines(
+    chunks: AsyncIterator[bytes], max_length: int = MAX_IMPORT_LINE_BYTES
+) -> AsyncIterator[bytes]:
+    """Splits a streamed request body into lines without buffering all of it.
+
+    A line longer than `max_length` is cut to `max_length + 1` bytes as it
+    arrives, so one huge line cannot be held whole; import_diaries reports it.
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line[: max_length + 1]
+        pending = pending[: max_length + 1]
+    if pending:
+        yield pending
+
+
+def _parse(line: bytes) -> schemas.DiaryImport:
+    if len(line) > MAX_IMPORT_LINE_BYTES:
+        raise ValueError(f"Line is longer than {MAX_IMPORT_LINE_BYTES} bytes")
+    try:
+        line = line.decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError("Line is not valid UTF-8")
+    try:
+        return schemas.DiaryImport.model_validate_json(line)
+    except ValidationError as e:
+        error = e.errors()[0]
+        location = ".".join(str(part) for part in error["loc"])
+        raise ValueError(f"{location}: {error['msg']}" if location else error["msg"])
+
+
+async def import_diaries(
+    db: AsyncSession,
+    user_id: int,
+    lines: AsyncIterator[bytes],
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+) -> dict:
+    """Creates a diary per NDJSON line, in transactions of `chunk_size` rows.
+
+    Invalid lines (too long, not UTF-8, bad JSON, missing title, unknown or
+    unowned tag names) are reported with their 1-based line number and
+    skipped; the rest are written with a few executemany statements per
+    chunk instead of a round trip per diary and tag. A chunk that fails in the database is
+    rolled back and all of its rows are reported.
+    """
+    tag_ids = await _usable_tag_ids(db, user_id)
+    report = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(line_number: int, error: str):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_IMPORT_ERRORS:
+            report["errors"].append({"line": line_number, "error": error})
+
+    chunk: List[Tuple[int, schemas.DiaryImport, List[int]]] = []
+    rows = 0
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        rows += 1
+        if rows > MAX_IMPORT_ROWS:
+            fail(line_number, f"Import is limited to {MAX_IMPORT_ROWS} rows")
+            continue
+        try:
+            item = _parse(line)
+            unknown = [name for name in item.tags if name not in tag_ids]
+            if unknown:
+                raise ValueError(f"Unknown or unavailable tags: {', '.join(unknown)}")
+        except ValueError as e:
+            fail(line_number, str(e))
+            continue
+        chunk.append((line_number, item, sorted({tag_ids[n] for n in item.tags})))
+        if len(chunk) >= chunk_size:
+            await _write_chunk(db, user_id, chunk, report, fail)
+            chunk = []
+    if chunk:
+        await _write_chunk(db, user_id, chunk, report, fail)
+    return report
+
+
+async def _usable_tag_ids(db: AsyncSession, user_id: int) -> Dict[str, int]:
+    """Name -> id of every tag the user may attach (same rule as crud)."""
+    snapshot = await tag_catalog.snapshot(db)
+    owned = await tag_catalog.owned_pack_ids(db, user_id)
+    return {
+        tag.name: tag.id
+        for tag in snapshot.tags.values()
+        if tag.is_default or tag.tag_pack_id is None or tag.tag_pack_id in owned
+    }
+
+
+async def _write_chunk(db: AsyncSession, user_id: int, chunk, report, fail):
+    try:
+        await _insert_diaries(db, user_id, chunk)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        for line_number, _, _ in chunk:
+            fail(line_number, f"Could not be saved ({type(e).__name__})")
+        return
+    report["imported"] += len(chunk)
+
+
+async def _insert_diaries(db: AsyncSession, user_id: int, chunk):
+    now = datetime.now(timezone.utc)
+    ids = await _allocate_diary_ids(db, len(chunk))
+    first_seq = await sync.next_sync_seq(db, user_id, len(chunk))
+
+    diaries, diary_tags, terms = [], [], []
+    usage = Counter()
+    pairs = Counter()
+    for offset, (diary_id, (_, item, tag_ids)) in enumerate(zip(ids, chunk)):
+        names = list(dict.fromkeys(item.tags))  # Resolved to tag_ids by the caller
+        created_at = item.created_at or now
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        diaries.append(
+            {
+                "id": diary_id,
+                "user_id": user_id,
+                "title": item.title,
+                "content": item.content,
+                "image_url": item.image_url,
+                "created_at": created_at,
+                "sync_seq": first_seq + offset,
+                "search_document": search.build_document(
+                    item.title, item.content, names
+                ),
+            }
+        )
+        diary_tags.extend({"diary_id": diary_id, "tag_id": t} for t in tag_ids)
+        terms.extend(
+            search.postings(diary_id, user_id, item.title, item.content, names)
+        )
+        day = stats.usage_day(created_at)
+        usage.update((day, tag_id) for tag_id in tag_ids)
+        pairs.update(stats.tag_pairs(tag_ids))
+
+    await db.execute(models.Diary.__table__.insert(), diaries)
+    if diary_tags:
+        await db.execute(models.diary_tags_association.insert(), diary_tags)
+    if terms:
+        await db.execute(models.DiarySearchTerm.__table__.insert(), terms)
+    await stats.add_tag_usage(db, user_id, usage)
+    await stats.add_cooccurrence(db, user_id, pairs)
+    await analysis.enqueue_analysis(db, ids)
+
+
+async def _allocate_diary_ids(db: AsyncSession, count: int) -> List[int]:
+    """Reserves `count` diary ids, so rows can be inserted with executemany
+    and their tags and postings written without reading ids back."""
+    if db.bind.dialect.name == "postgresql":
+        result = await db.execute(
+            text(
+                "SELECT nextval(pg_get_serial_sequence('diaries', 'id')) "
+                "FROM generate_series(1, :count)"
+            ),
+            {"count": count},
+        )
+        return list(result.scalars())
+    # SQLite has no sequences. Ids after the current maximum are used; should
+    # a concurrent writer take one first, the chunk fails on the primary key
+    # and is reported instead of mixing rows
+    result = await db.execute(select(func.coalesce(func.max(models.Diary.id), 0)))
+    start = result.scalar() + 1
+    return list(range(start, start + count))
@@ -0,0 +1,48 @@
+"""Background job worker: `python worker.py` (see jobs.py).
+
+Run as many as needed next to the API processes; they share the jobs table
+and never claim the same job twice.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before the database is configured
+load_dotenv()
+
+import crud  # noqa: F401  (registers the diary job handlers)
+import jobs
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--requeue-dead",
+        metavar="KIND",
+        nargs="?",
+        const="",
+        help="give dead-lettered jobs (of one kind, or all) new attempts and exit",
+    )
+    args = parser.parse_args(argv)
+    if args.requeue_dead is not None:
+        count = await jobs.job_queue.requeue_dead(args.requeue_dead or None)
+        print(f"Requeued {count} dead jobs")
+        return
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    worker = jobs.Worker(jobs.job_queue)
+    jobs.logger.info(f"Worker started ({jobs.JOB_BACKEND} queue)")
+    await worker.run(stop)
+    jobs.logger.info(f"Worker stopped: {dict(worker.counts)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())